@@ -1,4 +1,5 @@
 import blpapi
+import queue
 import rich
 
 from datetime import date
@@ -7,6 +8,7 @@ import pandas as pd
 from blp import blp
 
 import dxdy.db.utils as db_utils
+from dxdy.bbg.subscriptions import SubscriptionManager, SESSION_DOWN_MESSAGES, SUBSCRIPTION_FAILURE_MESSAGES
 from dxdy.settings import Settings
 from dxdy.saas_settings import SaaSConfig
 
@@ -31,66 +33,96 @@ def get_bqry_session():
                 return None
     
 
-def real_time_api(tickers):
-
-    # with Settings().get_db_connection(readonly=True) as db:
-    #     """
-    #     correlation_ids = db.execute(qry).fetch_df()
-        
-    correlation_ids = tickers['figi'].unique()
-    
-    req = {}
-    
-    for figi in correlation_ids:
-        req[figi] = {"fields": ["LAST_PRICE", "BID", "ASK"]}
-    
-    #rich.print(req)
-    
-    while(True):
-        with blp.BlpStream() as rt_blp:
-            res = rt_blp.subscribe(req)
-            #rich.print(res)
-
-            # n = 0
-            try:
-                events =  rt_blp.events(timeout=1)
-                rich.print(str(events))
-
-                for ev in events:
-                    # todo: check if elements in ev
+class StatusEventHandler(blp.EventHandler):
+    """
+    blp event handler that also queues the session and subscription status messages with the
+    market data, so the SubscriptionManager sees failures in the event stream.
+    """
+    def session_status_event(self, event):
+        super().session_status_event(event)
+        for msg in event:
+            if str(msg.messageType()) in SESSION_DOWN_MESSAGES and not self.closed.is_set():
+                self.data_queue.put(blp.message_to_dict(msg))
 
-                    utc_timestamp = ev['timeReceived']
+    def subscription_status_event(self, event):
+        super().subscription_status_event(event)
+        for msg in event:
+            if str(msg.messageType()) in SUBSCRIPTION_FAILURE_MESSAGES:
+                self.data_queue.put(blp.message_to_dict(msg))
 
-                    correlation_ids = ev['correlationIds']
-                    cid = correlation_ids[0] # ?
 
-                    rt_mkt_data = ev['element']['MarketDataEvents']
-                    #if not 'LAST_PRICE' in rt_mkt_data:
-                    #    continue
+class StatusBlpStream(blp.BlpStream):
+    def __init__(self, host: str = "localhost", port: int = 8194, **kwargs):
+        blp.BlpSession.__init__(self, StatusEventHandler(), host, port, **kwargs)
 
-                    last_price, bid_price, ask_price = None, None, None
 
-                    if 'LAST_PRICE' in rt_mkt_data:
-                        last_price = rt_mkt_data['LAST_PRICE']
+class BlpEventSource:
+    """
+    Bloomberg stream session as a SubscriptionManager event source.
+    """
+    def __init__(self, host: str = "localhost", port: int = 8194, subscribe_timeout_s: int = 30, max_events: int = 10000):
+        self.host = host
+        self.port = port
+        self.subscribe_timeout_s = subscribe_timeout_s
+        self.max_events = max_events
+        self.stream = None
+
+    def open(self) -> None:
+        stream = StatusBlpStream(self.host, self.port)
+        stream.__enter__()
+        self.stream = stream
+
+    def close(self) -> None:
+        if self.stream is not None:
+            try:
+                self.stream.__exit__(None, None, None)
+            except Exception as e:
+                logger.warning(f"Closing the Bloomberg stream session failed: {e}")
+            self.stream = None
 
-                    if 'BID' in rt_mkt_data:
-                        bid_price  = rt_mkt_data['BID']
+    def subscribe(self, topics: dict) -> dict:
+        try:
+            return self.stream.subscribe(topics, timeout=self.subscribe_timeout_s)
+        except queue.Empty:
+            # no status in time: the whole batch is retried with backoff
+            logger.warning(f"Bloomberg subscribe timed out for {len(topics)} topics")
+            return {}
 
-                    if 'ASK' in rt_mkt_data:
-                        ask_price  = rt_mkt_data['ASK']
+    def unsubscribe(self, topics: dict) -> None:
+        try:
+            self.stream.unsubscribe(topics, timeout=self.subscribe_timeout_s)
+        except queue.Empty:
+            logger.warning(f"Bloomberg unsubscribe timed out for {len(topics)} topics")
 
-                    # rich.print(ev)
-                    # rich.print(f"{utc_timestamp} {ticker} {rt_quote}")
-                    # n += 1
-                    # if n > 2:
-                    #     break
+    def events(self, timeout: float) -> list:
+        data_queue = self.stream.event_handler.data_queue
+        try:
+            messages = [data_queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(messages) < self.max_events:
+            try:
+                messages.append(data_queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
 
-                    yield cid, last_price, bid_price, ask_price
 
-            except Exception as e:
-                yield cid, None, None, None
-                #raise e
-            
+def real_time_api(tickers):
+    """
+    Long-lived Bloomberg subscription of every FIGI of `tickers`. The returned manager is
+    iterated for (cid, last, bid, ask) ticks; cids are added or removed with its
+    subscribe / unsubscribe methods while it runs.
+    """
+    config = Settings().get_bbg_subscription_config()
+    manager = SubscriptionManager(BlpEventSource(config['host'], config['port']),
+                                  interval_s=config['interval_s'],
+                                  poll_timeout_s=config['poll_timeout_s'],
+                                  backoff_initial_s=config['backoff_initial_s'],
+                                  backoff_max_s=config['backoff_max_s'],
+                                  batch_size=config['batch_size'])
+    manager.subscribe(tickers['figi'].dropna().unique().tolist())
+    return manager
 
 
 def timeseries_market_data_api(db, figis, start_date : date, end_date : date) -> None:
@@ -819,4 +851,60 @@ def load_intraday_trade_blotter_api(cob_date : date) -> None:
             """
             db.execute(qry)
             db.commit()
-            
\ No newline at end of file
+            
+
+# Bloomberg cid (/sedol/... or option ticker) -> FIGI, filled lazily by intraday_fills_api
+intraday_fills_figi_cache = {}
+
+def intraday_fills_api(cob_date : date) -> pd.DataFrame:
+    """
+    Reads the EMSX intraday blotter without touching the database.
+
+    Returns one row per order with its latest cumulative fill:
+        order_id, portfolio_id, figi, cum_quantity (signed), avg_price
+    Orders whose account or FIGI is not mapped yet are kept with a NaN portfolio_id / figi,
+    so the fill tracker still keys them by order_id.
+    """
+    columns = ['order_id', 'portfolio_id', 'figi', 'cum_quantity', 'avg_price']
+
+    intraday_trade_blotter_files = SaaSConfig().get_emsx_csv_files(cob_date)
+    fills = [pd.read_csv(file) for file in intraday_trade_blotter_files if file.exists()]
+    fills = [fi for fi in fills if not fi.empty and not fi.isna().all().all()]
+
+    if len(fills) == 0:
+        return pd.DataFrame(columns=columns)
+
+    trade_blotter_df = pd.concat(fills).reset_index(drop=True)
+    trade_blotter_df['SEDOL'] = trade_blotter_df['SEDOL'].astype(str).str.replace(r'\.0$', '', regex=True)
+
+    # "Day Fill Amount" / "Day Avg Price" are cumulative per order: keep the latest execution report
+    trade_blotter_df = trade_blotter_df.sort_values('Exec Seq Number').groupby('Order Number').tail(1)
+
+    stock_broker = SaaSConfig().get_emsx_stock_broker()
+    options_broker = SaaSConfig().get_emsx_options_broker()
+
+    trade_blotter_df = trade_blotter_df[trade_blotter_df['Broker'].isin([stock_broker, options_broker])].copy()
+    trade_blotter_df['cid'] = ('/sedol/' + trade_blotter_df['SEDOL']).where(
+        trade_blotter_df['Broker'] == stock_broker, trade_blotter_df['Ticker'] + ' Equity')
+
+    new_cids = [cid for cid in trade_blotter_df['cid'].unique() if cid not in intraday_fills_figi_cache]
+    if len(new_cids) > 0:
+        bqry = get_bqry_session()
+        if bqry is not None:
+            figis = bqry.bdp(new_cids, ["ID_BB_GLOBAL"])
+            intraday_fills_figi_cache.update(zip(figis['security'], figis['ID_BB_GLOBAL']))
+
+    with Settings().get_db_connection() as db:
+        portfolios = db.execute("SELECT portfolio_id, portfolio_name FROM portfolios").fetchdf()
+
+    sign = trade_blotter_df['Side'].map({'S': -1, 'SS': -1}).fillna(1)
+
+    fills_df = pd.DataFrame({
+        'order_id': trade_blotter_df['Order Number'].astype(str),
+        'portfolio_id': trade_blotter_df['Tran Account'].map(dict(zip(portfolios['portfolio_name'], portfolios['portfolio_id']))),
+        'figi': trade_blotter_df['cid'].map(intraday_fills_figi_cache),
+        'cum_quantity': sign * trade_blotter_df['Day Fill Amount'],
+        'avg_price': trade_blotter_df['Day Avg Price'],
+    })
+
+    return fills_df.reset_index(drop=True)
@@ -0,0 +1,331 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Long-lived real-time subscription session.
+#
+#   subscribe(cids) / unsubscribe(cids)  (any thread)
+#        │
+#        ▼
+#   pending adds / removes ──> _sync() ──> source.subscribe / source.unsubscribe   (deltas only)
+#                                                │
+#   source.events() ──> MarketDataEvents ──> (cid, last, bid, ask)  yielded
+#                  ──> SubscriptionFailure / Terminated ──> failed[cid]: retried with backoff
+#                  ──> SessionConnectionDown / Terminated ──> reconnect with backoff,
+#                                                            resubscribe the wanted cids
+#
+# The event source is a Bloomberg stream session (bbg/api.py BlpEventSource) or the in-process
+# LocalEventSource, which speaks the same message dicts so the manager runs without a terminal.
+#
+
+import queue
+import threading
+import time
+
+from loguru import logger
+
+
+MARKET_DATA_MESSAGES = ('MarketDataEvents', 'MarketBarStart', 'MarketBarUpdate')
+SUBSCRIPTION_FAILURE_MESSAGES = ('SubscriptionFailure', 'SubscriptionTerminated')
+SESSION_DOWN_MESSAGES = ('SessionConnectionDown', 'SessionTerminated')
+
+DEFAULT_FIELDS = ['LAST_PRICE', 'BID', 'ASK']
+
+
+def market_data_message(cid, last=None, bid=None, ask=None) -> dict:
+    """
+    MarketDataEvents message in the blp message_to_dict format.
+    """
+    fields = {name: value for name, value in (('LAST_PRICE', last), ('BID', bid), ('ASK', ask)) if value is not None}
+    return {
+        'correlationIds': [cid],
+        'messageType': 'MarketDataEvents',
+        'timeReceived': None,
+        'element': {'MarketDataEvents': fields},
+    }
+
+
+def status_message(message_type: str, cids=()) -> dict:
+    return {
+        'correlationIds': list(cids),
+        'messageType': message_type,
+        'timeReceived': None,
+        'element': {message_type: {}},
+    }
+
+
+class SubscriptionManager:
+    """
+    Keeps one session open and its subscriptions in line with the wanted cids.
+
+    Iterating the manager (on one thread, e.g. the TickBatcher reader) runs the session and
+    yields (cid, last, bid, ask) ticks; subscribe / unsubscribe may be called from any thread
+    and are applied between event polls.
+
+    Args:
+        source: event source (open, close, subscribe, unsubscribe, events).
+        fields: real-time fields of every subscription.
+        interval_s: conflation interval of the subscriptions (0: every update).
+        poll_timeout_s: longest wait for events before pending changes are applied.
+        backoff_initial_s: first reconnect / resubscribe delay, doubled on every failure.
+        backoff_max_s: upper bound of the delays.
+        batch_size: cids per subscribe call.
+    """
+    def __init__(self, source, fields=DEFAULT_FIELDS, interval_s: float = 0.0, poll_timeout_s: float = 1.0,
+                 backoff_initial_s: float = 1.0, backoff_max_s: float = 60.0, batch_size: int = 500):
+        self.source = source
+        self.fields = list(fields)
+        self.interval_s = interval_s
+        self.poll_timeout_s = poll_timeout_s
+        self.backoff_initial_s = backoff_initial_s
+        self.backoff_max_s = backoff_max_s
+        self.batch_size = max(int(batch_size), 1)
+
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self.wanted = set()
+        self.active = set()
+        self._pending_add = set()
+        self._pending_remove = set()
+        # cid -> (failed attempts, monotonic time of the next attempt)
+        self.failed = {}
+
+        self.connected = False
+        self.num_reconnects = 0
+        self.num_subscription_failures = 0
+        self.num_messages = 0
+
+    ################################################################################################
+    # wanted cids (any thread)
+    ################################################################################################
+
+    def subscribe(self, cids) -> None:
+        with self._lock:
+            new = set(cids) - self.wanted
+            self.wanted |= new
+            self._pending_add |= new
+            self._pending_remove -= new
+
+    def unsubscribe(self, cids) -> None:
+        with self._lock:
+            gone = set(cids) & self.wanted
+            self.wanted -= gone
+            self._pending_add -= gone
+            self._pending_remove |= gone
+            for cid in gone:
+                self.failed.pop(cid, None)
+
+    def set_universe(self, cids) -> None:
+        """
+        Subscribes the new cids and unsubscribes the ones no longer wanted.
+        """
+        cids = set(cids)
+        with self._lock:
+            gone = self.wanted - cids
+        self.unsubscribe(gone)
+        self.subscribe(cids)
+
+    def close(self) -> None:
+        self._closed.set()
+
+    ################################################################################################
+    # session (iterating thread)
+    ################################################################################################
+
+    def _topics(self, cids) -> dict:
+        topic = {'fields': self.fields}
+        if self.interval_s > 0:
+            topic['options'] = {'interval': self.interval_s}
+        return {cid: topic for cid in cids}
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.backoff_initial_s * 2 ** max(attempts - 1, 0), self.backoff_max_s)
+
+    def _mark_failed(self, cids, now: float) -> None:
+        for cid in cids:
+            if cid not in self.wanted:
+                continue
+            self.active.discard(cid)
+            attempts = self.failed.get(cid, (0, 0.0))[0] + 1
+            self.failed[cid] = (attempts, now + self._retry_delay(attempts))
+            self.num_subscription_failures += 1
+
+    def _sync(self) -> None:
+        """
+        Applies the pending changes and retries the failed subscriptions that are due.
+        """
+        now = time.monotonic()
+        with self._lock:
+            remove = sorted(self._pending_remove & self.active, key=str)
+            self._pending_remove.clear()
+            due = [cid for cid, (_, retry_at) in self.failed.items() if retry_at <= now]
+            add = sorted((self._pending_add | set(due)) - self.active, key=str)
+            self._pending_add.clear()
+
+        if len(remove) > 0:
+            self.source.unsubscribe(self._topics(remove))
+            with self._lock:
+                self.active -= set(remove)
+            logger.info(f"Real-time subscriptions: removed {len(remove)}")
+
+        for i in range(0, len(add), self.batch_size):
+            batch = add[i:i + self.batch_size]
+            results = self.source.subscribe(self._topics(batch))
+
+            with self._lock:
+                batch = [cid for cid in batch if cid in self.wanted]
+                failed = [cid for cid in batch if results.get(cid, False) is False]
+                started = [cid for cid in batch if results.get(cid, False) is not False]
+                self.active |= set(started)
+                for cid in started:
+                    self.failed.pop(cid, None)
+                self._mark_failed(failed, now)
+
+            if len(failed) > 0:
+                logger.warning(f"Real-time subscriptions failed for {len(failed)} cids (retried with backoff): {failed[:10]}")
+
+        if len(add) > 0:
+            logger.info(f"Real-time subscriptions: {len(self.active)} active, {len(self.failed)} failed")
+
+    def _on_message(self, msg: dict):
+        """
+        Returns the (cid, last, bid, ask) tick of a market data message, None otherwise.
+        Raises ConnectionError when the session is down.
+        """
+        message_type = msg.get('messageType')
+
+        if message_type in MARKET_DATA_MESSAGES:
+            self.num_messages += 1
+            cid = msg['correlationIds'][0]
+            fields = msg['element'].get('MarketDataEvents', {})
+            return cid, fields.get('LAST_PRICE'), fields.get('BID'), fields.get('ASK')
+
+        if message_type in SUBSCRIPTION_FAILURE_MESSAGES:
+            with self._lock:
+                # Terminated also follows our own unsubscribes, only active cids are retried
+                cids = [cid for cid in msg['correlationIds'] if cid in self.active]
+                self._mark_failed(cids, time.monotonic())
+            if len(cids) > 0:
+                logger.warning(f"{message_type}: {cids}, resubscribing with backoff")
+            return None
+
+        if message_type in SESSION_DOWN_MESSAGES:
+            raise ConnectionError(message_type)
+
+        return None
+
+    def _reset_session(self) -> None:
+        # a new session holds no subscriptions: every wanted cid is subscribed again
+        with self._lock:
+            self.active.clear()
+            self.failed.clear()
+            self._pending_remove.clear()
+            self._pending_add = set(self.wanted)
+
+    def __iter__(self):
+        backoff_s = self.backoff_initial_s
+
+        while not self._closed.is_set():
+            try:
+                self._reset_session()
+                self.source.open()
+                self.connected = True
+                logger.info(f"Real-time session open, subscribing {len(self.wanted)} cids")
+
+                while not self._closed.is_set():
+                    self._sync()
+                    backoff_s = self.backoff_initial_s
+                    for msg in self.source.events(self.poll_timeout_s):
+                        tick = self._on_message(msg)
+                        if tick is not None:
+                            yield tick
+
+            except Exception as e:
+                if self._closed.is_set():
+                    break
+                self.num_reconnects += 1
+                logger.error(f"Real-time session lost ({e!r}), reconnecting in {backoff_s:.1f} s")
+                self._closed.wait(backoff_s)
+                backoff_s = min(2 * backoff_s, self.backoff_max_s)
+
+            finally:
+                self.connected = False
+                self.source.close()
+
+    def as_dict(self) -> dict:
+        return {
+            'connected': self.connected,
+            'wanted': len(self.wanted),
+            'active': len(self.active),
+            'failed': len(self.failed),
+            'reconnects': self.num_reconnects,
+            'subscription_failures': self.num_subscription_failures,
+            'messages': self.num_messages,
+        }
+
+
+class LocalEventSource:
+    """
+    In-process stand-in for a Bloomberg stream session, driven by publish / fail_subscription /
+    disconnect, for running the SubscriptionManager without a terminal.
+
+    Args:
+        reject: cids whose subscriptions fail.
+        fail_opens: number of open() calls that fail before the session comes up.
+    """
+    def __init__(self, reject=(), fail_opens: int = 0):
+        self.reject = set(reject)
+        self.fail_opens = fail_opens
+
+        self.queue = queue.Queue()
+        self.subscribed = set()
+        self.is_open = False
+        self.num_opens = 0
+        self.num_subscribe_calls = 0
+        self.subscribe_log = []
+
+    def open(self) -> None:
+        if self.fail_opens > 0:
+            self.fail_opens -= 1
+            raise ConnectionError("local session failed to start")
+        self.subscribed.clear()
+        self.is_open = True
+        self.num_opens += 1
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def subscribe(self, topics: dict) -> dict:
+        self.num_subscribe_calls += 1
+        self.subscribe_log.append(sorted(topics, key=str))
+        results = {cid: cid not in self.reject for cid in topics}
+        self.subscribed |= {cid for cid, ok in results.items() if ok}
+        return results
+
+    def unsubscribe(self, topics: dict) -> None:
+        self.subscribed -= set(topics)
+
+    def events(self, timeout: float) -> list:
+        try:
+            messages = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    # driving the stand-in
+
+    def publish(self, cid, last=None, bid=None, ask=None) -> bool:
+        if not self.is_open or cid not in self.subscribed:
+            return False
+        self.queue.put(market_data_message(cid, last, bid, ask))
+        return True
+
+    def fail_subscription(self, cid, message_type: str = 'SubscriptionFailure') -> None:
+        self.subscribed.discard(cid)
+        self.queue.put(status_message(message_type, [cid]))
+
+    def disconnect(self) -> None:
+        self.queue.put(status_message('SessionConnectionDown'))
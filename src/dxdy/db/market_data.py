@@ -2,6 +2,8 @@
 
 from datetime import date
 
+import pandas as pd
+
 from loguru import logger
 import rich
 
@@ -9,8 +11,10 @@ import dxdy.bbg
 import dxdy.bbg.api
 import dxdy.quant
 import dxdy.quant.api
+import dxdy.quant.synthetic_feed
 import dxdy.yf
 import dxdy.yf.api
+import dxdy.rtd.tick_capture
 
 import dxdy.db.utils as db_utils
 from dxdy.settings import Settings
@@ -46,10 +50,21 @@ class MarketDataApi:
 
     def load_intraday_trade_blotter_api(self, cob_date : date) -> None:
         raise NotImplementedError
+
+    def intraday_fills_api(self, cob_date : date) -> pd.DataFrame:
+        raise NotImplementedError
     
     def securities_identifier(self) -> str:
         return 'figi'
     
+    def fx_rate_identifier(self, ccy: str) -> str:
+        # real-time FX ticker of a currency, quoted like the fx_rates_data history (None: not streamed)
+        if ccy == 'USD':
+            return None
+        if ccy == 'CAD':
+            return 'CADUSD Curncy'
+        return f'USD{ccy} Curncy'
+    
     
 class BbgMarketDataApi(MarketDataApi):
     def __init__(self):
@@ -81,6 +96,9 @@ class BbgMarketDataApi(MarketDataApi):
         
     def load_intraday_trade_blotter_api(self, cob_date : date) -> None:
         return dxdy.bbg.api.load_intraday_trade_blotter_api(cob_date)
+
+    def intraday_fills_api(self, cob_date : date) -> pd.DataFrame:
+        return dxdy.bbg.api.intraday_fills_api(cob_date)
        
         
 class SpaghettiQuantMarketDataApi(MarketDataApi):
@@ -110,6 +128,9 @@ class SpaghettiQuantMarketDataApi(MarketDataApi):
         
     def load_intraday_trade_blotter_api(self, cob_date : date) -> None:
         return dxdy.quant.api.load_intraday_trade_blotter_api(cob_date)
+
+    def intraday_fills_api(self, cob_date : date) -> pd.DataFrame:
+        return dxdy.quant.api.intraday_fills_api(cob_date)
     
 class YahooMarketDataApi(MarketDataApi):
     def __init__(self):
@@ -145,6 +166,48 @@ class YahooMarketDataApi(MarketDataApi):
     def load_intraday_trade_blotter_api(self, cob_date : date) -> None:
         return dxdy.quant.api.load_intraday_trade_blotter_api(cob_date)
 
+    def intraday_fills_api(self, cob_date : date) -> pd.DataFrame:
+        return dxdy.quant.api.intraday_fills_api(cob_date)
+
+
+class ReplayMarketDataApi(MarketDataApi):
+    """
+    Replays the ticks captured on [tick_replay] date (see rtd/tick_capture.py).
+
+    Intraday fills are not replayed, so the replayed P&L only depends on the captured ticks.
+    """
+    def __init__(self):
+        config = Settings().get_tick_replay_config()
+        self.directory = Settings().get_tick_capture_dir()
+        self.cob_date = config['date']
+        self.speed = config['speed']
+        logger.info(f"Using captured ticks of {self.cob_date} (replay)")
+
+    def real_time_api(self, tickers):
+        cids = tickers[self.securities_identifier()].unique()
+        return dxdy.rtd.tick_capture.replay_ticks(self.directory, self.cob_date, cids, self.speed)
+
+    def intraday_fills_api(self, cob_date : date) -> pd.DataFrame:
+        return pd.DataFrame(columns=['order_id', 'portfolio_id', self.securities_identifier(), 'cum_quantity', 'avg_price'])
+
+
+class SyntheticMarketDataApi(MarketDataApi):
+    """
+    Correlated GBM ticks for every instrument of the book at [synthetic_feed] rate
+    (see quant/synthetic_feed.py), for load testing. No intraday fills.
+    """
+    def __init__(self):
+        self.config = Settings().get_synthetic_feed_config()
+        logger.info(f"Using the synthetic market data feed (seed={self.config['seed']})")
+
+    def real_time_api(self, tickers):
+        config = dict(self.config)
+        del config['enabled']
+        return dxdy.quant.synthetic_feed.synthetic_ticks(tickers, self.securities_identifier(), **config)
+
+    def intraday_fills_api(self, cob_date : date) -> pd.DataFrame:
+        return pd.DataFrame(columns=['order_id', 'portfolio_id', self.securities_identifier(), 'cum_quantity', 'avg_price'])
+
 
 class MarketDataApiFactory:
     def get_api(self, market_data_provider: str) -> MarketDataApi:
@@ -157,6 +220,12 @@ class MarketDataApiFactory:
         elif market_data_provider == 'spgi':
             return SpaghettiQuantMarketDataApi()
         
+        elif market_data_provider == 'replay':
+            return ReplayMarketDataApi()
+        
+        elif market_data_provider == 'synthetic':
+            return SyntheticMarketDataApi()
+        
         else:
             raise ValueError(f"Unknown market data provider: {market_data_provider}")
     
\ No newline at end of file
@@ -62,6 +62,8 @@ def create_database_schema(db_path : Path):
         CREATE SEQUENCE IF NOT EXISTS seq_option_position_id START 1;
 
         CREATE SEQUENCE IF NOT EXISTS seq_daily_position_id START 1;
+
+        CREATE SEQUENCE IF NOT EXISTS seq_risk_limit_id START 1;
         """
         cursor.execute(sequences_sql)
         logger.info("Sequences created successfully.")
@@ -357,6 +359,41 @@ def create_database_schema(db_path : Path):
         """
         cursor.execute(ai_table_sql)
         logger.info("Table 'ai_analysis' created successfully.")
+
+        # Create the 'risk_limits' table (evaluated in real time by the RTD server, see rtd/limits.py)
+        risk_limits_table_sql = """
+        CREATE TABLE IF NOT EXISTS risk_limits (
+            limit_id INTEGER PRIMARY KEY DEFAULT NEXTVAL('seq_risk_limit_id'),
+            portfolio_id INTEGER NOT NULL REFERENCES portfolios(portfolio_id),
+            limit_type TEXT NOT NULL,       -- gross_exposure | net_exposure | single_name_pct_aum | sector_pct_aum
+            scope TEXT,                     -- sector name / security identifier (NULL: every sector / name)
+            threshold DOUBLE NOT NULL,      -- fraction of the portfolio AUM
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            created_by TEXT,
+            updated_by TEXT
+        );
+        """
+        cursor.execute(risk_limits_table_sql)
+        logger.info("Table 'risk_limits' created successfully.")
+
+        risk_limit_events_table_sql = """
+        CREATE TABLE IF NOT EXISTS risk_limit_events (
+            event_time TIMESTAMP NOT NULL,
+            cob_date DATE NOT NULL,
+            limit_id INTEGER NOT NULL,
+            portfolio_id INTEGER NOT NULL,
+            limit_type TEXT NOT NULL,
+            scope TEXT,
+            row_num BIGINT,
+            event TEXT NOT NULL,            -- breach | clear
+            value DOUBLE,
+            threshold DOUBLE
+        );
+        """
+        cursor.execute(risk_limit_events_table_sql)
+        logger.info("Table 'risk_limit_events' created successfully.")
         
         # Commit the transaction
         cursor.execute('COMMIT;')
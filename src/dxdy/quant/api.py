@@ -356,4 +356,28 @@ def load_intraday_trade_blotter_api(cob_date : date) -> None:
             db.execute(qry)
             db.commit()
             
-            logger.debug(f"Inserted new trades data for {new_trades}")    
\ No newline at end of file
+            logger.debug(f"Inserted new trades data for {new_trades}")    
+
+
+def intraday_fills_api(cob_date : date) -> pd.DataFrame:
+    """
+    Reads the intraday trade blotter without touching the database.
+
+    Every blotter line is a complete fill, identified by its position in the (append-only) file:
+        order_id, portfolio_id, figi, cum_quantity (signed), avg_price
+    """
+    date_str = cob_date.strftime("%Y-%m-%d")
+    csv_file = test_data_dir / 'trade_blotter' / f'{date_str}.csv'
+
+    if not csv_file.exists():
+        return pd.DataFrame(columns=['order_id', 'portfolio_id', 'figi', 'cum_quantity', 'avg_price'])
+
+    new_trades = pd.read_csv(csv_file)
+
+    return pd.DataFrame({
+        'order_id': new_trades.index.astype(str),
+        'portfolio_id': new_trades['portfolio_id'],
+        'figi': new_trades['figi'],
+        'cum_quantity': new_trades['quantity'],
+        'avg_price': new_trades['price'],
+    })
@@ -0,0 +1,101 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# High-rate correlated synthetic tick feed, for load testing the RTD server and the dashboard.
+#
+#   block of R rounds:  market factor M[R, 1] ~ N(0, 1)        (one draw per round)
+#                       idiosyncratic E[R, N] ~ N(0, 1)
+#                       Z = sqrt(rho) M + sqrt(1 - rho) E     (pairwise correlation rho)
+#                       log S += -0.5 sigma^2 dt + sigma sqrt(dt) Z  (cumsum over the rounds)
+#
+# Every round moves all N instruments and yields one tick each, so a round lasts N / rate
+# seconds of feed time. Bursts (Poisson arrivals, exponential durations) multiply the rate.
+# All draws come from one seeded generator: the same seed gives the same ticks.
+#
+
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+
+
+# 252 days x 6.5 hours
+TRADING_SECONDS_PER_YEAR = 252 * 6.5 * 60 * 60
+
+
+def synthetic_ticks(positions_df: pd.DataFrame, cid_col: str = 'figi', rate: float = 10000.0, seed: int = None,
+                    sigma: float = 0.2, correlation: float = 0.3, spread_bps: float = 5.0,
+                    burst_rate_per_s: float = 0.0, burst_factor: float = 5.0, burst_duration_s: float = 1.0,
+                    block_rounds: int = 64, default_price: float = 100.0):
+    """
+    Yields (cid, last, bid, ask) correlated GBM ticks for every cid of `positions_df`.
+
+    Args:
+        positions_df: subscription request (one row per line, cid_col and close_price).
+        rate: aggregate ticks per second outside bursts (0: as fast as possible).
+        seed: seed of the generator (None: random).
+        sigma: annualized volatility of every instrument.
+        correlation: pairwise correlation of the log returns (one-factor model).
+        spread_bps: mean bid/ask spread in basis points of the price (lognormal around it).
+        burst_rate_per_s: mean number of bursts per second.
+        burst_factor: rate multiplier during a burst.
+        burst_duration_s: mean duration of a burst.
+        block_rounds: rounds drawn per vectorized block.
+        default_price: start price of the cids without a close.
+    """
+    start_df = positions_df[[cid_col, 'close_price']].drop_duplicates(cid_col)
+    cids = start_df[cid_col].tolist()
+    n = len(cids)
+    if n == 0:
+        return
+
+    rng = np.random.default_rng(seed)
+
+    log_price = np.log(start_df['close_price'].fillna(default_price).to_numpy(dtype=np.float64))
+    log_price = np.where(np.isfinite(log_price), log_price, math.log(default_price))
+
+    # feed time per round (outside bursts) drives the GBM time step
+    round_s = n / rate if rate > 0 else 1e-3
+    dt = round_s / TRADING_SECONDS_PER_YEAR
+    drift = -0.5 * sigma * sigma * dt
+    sigma_sqrt_dt = sigma * math.sqrt(dt)
+    factor_weight = math.sqrt(max(correlation, 0.0))
+    idio_weight = math.sqrt(max(1.0 - correlation, 0.0))
+    spread_scale = spread_bps * 1e-4
+
+    logger.info(f"Synthetic feed: {n} instruments, {rate:,.0f} ticks/s, seed={seed}, rho={correlation}, "
+                f"bursts={burst_rate_per_s}/s x{burst_factor}")
+
+    next_burst_s = rng.exponential(1.0 / burst_rate_per_s) if burst_rate_per_s > 0 else math.inf
+    burst_end_s = -math.inf
+
+    start = time.perf_counter()
+    feed_time_s = 0.0
+
+    while True:
+        factor = rng.standard_normal((block_rounds, 1))
+        idio = rng.standard_normal((block_rounds, n))
+        log_returns = drift + sigma_sqrt_dt * (factor_weight * factor + idio_weight * idio)
+        log_prices = log_price + np.cumsum(log_returns, axis=0)
+        log_price = log_prices[-1]
+
+        last = np.exp(log_prices)
+        half_spread = 0.5 * last * spread_scale * rng.lognormal(0.0, 0.25, (block_rounds, n))
+        bid = last - half_spread
+        ask = last + half_spread
+
+        for last_row, bid_row, ask_row in zip(last.tolist(), bid.tolist(), ask.tolist()):
+            if rate > 0:
+                if feed_time_s >= next_burst_s:
+                    burst_end_s = feed_time_s + rng.exponential(burst_duration_s)
+                    next_burst_s = feed_time_s + rng.exponential(1.0 / burst_rate_per_s)
+                feed_time_s += round_s / burst_factor if feed_time_s < burst_end_s else round_s
+
+                # paced per round (not per tick), the sleep granularity is far above 1 / rate
+                ahead_s = feed_time_s - (time.perf_counter() - start)
+                if ahead_s > 0:
+                    time.sleep(ahead_s)
+
+            yield from zip(cids, last_row, bid_row, ask_row)
@@ -0,0 +1,170 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Running portfolio / sector / currency / long-short aggregates of the RTD position book.
+#
+#   updated rows ──> values[rows] - contrib[rows] ──> sums[row_groups[rows]] += delta
+#                                                       (np.add.at, O(1) per row and dimension)
+#
+#   group ids: (dimension, portfolio_id, key)      e.g. (AGG_SECTOR, 3, 'Energy')
+#   row_groups[row] = [portfolio, sector, ccy, side] group of the row
+#
+# Each row remembers what it last contributed, so an update only adds the difference. A row
+# whose quantity changes sign moves from the long to the short bucket in the same pass.
+#
+
+import numpy as np
+
+from dxdy.rtd import wire_format
+
+
+AGG_PORTFOLIO = 0
+AGG_SECTOR = 1
+AGG_CCY = 2
+AGG_SIDE = 3
+
+DIMENSIONS = [AGG_PORTFOLIO, AGG_SECTOR, AGG_CCY, AGG_SIDE]
+
+# aggregated book fields (gross_pnl sums |pnl|)
+FIELDS = ['mkt_value', 'pnl', 'price_pnl', 'fx_pnl', 'gross_pnl']
+
+UNKNOWN_SECTOR = 'Unknown'
+
+
+class RunningAggregates:
+    """
+    Per-group sums of the book's FIELDS, maintained from the updated rows only.
+
+    Groups are created when rows are added (never on the tick path). The group attributes
+    (group_id, dimension, portfolio_id, key and one array per field) follow
+    wire_format.AGGREGATE_DTYPE, so `WireEncoder.encode_aggregates` packs them directly.
+    """
+    def __init__(self, book):
+        self.book = book
+
+        self.group_index = {}
+        self.group_id = np.empty(0, dtype=np.uint32)
+        self.dimension = np.empty(0, dtype=np.uint32)
+        self.portfolio_id = np.empty(0, dtype=np.int64)
+        self.key = np.empty(0, dtype=wire_format.AGGREGATE_DTYPE['key'])
+        self.sums = np.zeros((0, len(FIELDS)))
+        self._bind_fields()
+
+        # per book row
+        self.row_groups = np.empty((0, len(DIMENSIONS)), dtype=np.intp)
+        self.row_long = np.empty(0, dtype=np.intp)
+        self.row_short = np.empty(0, dtype=np.intp)
+        self.contrib = np.empty((0, len(FIELDS)))
+
+        self.add_rows(np.arange(book.size))
+
+    @property
+    def size(self) -> int:
+        return self.group_id.shape[0]
+
+    def _bind_fields(self) -> None:
+        # field attributes are column views of `sums`
+        for i, field in enumerate(FIELDS):
+            setattr(self, field, self.sums[:, i])
+
+    def _group(self, new_groups: list, dimension: int, portfolio_id, key: str) -> int:
+        group = self.group_index.get((dimension, portfolio_id, key))
+        if group is None:
+            group = len(self.group_index)
+            self.group_index[(dimension, portfolio_id, key)] = group
+            new_groups.append((dimension, portfolio_id, key))
+        return group
+
+    def add_rows(self, rows) -> np.ndarray:
+        """
+        Assigns new book rows (appended by insert_line) to their groups and adds them to the sums.
+
+        Returns the group ids that changed.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        static_df = self.book.static_df.iloc[rows]
+
+        portfolio_ids = self.book.portfolio_id[rows].tolist()
+        ccys = static_df['ccy'].fillna('').tolist()
+        if 'sector_name' in static_df.columns:
+            sectors = static_df['sector_name'].fillna(UNKNOWN_SECTOR).tolist()
+        else:
+            sectors = [UNKNOWN_SECTOR] * rows.shape[0]
+
+        new_groups = []
+        row_groups = np.empty((rows.shape[0], len(DIMENSIONS)), dtype=np.intp)
+        row_long = np.empty(rows.shape[0], dtype=np.intp)
+        row_short = np.empty(rows.shape[0], dtype=np.intp)
+        for i, (portfolio_id, sector, ccy) in enumerate(zip(portfolio_ids, sectors, ccys)):
+            row_groups[i, AGG_PORTFOLIO] = self._group(new_groups, AGG_PORTFOLIO, portfolio_id, '')
+            row_groups[i, AGG_SECTOR] = self._group(new_groups, AGG_SECTOR, portfolio_id, sector)
+            row_groups[i, AGG_CCY] = self._group(new_groups, AGG_CCY, portfolio_id, ccy)
+            row_long[i] = self._group(new_groups, AGG_SIDE, portfolio_id, 'long')
+            row_short[i] = self._group(new_groups, AGG_SIDE, portfolio_id, 'short')
+        row_groups[:, AGG_SIDE] = np.where(self.book.quantity[rows] < 0, row_short, row_long)
+
+        if len(new_groups) > 0:
+            dimensions, group_portfolio_ids, keys = zip(*new_groups)
+            self.group_id = np.arange(self.size + len(new_groups), dtype=np.uint32)
+            self.dimension = np.concatenate([self.dimension, np.asarray(dimensions, dtype=np.uint32)])
+            self.portfolio_id = np.concatenate([self.portfolio_id, np.asarray(group_portfolio_ids, dtype=np.int64)])
+            self.key = np.concatenate([self.key, np.asarray([key.encode() for key in keys], dtype=self.key.dtype)])
+            self.sums = np.concatenate([self.sums, np.zeros((len(new_groups), len(FIELDS)))])
+            self._bind_fields()
+
+        self.row_groups = np.concatenate([self.row_groups, row_groups])
+        self.row_long = np.concatenate([self.row_long, row_long])
+        self.row_short = np.concatenate([self.row_short, row_short])
+        self.contrib = np.concatenate([self.contrib, np.zeros((rows.shape[0], len(FIELDS)))])
+
+        return self.update(rows)
+
+    def update(self, rows) -> np.ndarray:
+        """
+        Adds the change of the given rows since their last update to their groups.
+
+        Returns the group ids that changed (sorted).
+        """
+        rows = np.unique(rows)
+        if rows.shape[0] == 0:
+            return np.empty(0, dtype=np.intp)
+
+        book = self.book
+        pnl = book.pnl[rows]
+        values = np.column_stack([book.mkt_value[rows], pnl, book.price_pnl[rows], book.fx_pnl[rows], np.abs(pnl)])
+        values = np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+
+        old_groups = self.row_groups[rows].ravel()
+        self.row_groups[rows, AGG_SIDE] = np.where(book.quantity[rows] < 0, self.row_short[rows], self.row_long[rows])
+        new_groups = self.row_groups[rows].ravel()
+
+        num_dimensions = len(DIMENSIONS)
+        np.subtract.at(self.sums, old_groups, np.repeat(self.contrib[rows], num_dimensions, axis=0))
+        np.add.at(self.sums, new_groups, np.repeat(values, num_dimensions, axis=0))
+        self.contrib[rows] = values
+
+        return np.union1d(old_groups, new_groups)
+
+    def rebuild(self) -> None:
+        """
+        Recomputes every sum from the rows (clears the rounding accumulated by the deltas).
+        """
+        self.sums[:] = 0.0
+        self.contrib[:] = 0.0
+        self.update(np.arange(self.book.size))
+
+    def value(self, dimension: int, portfolio_id, key: str = '', field: str = 'pnl') -> float:
+        group = self.group_index.get((dimension, portfolio_id, key))
+        if group is None:
+            return 0.0
+        return float(self.sums[group, FIELDS.index(field)])
+
+    def portfolio_pnl_series(self, portfolio_id) -> dict:
+        """
+        Net, long, short and gross intraday P&L of a portfolio (as PositionBook.portfolio_pnl_series).
+        """
+        return {
+            'net': self.value(AGG_PORTFOLIO, portfolio_id),
+            'long': self.value(AGG_SIDE, portfolio_id, 'long'),
+            'short': self.value(AGG_SIDE, portfolio_id, 'short'),
+            'gross': self.value(AGG_PORTFOLIO, portfolio_id, field='gross_pnl'),
+        }
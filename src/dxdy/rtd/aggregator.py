@@ -0,0 +1,338 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Sharded RTD mode: N RtdCalcServer worker processes + one aggregator.
+#
+#   shard 0 ─ PUB :7100 / REP :7101 ──┐
+#   shard 1 ─ PUB :7102 / REP :7103 ──┼──> RtdAggregator ── PUB realtime_calculation_tcp_socket
+#   ...                               │      (merged book)    REP realtime_snapshot_tcp_socket
+#   shard N-1 ────────────────────────┘      running totals -> MSG_AGGREGATES, limits, VaR, intraday P&L files, emails
+#                                                                 REP realtime_stats_tcp_socket
+#
+# Each shard owns a partition of the book (see rtd/partition.py). The aggregator keeps a
+# merged PositionBook built from the shard snapshots, applies the shard deltas to it by
+# row_num and re-publishes them with its own sequence numbers, so subscribers (the dashboard)
+# see a single server. A gap or reload on a shard re-syncs only that shard.
+#
+
+import asyncio
+import time
+from multiprocessing import Process
+
+import numpy as np
+import pandas as pd
+
+import zmq
+import zmq.asyncio
+
+from loguru import logger
+
+from dxdy.settings import Settings
+import dxdy.db.utils as db_utils
+from dxdy.eod.tasks import task_load_intraday_transactions_data
+from dxdy.rtd import wire_format
+from dxdy.rtd.rtd_calcs import RtdCalcServer, CID, send_intraday_email, get_rtd_risk_limits, persist_risk_limit_events, \
+    get_rtd_covariance_cache, API, API_SELECTION
+from dxdy.rtd.position_book import PositionBook
+from dxdy.rtd.aggregates import RunningAggregates
+from dxdy.rtd.limits import LimitEngine, LimitEventWriter
+from dxdy.rtd.var import CovarianceCache, IntradayVar
+from dxdy.rtd.snapshot import SnapshotService, request_snapshot
+from dxdy.rtd.pnl_store import PnlSeriesWriter, intraday_pnl_file_path
+from dxdy.rtd.partition import shard_endpoints
+from dxdy.rtd.runtime import every
+from dxdy.rtd.latency import LatencyStats, StatsService
+from dxdy.rtd.clock import get_clock
+
+
+def run_shard(shard_id: int, startup_fills_df: pd.DataFrame = None) -> None:
+    RtdCalcServer(shard_id, startup_fills_df=startup_fills_df).run()
+
+
+class RtdAggregator:
+    """
+    Merges the deltas of the RTD shards and re-publishes them on the regular RTD endpoints.
+    """
+
+    # column of the merged book holding the shard that owns each row
+    SHARD_COL = 'shard_id'
+
+    STARTUP_TIMEOUT_MS = 120000
+
+    def __init__(self):
+        self.sharding = Settings().get_rtd_sharding_config()
+        self.num_shards = self.sharding['shards']
+        self.endpoints = [shard_endpoints(self.sharding, shard_id) for shard_id in range(self.num_shards)]
+
+        self.ZMQ_PUB = Settings().get_realtime_calculation_tcp_socket()
+        self.ZMQ_SNAPSHOT = Settings().get_realtime_snapshot_tcp_socket()
+        self.ZMQ_STATS = Settings().get_realtime_stats_tcp_socket()
+        self.pub_hwm = Settings().get_rtd_pub_hwm()
+        self.local_tz = Settings().get_timezone()
+        self.runtime_config = Settings().get_rtd_runtime_config()
+        self.clock = get_clock()
+
+        self.context = None
+        self.req_context = None
+        self.pub_socket = None
+        self.sub_sockets = []
+        self.snapshot_service : SnapshotService = None
+        self.stats_service : StatsService = None
+        self.stats = LatencyStats()
+        self.encoder = wire_format.WireEncoder()
+        self.trackers = [wire_format.SequenceTracker() for _ in range(self.num_shards)]
+        self.book : PositionBook = None
+        self.aggregates : RunningAggregates = None
+        self.limits_config = Settings().get_risk_limits_config()
+        self.limits_df : pd.DataFrame = None
+        self.limits : LimitEngine = None
+        self.limit_writer : LimitEventWriter = None
+        self.var_config = Settings().get_intraday_var_config()
+        self.covariance : CovarianceCache = None
+        self.var : IntradayVar = None
+        self.intraday_files = {}
+        self.cur_cob_date = None
+
+    def shard_snapshot(self, shard_id: int, timeout_ms: int = 5000) -> pd.DataFrame:
+        """
+        Requests a shard's book and syncs its sequence tracker (empty frame if it does not answer).
+        """
+        snapshot = request_snapshot(self.req_context, self.endpoints[shard_id][1], timeout_ms, self.local_tz)
+        if snapshot is None:
+            logger.warning(f"RTD shard {shard_id} did not answer the snapshot request")
+            self.trackers[shard_id].reset()
+            return pd.DataFrame()
+
+        header, positions_df = snapshot
+        self.trackers[shard_id].sync(header['seq'])
+        positions_df[self.SHARD_COL] = shard_id
+        return positions_df
+
+    def rebuild_book(self, frames: list) -> None:
+        frames = [df for df in frames if not df.empty]
+        if len(frames) == 0:
+            raise ValueError("No RTD shard returned a snapshot")
+
+        positions_df = pd.concat(frames, ignore_index=True).sort_values('row_num', kind='stable')
+        self.book = PositionBook(positions_df, CID, self.local_tz)
+        self.aggregates = RunningAggregates(self.book)
+
+        if self.limits_df is not None and self.limits_df.shape[0] > 0:
+            # limits still in breach on the previous merged book are not reported again
+            breached = self.limits.breached_keys() if self.limits is not None else None
+            self.limits = LimitEngine(self.book, self.aggregates, self.limits_df, self.limits_config['clear_hysteresis'], breached)
+            self.limit_writer.put(self.limits.evaluate(np.arange(self.book.size), self.clock.now_ns()))
+
+        if self.covariance is not None:
+            # the covariance is cached, only the quadratic forms are recomputed
+            self.var = IntradayVar(self.book, self.covariance.get,
+                                   confidence=self.var_config['confidence'],
+                                   horizon_days=self.var_config['horizon_days'],
+                                   recompute_every=self.var_config['recompute_every'])
+
+        for portfolio_id in self.book.portfolio_ids():
+            if portfolio_id not in self.intraday_files:
+                file_path = intraday_pnl_file_path(Settings().get_intraday_pnl_files_dir(), self.cur_cob_date, portfolio_id)
+                self.intraday_files[portfolio_id] = PnlSeriesWriter(file_path, int(portfolio_id), self.clock.now_ns())
+
+    async def resync_shard(self, shard_id: int) -> None:
+        positions_df = await asyncio.to_thread(self.shard_snapshot, shard_id)
+
+        current_df = self.book.to_dataframe()
+        frames = [current_df[current_df[self.SHARD_COL] != shard_id], positions_df]
+        self.rebuild_book(frames)
+
+        # the merged book was rebuilt: subscribers re-sync from the snapshot endpoint
+        await self.pub_socket.send(self.encoder.encode_reload(self.clock.now_ns()))
+        logger.info(f"Re-synced RTD shard {shard_id}")
+
+    async def shard_task(self, shard_id: int) -> None:
+        socket = self.sub_sockets[shard_id]
+        tracker = self.trackers[shard_id]
+
+        while True:
+            frame = await socket.recv(copy=False)
+            try:
+                header, rows = wire_format.decode(frame)
+            except ValueError as e:
+                logger.warning(f"RTD shard {shard_id}: {e}")
+                continue
+
+            seq = int(header['seq'])
+            if tracker.is_stale(seq):
+                continue
+
+            missed = tracker.update(seq)
+            if missed > 0 or header['msg_type'] == wire_format.MSG_RELOAD:
+                if missed > 0:
+                    logger.warning(f"RTD shard {shard_id}: missed {missed} messages")
+                await self.resync_shard(shard_id)
+                continue
+
+            if header['msg_type'] not in (wire_format.MSG_POSITION_ROWS, wire_format.MSG_OPTION_ROWS):
+                continue
+
+            start_ns = time.perf_counter_ns()
+            self.stats.record('shard_to_aggregator', self.clock.now_ns() - int(header['timestamp_ns']))
+
+            book_rows = self.book.apply_rows(rows)
+
+            message = self.encoder.encode(int(header['msg_type']), int(header['timestamp_ns']),
+                                          int(header['schema_id']), rows)
+            await self.pub_socket.send(message, copy=False)
+
+            if self.var is not None:
+                # option rows carry the deltas, position rows the prices and quantities
+                portfolios = self.var.update(book_rows)
+                if len(portfolios) > 0:
+                    await self.pub_socket.send(self.encoder.encode_var(self.var.portfolio_var(portfolios), int(header['timestamp_ns'])),
+                                               copy=False)
+
+            if header['msg_type'] == wire_format.MSG_POSITION_ROWS:
+                # totals across the shards
+                groups = self.aggregates.update(book_rows)
+                await self.pub_socket.send(self.encoder.encode_aggregates(self.aggregates, groups, int(header['timestamp_ns'])),
+                                           copy=False)
+
+                if self.limits is not None:
+                    events = self.limits.evaluate(book_rows, int(header['timestamp_ns']))
+                    if events.shape[0] > 0:
+                        self.limit_writer.put(events)
+                        await self.pub_socket.send(self.encoder.encode_limit_events(events, int(header['timestamp_ns'])), copy=False)
+            self.stats.record('aggregate', time.perf_counter_ns() - start_ns)
+
+    async def snapshot_task(self) -> None:
+        await self.snapshot_service.serve(lambda: self.book, self.encoder, self.clock.now_ns)
+
+    async def publish_var_contributions(self) -> None:
+        # VaR of every portfolio (late joiners) and the contributions of the updated portfolios
+        timestamp_ns = self.clock.now_ns()
+        contributions = self.var.contributions(dirty=True)
+        await self.pub_socket.send(self.encoder.encode_var(self.var.portfolio_var(), timestamp_ns), copy=False)
+        if contributions.shape[0] > 0:
+            await self.pub_socket.send(self.encoder.encode_var_contributions(contributions, timestamp_ns), copy=False)
+
+    async def stats_task(self) -> None:
+        await self.stats_service.serve(self.metrics)
+
+    def persist_intraday_pnl(self) -> None:
+        # portfolio totals across the shards
+        local_time_ns = self.clock.now_ns()
+        for portfolio_id in self.book.portfolio_ids():
+            self.intraday_files[portfolio_id].append(local_time_ns, self.aggregates.portfolio_pnl_series(portfolio_id))
+
+    def spawn_intraday_email(self) -> None:
+        self.book.timestamp_ns = self.clock.now_ns()
+        proc = Process(target=send_intraday_email, args=(self.book.to_dataframe().drop(columns=[self.SHARD_COL]),))
+        proc.start()
+
+    def log_metrics(self) -> None:
+        gaps = ", ".join(f"shard {i}: seq={t.last_seq} gaps={t.num_gaps}" for i, t in enumerate(self.trackers))
+        logger.debug(f"RTD aggregator: {self.book.size} rows, {gaps}")
+        logger.debug(f"latency: {self.stats}")
+
+    def metrics(self) -> dict:
+        return {
+            'timestamp_ns': self.clock.now_ns(),
+            'latency': self.stats.as_dict(),
+            'shards': [
+                {'shard_id': i, 'last_seq': t.last_seq, 'num_gaps': t.num_gaps, 'num_missed': t.num_missed}
+                for i, t in enumerate(self.trackers)
+            ],
+            'limits': self.limits.as_dict() if self.limits is not None else None,
+            'var': self.var.as_dict() if self.var is not None else None,
+        }
+
+    async def main(self, cur_cob_date) -> None:
+        self.cur_cob_date = cur_cob_date
+
+        self.context = zmq.asyncio.Context()
+        self.req_context = zmq.Context()
+
+        self.pub_socket = self.context.socket(zmq.PUB)
+        self.pub_socket.setsockopt(zmq.SNDHWM, self.pub_hwm)
+        self.pub_socket.bind(self.ZMQ_PUB)
+
+        # subscribe first, then snapshot: deltas queued meanwhile are filtered by seq
+        for pub_endpoint, _ in self.endpoints:
+            socket = self.context.socket(zmq.SUB)
+            socket.setsockopt_string(zmq.SUBSCRIBE, "")
+            socket.connect(pub_endpoint)
+            self.sub_sockets.append(socket)
+
+        if self.limits_config['enabled']:
+            self.limits_df = await asyncio.to_thread(get_rtd_risk_limits)
+            self.limit_writer = LimitEventWriter(persist_risk_limit_events, db_utils.get_next_cob_date(), self.local_tz,
+                                                 self.limits_config['flush_interval_s'])
+
+        if self.var_config['enabled']:
+            self.covariance = await asyncio.to_thread(get_rtd_covariance_cache, cur_cob_date, self.var_config)
+
+        # the shards only answer once their book is loaded and their feed is subscribed
+        frames = [await asyncio.to_thread(self.shard_snapshot, shard_id, self.STARTUP_TIMEOUT_MS) for shard_id in range(self.num_shards)]
+        self.rebuild_book(frames)
+
+        self.snapshot_service = SnapshotService(self.context, self.ZMQ_SNAPSHOT)
+        self.stats_service = StatsService(self.context, self.ZMQ_STATS)
+
+        tasks = [asyncio.create_task(self.shard_task(shard_id), name=f'shard-{shard_id}') for shard_id in range(self.num_shards)]
+        tasks += [
+            asyncio.create_task(self.snapshot_task(), name='snapshot'),
+            asyncio.create_task(self.stats_task(), name='stats'),
+            asyncio.create_task(every(self.runtime_config['pnl_interval_s'], self.persist_intraday_pnl), name='pnl'),
+            asyncio.create_task(every(self.runtime_config['email_interval_s'], self.spawn_intraday_email), name='email'),
+            asyncio.create_task(every(self.runtime_config['metrics_interval_s'], self.log_metrics), name='metrics'),
+        ]
+        if self.var is not None:
+            tasks.append(asyncio.create_task(every(self.var_config['contributions_interval_s'], self.publish_var_contributions), name='var'))
+        await asyncio.gather(*tasks)
+
+    def close(self) -> None:
+        if self.limit_writer is not None:
+            self.limit_writer.close()
+        for file in self.intraday_files.values():
+            file.close()
+        self.intraday_files.clear()
+        if self.snapshot_service is not None:
+            self.snapshot_service.close()
+        if self.stats_service is not None:
+            self.stats_service.close()
+        for socket in self.sub_sockets:
+            socket.close()
+        if self.pub_socket is not None:
+            self.pub_socket.close()
+        if self.context is not None:
+            self.context.term()
+        if self.req_context is not None:
+            self.req_context.term()
+
+
+def run_sharded() -> None:
+    """
+    Starts the shard processes and runs the aggregator in this process.
+    """
+    sharding = Settings().get_rtd_sharding_config()
+    cur_cob_date = db_utils.get_current_cob_date()
+    next_cob_date = db_utils.get_next_cob_date()
+
+    # blotter snapshot taken before the load: every shard primes its fill tracker with it
+    startup_fills_df = API.intraday_fills_api(next_cob_date) if API_SELECTION != "replay" else None
+
+    # loaded once here instead of concurrently by every shard
+    task_load_intraday_transactions_data(next_cob_date, cur_cob_date)
+
+    shards = [Process(target=run_shard, args=(shard_id, startup_fills_df), name=f"rtd-shard-{shard_id}") for shard_id in range(sharding['shards'])]
+    for proc in shards:
+        proc.start()
+
+    aggregator = RtdAggregator()
+    try:
+        asyncio.run(aggregator.main(cur_cob_date))
+
+    except KeyboardInterrupt:
+        logger.info("RTD aggregator exiting")
+
+    finally:
+        aggregator.close()
+        for proc in shards:
+            proc.terminate()
+            proc.join()
@@ -0,0 +1,363 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# End-to-end throughput / latency benchmark of the RTD server.
+#
+#   BenchRtdCalcServer (process)                       run_case (this process)
+#   synthetic book + synthetic (or replayed) feed      HeadlessSubscriber: decode as RealTimeViewerWidget
+#     PUB ───────────────────────────────────────────>   tick_to_subscriber / rtd_to_subscriber histograms
+#     REP snapshot / stats  <─────────────────────────   ticks/s from the server's tick batch counters
+#                                                      psutil: server CPU and RSS
+#
+# Every case of the sweep (book size x instruments x tick rate) runs a fresh server process on
+# the bench endpoints; the results are written as one JSON document per run.
+#
+
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from itertools import product
+from multiprocessing import Process
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psutil
+
+import zmq
+
+from loguru import logger
+
+from dxdy.db.market_data import SyntheticMarketDataApi, ReplayMarketDataApi
+from dxdy.rtd import wire_format
+from dxdy.rtd.client_book import ClientPositionBook
+from dxdy.rtd.clock import get_clock
+from dxdy.rtd.latency import LatencyStats, request_stats
+from dxdy.rtd.position_book import PositionBook
+from dxdy.rtd.pnl_store import PnlSeriesWriter, intraday_pnl_file_path
+from dxdy.rtd.rtd_calcs import RtdCalcServer, CID
+from dxdy.rtd.snapshot import request_snapshot
+
+
+RESULTS_VERSION = 1
+
+
+def bench_endpoints(host: str = '127.0.0.1', base_port: int = 7300) -> dict:
+    return {
+        'pub': f"tcp://{host}:{base_port}",
+        'snapshot': f"tcp://{host}:{base_port + 1}",
+        'stats': f"tcp://{host}:{base_port + 2}",
+    }
+
+
+def synthetic_positions(num_rows: int, num_instruments: int, num_portfolios: int = 4, seed: int = 0) -> pd.DataFrame:
+    """
+    Book of `num_rows` stock lines over `num_instruments` cids, with the get_rtd_positions columns.
+    """
+    rng = np.random.default_rng(seed)
+    num_instruments = min(num_instruments, num_rows)
+
+    # every instrument is held at least once, the remaining lines are spread at random
+    instrument = np.concatenate([np.arange(num_instruments), rng.integers(0, num_instruments, num_rows - num_instruments)])
+    portfolio_id = rng.integers(1, num_portfolios + 1, num_rows)
+    close_price = np.round(rng.lognormal(4.0, 0.8, num_instruments), 2)[instrument]
+    quantity = rng.choice([-1, 1], num_rows) * rng.integers(1, 50, num_rows) * 100
+
+    positions_df = pd.DataFrame({
+        'row_num': np.arange(1, num_rows + 1),
+        'portfolio_id': portfolio_id,
+        'portfolio_name': [f"BENCH{i}" for i in portfolio_id],
+        'portfolio_ccy': 'USD',
+        'latest_cash_balance': 1e8,
+        'security_id': instrument + 1,
+        'figi': [f"BENCH{i:08d}" for i in instrument],
+        'ticker': [f"B{i}" for i in instrument],
+        'exch_code': 'US',
+        'name': [f"Bench instrument {i}" for i in instrument],
+        'ccy': 'USD',
+        'fx_rate': 1.0,
+        'security_type_2': 'Common Stock',
+        'quantity': quantity,
+        'multiplier': 1,
+        'close_price': close_price,
+        'avg_cost': close_price,
+        'sector_name': [f"Sector {i % 11}" for i in instrument],
+    })
+    if CID not in positions_df.columns:
+        positions_df[CID] = positions_df['figi']
+
+    positions_df['timestamp'] = 0
+    positions_df['quote_timestamp'] = pd.Timestamp.now(tz='UTC')
+    for col in ['delay', 'price', 'bid', 'ask', 'pct_aum', 'gain_loss']:
+        positions_df[col] = float('nan')
+    positions_df['mkt_value'] = positions_df['close_price'] * positions_df['quantity'] * positions_df['multiplier']
+    positions_df['close_fx_rate'] = positions_df['fx_rate']
+    for col in ['chg', 'pct_chg', 'pnl', 'price_pnl', 'fx_pnl']:
+        positions_df[col] = 0.0
+
+    return positions_df
+
+
+class BenchReplayMarketDataApi(ReplayMarketDataApi):
+    """
+    Captured ticks without their capture timestamps, so that the tick-to-subscriber latency
+    is measured from their receipt in this run.
+    """
+    def real_time_api(self, tickers):
+        for tick in super().real_time_api(tickers):
+            yield tick[:4]
+
+
+class BenchRtdCalcServer(RtdCalcServer):
+    """
+    RtdCalcServer on the bench endpoints, with an injected book (None: the database book),
+    no intraday fills and its intraday P&L files in `pnl_dir`.
+    """
+    def __init__(self, api, positions_df: pd.DataFrame, endpoints: dict, pnl_dir: str):
+        super().__init__(api=api)
+        self.positions_df = positions_df
+        self.pnl_dir = Path(pnl_dir)
+
+        self.ZMQ_PUB = endpoints['pub']
+        self.ZMQ_SNAPSHOT = endpoints['snapshot']
+        self.ZMQ_STATS = endpoints['stats']
+
+        self.poll_fills = False
+        # BenchReplayMarketDataApi drops the captured timestamps: the replayed ticks are stamped
+        # on receipt and batched on this run's clock, like live ticks
+        self.replay = False
+        self.tick_capture_config = dict(self.tick_capture_config, enabled=False)
+        if self.positions_df is not None:
+            # synthetic books hold stocks in the portfolio currency only
+            self.fx_streaming = False
+            self.option_config = dict(self.option_config, enabled=False)
+            self.limits_config = dict(self.limits_config, enabled=False)
+            # no return history for the synthetic cids
+            self.var_config = dict(self.var_config, enabled=False)
+
+    def load_intraday_transactions(self) -> None:
+        pass
+
+    def load_book(self) -> PositionBook:
+        if self.positions_df is None:
+            return super().load_book()
+        return PositionBook(self.positions_df, CID, self.local_tz)
+
+    def open_intraday_file(self, portfolio_id):
+        file_path = intraday_pnl_file_path(self.pnl_dir, self.cur_cob_date, portfolio_id)
+        self.intraday_files[portfolio_id] = PnlSeriesWriter(file_path, int(portfolio_id), self.clock_ns())
+
+
+def run_bench_server(case: dict, endpoints: dict, pnl_dir: str) -> None:
+    if case['feed'] == 'replay':
+        api = BenchReplayMarketDataApi()
+        positions_df = None
+    else:
+        api = SyntheticMarketDataApi()
+        api.config = dict(api.config, rate=case['rate'], seed=case['seed'])
+        positions_df = synthetic_positions(case['rows'], case['instruments'], seed=case['seed'])
+
+    BenchRtdCalcServer(api, positions_df, endpoints, pnl_dir).run()
+
+
+class HeadlessSubscriber:
+    """
+    Decodes the RTD deltas as RealTimeViewerWidget does (sequence tracking, snapshot re-sync,
+    scatter into a ClientPositionBook), without rendering.
+    """
+
+    def __init__(self, context: zmq.Context, endpoints: dict):
+        self.context = context
+        self.endpoints = endpoints
+        self.clock = get_clock()
+
+        self.socket = context.socket(zmq.SUB)
+        self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+        self.socket.setsockopt(zmq.RCVHWM, 0)
+        self.socket.connect(endpoints['pub'])
+
+        self.seq_tracker = wire_format.SequenceTracker()
+        self.stats = LatencyStats()
+        self.positions : ClientPositionBook = None
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        self.stats.reset()
+        self.num_messages = 0
+        self.num_rows = 0
+        self.num_resyncs = 0
+
+    def sync(self, timeout_ms: int) -> bool:
+        snapshot = request_snapshot(self.context, self.endpoints['snapshot'], timeout_ms)
+        if snapshot is None:
+            return False
+        header, positions_df = snapshot
+        self.seq_tracker.sync(header['seq'])
+        self.positions = ClientPositionBook(positions_df)
+        return True
+
+    def poll(self, until: float) -> None:
+        """
+        Receives and decodes messages until the `until` perf_counter deadline.
+        """
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+
+        while time.perf_counter() < until:
+            if not poller.poll(timeout=10):
+                continue
+
+            while True:
+                try:
+                    frame = self.socket.recv(zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    break
+                self.on_message(frame)
+
+    def on_message(self, frame) -> None:
+        local_time_ns = self.clock.now_ns()
+        header, rows = wire_format.decode(frame)
+
+        if self.seq_tracker.is_stale(header['seq']):
+            return
+
+        self.num_messages += 1
+        missed = self.seq_tracker.update(header['seq'])
+        if missed > 0 or header['msg_type'] == wire_format.MSG_RELOAD:
+            self.num_resyncs += 1
+            self.sync(timeout_ms=5000)
+            return
+
+        if header['msg_type'] != wire_format.MSG_POSITION_ROWS:
+            return
+
+        self.stats.record('rtd_to_subscriber', local_time_ns - int(header['timestamp_ns']))
+        self.stats.record_many('tick_to_subscriber', local_time_ns - rows['quote_timestamp_ns'])
+
+        self.positions.apply_rows(rows)
+        self.num_rows += rows.shape[0]
+        self.stats.record('decode', self.clock.now_ns() - local_time_ns)
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def _server_ticks(stats: dict) -> int:
+    if stats is None:
+        return None
+    return int(stats['tick_batches']['num_ticks'])
+
+
+def run_case(case: dict, endpoints: dict, warmup_s: float, duration_s: float, startup_timeout_s: float = 120.0) -> dict:
+    """
+    Runs one benchmark case in a fresh server process and returns its results.
+    """
+    context = zmq.Context()
+    subscriber = HeadlessSubscriber(context, endpoints)
+
+    with tempfile.TemporaryDirectory(prefix='dxdy-bench-') as pnl_dir:
+        proc = Process(target=run_bench_server, args=(case, endpoints, pnl_dir), name='rtd-bench-server')
+        proc.start()
+        server = psutil.Process(proc.pid)
+
+        try:
+            # subscribe first, then snapshot (the server answers once its book and feed are up)
+            if not subscriber.sync(timeout_ms=int(startup_timeout_s * 1000)):
+                raise RuntimeError(f"RTD bench server did not start within {startup_timeout_s} s")
+
+            subscriber.poll(time.perf_counter() + warmup_s)
+            subscriber.reset_counters()
+
+            start_ticks = _server_ticks(request_stats(context, endpoints['stats'], timeout_ms=2000))
+            start_cpu = server.cpu_times()
+            start = time.perf_counter()
+
+            max_rss = 0
+            deadline = start + duration_s
+            while time.perf_counter() < deadline:
+                subscriber.poll(min(time.perf_counter() + 0.5, deadline))
+                max_rss = max(max_rss, server.memory_info().rss)
+
+            elapsed_s = time.perf_counter() - start
+            end_cpu = server.cpu_times()
+            server_stats = request_stats(context, endpoints['stats'], timeout_ms=2000)
+            end_ticks = _server_ticks(server_stats)
+
+        finally:
+            proc.terminate()
+            proc.join()
+            subscriber.close()
+            context.term()
+
+    latency = subscriber.stats.as_dict()
+    tick_to_subscriber = latency.get('tick_to_subscriber', {})
+    cpu_s = (end_cpu.user + end_cpu.system) - (start_cpu.user + start_cpu.system)
+
+    return {
+        'case': case,
+        'duration_s': elapsed_s,
+        'ticks_per_s': (end_ticks - start_ticks) / elapsed_s if start_ticks is not None and end_ticks is not None else None,
+        'messages_per_s': subscriber.num_messages / elapsed_s,
+        'rows_per_s': subscriber.num_rows / elapsed_s,
+        'resyncs': subscriber.num_resyncs,
+        'missed_messages': subscriber.seq_tracker.num_missed,
+        'latency_ms': {
+            'p50': tick_to_subscriber.get('p50', float('nan')) * 1e-6,
+            'p99': tick_to_subscriber.get('p99', float('nan')) * 1e-6,
+            'p99.9': tick_to_subscriber.get('p99.9', float('nan')) * 1e-6,
+            'max': (tick_to_subscriber.get('max') or 0) * 1e-6,
+        },
+        'server_cpu_pct': 100.0 * cpu_s / elapsed_s,
+        'server_max_rss_mb': max_rss / 2**20,
+        'subscriber_latency': latency,
+        'server_latency': server_stats['latency'] if server_stats is not None else None,
+    }
+
+
+def sweep(book_sizes, instrument_counts, tick_rates, feed: str = 'synthetic', seed: int = 42,
+          warmup_s: float = 5.0, duration_s: float = 30.0, endpoints: dict = None) -> dict:
+    """
+    Runs every (book size, instrument count, tick rate) case. A replayed feed runs once on
+    the database book at the [tick_replay] speed.
+    """
+    endpoints = endpoints or bench_endpoints()
+
+    if feed == 'replay':
+        cases = [{'feed': 'replay', 'rows': None, 'instruments': None, 'rate': None, 'seed': None}]
+    else:
+        cases = [
+            {'feed': feed, 'rows': rows, 'instruments': instruments, 'rate': rate, 'seed': seed}
+            for rows, instruments, rate in product(book_sizes, instrument_counts, tick_rates)
+            if instruments <= rows
+        ]
+
+    results = []
+    for i, case in enumerate(cases):
+        logger.info(f"RTD bench case {i + 1}/{len(cases)}: {case}")
+        result = run_case(case, endpoints, warmup_s, duration_s)
+        logger.info(f"  {result['ticks_per_s'] or 0:,.0f} ticks/s, p50={result['latency_ms']['p50']:.3f} "
+                    f"p99={result['latency_ms']['p99']:.3f} p99.9={result['latency_ms']['p99.9']:.3f} ms, "
+                    f"cpu={result['server_cpu_pct']:.0f}% rss={result['server_max_rss_mb']:.0f} MB")
+        results.append(result)
+
+    return {
+        'version': RESULTS_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': sys.version.split()[0],
+        'cpu_count': psutil.cpu_count(),
+        'warmup_s': warmup_s,
+        'duration_s': duration_s,
+        'results': results,
+    }
+
+
+def write_results(results: dict, path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, default=float)
+    return path
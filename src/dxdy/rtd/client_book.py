@@ -0,0 +1,84 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Subscriber-side copy of the RTD position book (dashboard, bench subscriber).
+#
+#   snapshot (positions_df) ──> columns { field -> float64[] }      row_index[row_num] -> position
+#
+#   MSG_POSITION_ROWS body ──> positions = row_index[body['row_num']]     (one gather)
+#                          ──> columns[field][positions] = body[field]    (one scatter per field)
+#
+# The DataFrame of the snapshot keeps the descriptive columns; the numeric fields live in the
+# arrays and are only written back to it on export (`to_dataframe`).
+#
+
+import numpy as np
+import pandas as pd
+
+
+# numeric fields of the position rows kept current by the deltas (V1 rows lack the last three)
+POSITION_FIELDS = ['quantity', 'price', 'bid', 'ask', 'mkt_value', 'pct_aum', 'gain_loss', 'pct_chg', 'pnl',
+                   'fx_rate', 'price_pnl', 'fx_pnl']
+
+
+class ClientPositionBook:
+    """
+    Position book of a subscriber, updated from the decoded delta bodies without a scan.
+
+    Args:
+        positions_df: snapshot of the book (request_snapshot or get_rtd_positions).
+        fields: numeric fields held as arrays (the ones missing from positions_df are skipped).
+    """
+    def __init__(self, positions_df: pd.DataFrame, fields=POSITION_FIELDS):
+        self.positions_df = positions_df.reset_index(drop=True)
+        self.size = self.positions_df.shape[0]
+
+        self.columns = {
+            field: self.positions_df[field].to_numpy(dtype=np.float64, copy=True)
+            for field in fields if field in self.positions_df.columns
+        }
+
+        self.row_num = self.positions_df['row_num'].to_numpy(dtype=np.int64)
+        # dense row_num -> position map (row_nums are small consecutive integers), -1: not in the book
+        self.row_index = np.full(int(self.row_num.max()) + 1 if self.size > 0 else 0, -1, dtype=np.intp)
+        self.row_index[self.row_num] = np.arange(self.size)
+
+    def positions(self, row_nums) -> np.ndarray:
+        """
+        Positions of `row_nums` in the book (-1 for row_nums it does not hold).
+        """
+        row_nums = np.asarray(row_nums, dtype=np.int64)
+        positions = np.full(row_nums.shape[0], -1, dtype=np.intp)
+        in_range = (row_nums >= 0) & (row_nums < self.row_index.shape[0])
+        positions[in_range] = self.row_index[row_nums[in_range]]
+        return positions
+
+    def apply_rows(self, body: np.ndarray) -> tuple:
+        """
+        Writes a decoded position rows body into the arrays, one fancy-indexed assignment per field.
+
+        Returns (positions, row_nums) of the rows held in the book.
+        """
+        positions = self.positions(body['row_num'])
+        known = positions >= 0
+        if not known.all():
+            positions = positions[known]
+            body = body[known]
+
+        for field, values in self.columns.items():
+            if field in body.dtype.names:
+                values[positions] = body[field]
+
+        return positions, self.row_num[positions]
+
+    def total(self, field: str, mask: np.ndarray = None) -> float:
+        # NaN rows are skipped, as in DataFrame.sum
+        values = self.columns[field]
+        return float(np.nansum(values if mask is None else values[mask]))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        The snapshot DataFrame with the current values of the numeric fields.
+        """
+        for field, values in self.columns.items():
+            self.positions_df[field] = values.copy()
+        return self.positions_df
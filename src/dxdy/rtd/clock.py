@@ -0,0 +1,142 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Process-wide clock shared by the RTD server, the dashboard and the header clock.
+#
+#   now_ns() = anchor_wall_ns + (time.monotonic_ns() - anchor_monotonic_ns)
+#                 │
+#                 └── time.time_ns() + NTP offset, re-anchored by a background thread
+#                     every refresh_interval_s (the offset drifts over a trading day)
+#
+# Stamping is one monotonic read and an add (no datetime). Datetimes are only built for
+# display, with the UTC offset of the local timezone cached per UTC hour.
+#
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import ntplib
+
+from loguru import logger
+
+from dxdy.settings import Settings
+
+
+_HOUR_NS = 3600 * 1_000_000_000
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ClockService:
+    """
+    Monotonic-based wall clock anchored to an NTP offset.
+
+    Args:
+        ntp_server: NTP server queried for the offset (None: local clock only).
+        local_tz: timezone of the datetimes built for display.
+        refresh_interval_s: seconds between NTP re-syncs.
+    """
+    def __init__(self, ntp_server: str, local_tz, refresh_interval_s: float = 900.0):
+        self.ntp_server = ntp_server
+        self.local_tz = local_tz
+        self.refresh_interval_s = refresh_interval_s
+
+        self.ntp_client = ntplib.NTPClient()
+        self.ntp_stats = None
+        self.offset_ns = 0
+        self.num_syncs = 0
+        self.last_sync_ns = None
+
+        # (anchor_wall_ns, anchor_monotonic_ns), replaced as a whole so readers need no lock
+        self._anchor = (time.time_ns(), time.monotonic_ns())
+
+        # (utc hour, utc offset of local_tz during that hour)
+        self._tz_cache = (None, None)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sync(self) -> bool:
+        """
+        Queries the NTP server and re-anchors the clock. Returns False when the query failed
+        (the previous offset is kept).
+        """
+        if self.ntp_server is None:
+            return False
+
+        try:
+            ntp_stats = self.ntp_client.request(self.ntp_server, version=4)
+        except Exception as e:
+            logger.warning(f"NTP request to {self.ntp_server} failed: {e}")
+            return False
+
+        offset_ns = int(ntp_stats.offset * 1e9)
+        self._anchor = (time.time_ns() + offset_ns, time.monotonic_ns())
+
+        if self.num_syncs > 0 and abs(offset_ns - self.offset_ns) > 1_000_000:
+            logger.debug(f"NTP offset moved by {(offset_ns - self.offset_ns) * 1e-6:.3f} ms")
+
+        self.ntp_stats = ntp_stats
+        self.offset_ns = offset_ns
+        self.num_syncs += 1
+        self.last_sync_ns = self.now_ns()
+        return True
+
+    def start(self) -> None:
+        """
+        Synchronizes once, then re-syncs on a daemon thread. Calling it again is a no-op.
+        """
+        if self._thread is not None:
+            return
+        self.sync()
+        self._thread = threading.Thread(target=self._run, name="dxdy-clock", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval_s):
+            self.sync()
+
+    def now_ns(self) -> int:
+        """
+        NTP-corrected wall clock, integer ns since the epoch.
+        """
+        anchor_wall_ns, anchor_monotonic_ns = self._anchor
+        return anchor_wall_ns + (time.monotonic_ns() - anchor_monotonic_ns)
+
+    def to_datetime(self, timestamp_ns: int) -> datetime:
+        """
+        Timezone-aware local datetime of an ns timestamp (for display).
+        """
+        hour = timestamp_ns // _HOUR_NS
+        cached_hour, tz_offset = self._tz_cache
+        if hour != cached_hour:
+            # timezone transitions happen on UTC hour boundaries
+            tz_offset = datetime.fromtimestamp(hour * 3600, tz=self.local_tz).utcoffset()
+            self._tz_cache = (hour, tz_offset)
+
+        local = _EPOCH + timedelta(microseconds=timestamp_ns // 1000) + tz_offset
+        return local.replace(tzinfo=timezone(tz_offset))
+
+    def now(self) -> datetime:
+        return self.to_datetime(self.now_ns())
+
+
+_clock = None
+_clock_lock = threading.Lock()
+
+
+def get_clock() -> ClockService:
+    """
+    The process-wide clock, created and started on first use.
+    """
+    global _clock
+    if _clock is None:
+        with _clock_lock:
+            if _clock is None:
+                ntp_config = Settings().get_ntp_config()
+                clock = ClockService(ntp_config['server'], Settings().get_timezone(), ntp_config['refresh_interval_s'])
+                clock.start()
+                _clock = clock
+    return _clock
@@ -0,0 +1,127 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Streaming FX rates for the RTD position book.
+#
+#   FX tick (cid) ──> ccy_of_cid ──> rates[ccy]         (one rate per currency, fx_rates_data units)
+#                                       │
+#                                       ▼
+#   rows_by_ccy[ccy] ──> book.fx_rate[rows] = rates[ccy_idx[rows]] / rates[portfolio_ccy_idx[rows]]
+#                        book.revalue(rows)  (price / FX split of the P&L)
+#
+# The rates start at the EOD values of the market COB date, the same ones get_rtd_positions
+# used for the rows' close_fx_rate, so the FX P&L is measured from the close.
+#
+
+import numpy as np
+import pandas as pd
+
+
+class FxRateVector:
+    """
+    Per-currency FX rates applied to the rows of a PositionBook.
+
+    Args:
+        book: the position book (rows need ccy and portfolio_ccy).
+        fx_rates_df: EOD rates, one row per currency (ccy, fx_rate).
+        fx_cids: { ccy: real-time identifier } of the currencies to stream.
+    """
+    def __init__(self, book, fx_rates_df: pd.DataFrame, fx_cids: dict):
+        self.book = book
+
+        close_rates = dict(zip(fx_rates_df['ccy'].tolist(), fx_rates_df['fx_rate'].tolist()))
+        ccys = set(close_rates.keys()) | set(book.static_df['ccy'].dropna()) | set(book.static_df['portfolio_ccy'].dropna())
+
+        self.ccys = sorted(ccys)
+        self.ccy_index = {ccy: i for i, ccy in enumerate(self.ccys)}
+        self.rates = np.array([close_rates.get(ccy, np.nan) for ccy in self.ccys], dtype=np.float64)
+        self.close_rates = self.rates.copy()
+
+        # real-time identifier -> currency position, only for currencies the book holds
+        self.fx_cids = {ccy: cid for ccy, cid in fx_cids.items() if cid is not None and ccy in self.ccy_index}
+        self.ccy_of_cid = {cid: self.ccy_index[ccy] for ccy, cid in self.fx_cids.items()}
+
+        # per book row, -1 for a missing currency
+        self.row_ccy = np.empty(0, dtype=np.intp)
+        self.row_portfolio_ccy = np.empty(0, dtype=np.intp)
+        # currency position -> rows quoted or reported in it
+        self.rows_by_ccy = {}
+
+        self.add_rows(np.arange(book.size))
+
+    def _ccy_positions(self, ccys) -> np.ndarray:
+        return np.fromiter((self.ccy_index.get(ccy, -1) for ccy in ccys), dtype=np.intp, count=len(ccys))
+
+    def add_rows(self, rows) -> None:
+        """
+        Indexes new book rows (appended by insert_line) and applies the current rates to them.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        if rows.shape[0] == 0:
+            return
+
+        static_df = self.book.static_df.iloc[rows]
+        row_ccy = self._ccy_positions(static_df['ccy'].tolist())
+        row_portfolio_ccy = self._ccy_positions(static_df['portfolio_ccy'].tolist())
+
+        self.row_ccy = np.concatenate([self.row_ccy, row_ccy])
+        self.row_portfolio_ccy = np.concatenate([self.row_portfolio_ccy, row_portfolio_ccy])
+
+        new_rows = {}
+        for row, ccy, portfolio_ccy in zip(rows.tolist(), row_ccy.tolist(), row_portfolio_ccy.tolist()):
+            for i in {ccy, portfolio_ccy}:
+                if i >= 0:
+                    new_rows.setdefault(i, []).append(row)
+
+        for i, ccy_rows in new_rows.items():
+            self.rows_by_ccy[i] = np.append(self.rows_by_ccy.get(i, np.empty(0, dtype=np.intp)), ccy_rows)
+
+        self._apply(rows)
+
+    def subscription_request(self, req: pd.DataFrame) -> pd.DataFrame:
+        """
+        Extends a real-time subscription request (book rows) with the FX tickers.
+        """
+        if len(self.fx_cids) == 0:
+            return req
+
+        fx_df = pd.DataFrame({
+            self.book.cid_col: list(self.fx_cids.values()),
+            'close_price': [self.close_rates[self.ccy_index[ccy]] for ccy in self.fx_cids],
+        })
+        return pd.concat([req, fx_df], ignore_index=True)
+
+    def on_quotes(self, quotes: dict) -> np.ndarray:
+        """
+        Applies the FX ticks of a batch ({ cid: (last, bid, ask, quote_timestamp_ns) }) to every
+        row quoted or reported in the ticked currencies, in one vectorized pass.
+
+        Returns the book rows revalued (empty when the batch holds no FX tick).
+        """
+        row_groups = []
+        for cid, quote in quotes.items():
+            i = self.ccy_of_cid.get(cid)
+            if i is None:
+                continue
+            self.rates[i] = quote[0]
+            rows = self.rows_by_ccy.get(i)
+            if rows is not None:
+                row_groups.append(rows)
+
+        if len(row_groups) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        rows = np.unique(np.concatenate(row_groups))
+        self._apply(rows)
+        return rows
+
+    def _apply(self, rows) -> None:
+        ccy = self.row_ccy[rows]
+        portfolio_ccy = self.row_portfolio_ccy[rows]
+
+        fx_rate = self.rates[ccy] / self.rates[portfolio_ccy]
+        # unknown currencies (-1) or missing rates keep the EOD cross from get_rtd_positions
+        known = (ccy >= 0) & (portfolio_ccy >= 0) & np.isfinite(fx_rate)
+        rows = rows[known]
+
+        self.book.fx_rate[rows] = fx_rate[known]
+        self.book.revalue(rows)
@@ -0,0 +1,142 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Incremental intraday fill handling for the RTD calculation server.
+#
+#   intraday_fills_api (cumulative per order)
+#        │  (server executor, every rtd.fills_poll_interval_s)
+#        ▼
+#   FillTracker ── new executions since the last poll ──┐
+#        │                                              │
+#        ▼                                              ▼
+#   persist_fn()  (DB write, off the tick path)   results queue ──> main loop
+#   lookup_lines_fn()  (static data of new lines)        PositionBook.insert_line / apply_fill
+#
+# The main loop never touches the database: it only drains the results queue and applies
+# the executions to the in-memory book, O(number of executions).
+#
+
+import queue
+
+import pandas as pd
+
+from loguru import logger
+
+
+EXECUTION_COLUMNS = ['order_id', 'portfolio_id', 'cid', 'quantity', 'price']
+
+
+class FillTracker:
+    """
+    Turns cumulative per-order fills into the executions that happened since the last call.
+
+    Args:
+        cid_col: identifier column of the fills frame (e.g. 'figi').
+    """
+    def __init__(self, cid_col: str = 'figi'):
+        self.cid_col = cid_col
+        self.orders = {}        # order_id -> (cum_quantity, avg_price)
+
+    def prime(self, fills_df: pd.DataFrame) -> None:
+        """
+        Records the current fills as already applied (they are in the book loaded at startup),
+        by order_id, including the orders whose portfolio / cid is not mapped yet.
+        """
+        for fill in fills_df.itertuples(index=False):
+            self.orders[fill.order_id] = (fill.cum_quantity, fill.avg_price)
+
+    def update(self, fills_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the new executions (EXECUTION_COLUMNS), one per order that filled further.
+        Unmapped orders (NaN portfolio_id / cid) are left unrecorded until they are mapped.
+        """
+        executions = []
+        for fill in fills_df.itertuples(index=False):
+            if pd.isna(fill.portfolio_id) or pd.isna(getattr(fill, self.cid_col)):
+                continue
+
+            prev_quantity, prev_price = self.orders.get(fill.order_id, (0, 0.0))
+
+            quantity = fill.cum_quantity - prev_quantity
+            if quantity == 0:
+                continue
+
+            # average price of the incremental quantity
+            price = (fill.cum_quantity * fill.avg_price - prev_quantity * prev_price) / quantity
+
+            executions.append((fill.order_id, int(fill.portfolio_id), getattr(fill, self.cid_col), quantity, price))
+            self.orders[fill.order_id] = (fill.cum_quantity, fill.avg_price)
+
+        return pd.DataFrame(executions, columns=EXECUTION_COLUMNS)
+
+
+class IntradayFillWorker:
+    """
+    Polls the intraday blotter and queues (new_lines_df, executions_df) updates for the RTD
+    server's main loop. `prime` and `poll` are run from the server's executor (asyncio.to_thread).
+
+    Args:
+        fills_fn: cob_date -> cumulative fills frame (MarketDataApi.intraday_fills_api).
+        persist_fn: () -> None, writes the intraday trades / positions to the database.
+        lookup_lines_fn: list of (portfolio_id, cid) -> frame of get_rtd_positions columns
+            for lines not yet in the book.
+        known_lines: (portfolio_id, cid) pairs already in the book.
+        line_filter: optional (portfolio_id, cid) -> bool keeping only the lines this server
+            owns (sharded mode). persist_fn may then be None on all but one shard.
+    """
+    def __init__(self, fills_fn, persist_fn, lookup_lines_fn, cob_date, known_lines, cid_col: str = 'figi',
+                 line_filter=None):
+        self.fills_fn = fills_fn
+        self.persist_fn = persist_fn
+        self.lookup_lines_fn = lookup_lines_fn
+        self.cob_date = cob_date
+        self.known_lines = set(known_lines)
+        self.line_filter = line_filter
+
+        self.tracker = FillTracker(cid_col)
+        self.results = queue.Queue()
+        self.num_executions = 0
+
+    def prime(self, fills_df: pd.DataFrame) -> None:
+        """
+        Records `fills_df`, read from the blotter before the book was loaded, as applied.
+        """
+        self.tracker.prime(fills_df)
+
+    def poll(self) -> None:
+        executions_df = self.tracker.update(self.fills_fn(self.cob_date))
+        if executions_df.empty:
+            return
+
+        # the database is the persisted copy, the book is updated from the executions below
+        if self.persist_fn is not None:
+            self.persist_fn()
+
+        if self.line_filter is not None:
+            owned = [self.line_filter(pid, cid) for pid, cid in zip(executions_df['portfolio_id'], executions_df['cid'])]
+            executions_df = executions_df[owned].reset_index(drop=True)
+            if executions_df.empty:
+                return
+
+        new_lines = [
+            line for line in executions_df[['portfolio_id', 'cid']].drop_duplicates().itertuples(index=False, name=None)
+            if line not in self.known_lines
+        ]
+        new_lines_df = self.lookup_lines_fn(new_lines) if len(new_lines) > 0 else pd.DataFrame()
+        if not new_lines_df.empty:
+            # lines the lookup could not resolve are retried on the next execution
+            self.known_lines.update(zip(new_lines_df['portfolio_id'].tolist(), new_lines_df[self.tracker.cid_col]))
+
+        self.num_executions += executions_df.shape[0]
+        logger.info(f"{executions_df.shape[0]} new intraday executions, {len(new_lines)} new lines")
+        self.results.put((new_lines_df, executions_df))
+
+    def drain(self) -> list:
+        """
+        Returns every pending (new_lines_df, executions_df) update without blocking.
+        """
+        updates = []
+        while True:
+            try:
+                updates.append(self.results.get_nowait())
+            except queue.Empty:
+                return updates
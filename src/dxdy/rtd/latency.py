@@ -0,0 +1,230 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Latency instrumentation of the RTD pipeline.
+#
+#   feed receive ──> revalue ──> publish ──> client receive ──> render
+#        │   feed_to_revalue │ revalue │ publish │   rtd_to_client  │ render
+#        └──────────────── tick_to_publish ──────┘
+#
+#   LatencyHistogram: log-bucketed counts (16 sub-buckets per power of two, <= 6.25% error),
+#                     O(1) record, no allocation on the hot path
+#   LatencyStats:     named histograms of one process (server, aggregator or dashboard)
+#   StatsService:     REP endpoint answering "STATS" with the server's histograms as JSON
+#   SampledLog:       rate limit for hot-path debug logging
+#
+
+import json
+import time
+
+import numpy as np
+
+import zmq
+
+from loguru import logger
+
+
+STATS_REQUEST = b"STATS"
+
+# values below 2**_SUB_BITS get a bucket each, larger ones 2**(_SUB_BITS - 1) buckets per power of two
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_SUB_COUNT = _SUB_COUNT >> 1
+_NUM_BUCKETS = (64 - _SUB_BITS + 1) * _HALF_SUB_COUNT + _HALF_SUB_COUNT
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+def _bucket_index(value: int) -> int:
+    if value < _SUB_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BITS
+    return shift * _HALF_SUB_COUNT + (value >> shift)
+
+
+def _bucket_indices(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    # frexp exponent == bit_length for integers below 2**53
+    bit_length = np.frexp(values.astype(np.float64))[1]
+    shift = np.maximum(bit_length - _SUB_BITS, 0)
+    return np.where(values < _SUB_COUNT, values, shift * _HALF_SUB_COUNT + (values >> shift))
+
+
+def _bucket_bounds(index: int) -> tuple:
+    """
+    [lower, upper) values of a bucket.
+    """
+    if index < _SUB_COUNT:
+        return index, index + 1
+    shift = index // _HALF_SUB_COUNT - 1
+    mantissa = index - shift * _HALF_SUB_COUNT
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed histogram of non-negative integer values (ns, or counts for queue depths).
+
+    Negative values (e.g. clock skew between processes) are clamped to 0.
+    """
+    def __init__(self, name: str, unit: str = 'ns'):
+        self.name = name
+        self.unit = unit
+        self.counts = np.zeros(_NUM_BUCKETS, dtype=np.int64)
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value) -> None:
+        value = max(int(value), 0)
+        self.counts[_bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_many(self, values) -> None:
+        values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        if values.size == 0:
+            return
+        np.add.at(self.counts, _bucket_indices(values), 1)
+        self.count += int(values.size)
+        self.total += int(values.sum())
+        vmin, vmax = int(values.min()), int(values.max())
+        self.min = vmin if self.min is None else min(self.min, vmin)
+        self.max = vmax if self.max is None else max(self.max, vmax)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else float('nan')
+
+    def percentile(self, q: float) -> float:
+        """
+        Value at percentile `q` (0-100), the midpoint of its bucket clamped to [min, max].
+        """
+        if self.count == 0:
+            return float('nan')
+
+        rank = max(int(np.ceil(q / 100.0 * self.count)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        lower, upper = _bucket_bounds(index)
+        return float(min(max((lower + upper - 1) / 2, self.min), self.max))
+
+    def as_dict(self) -> dict:
+        summary = {
+            'name': self.name,
+            'unit': self.unit,
+            'count': self.count,
+            'mean': self.mean(),
+            'min': self.min,
+            'max': self.max,
+        }
+        for q in PERCENTILES:
+            summary[f'p{q:g}'] = self.percentile(q)
+        return summary
+
+    def __str__(self) -> str:
+        if self.count == 0:
+            return f"{self.name}: -"
+        if self.unit == 'ns':
+            return (f"{self.name}: n={self.count} p50={self.percentile(50) * 1e-6:.3f} "
+                    f"p99={self.percentile(99) * 1e-6:.3f} max={self.max * 1e-6:.3f} ms")
+        return f"{self.name}: n={self.count} p50={self.percentile(50):g} p99={self.percentile(99):g} max={self.max}"
+
+
+class LatencyStats:
+    """
+    Named latency / queue depth histograms of one process.
+    """
+    def __init__(self):
+        self.histograms = {}
+
+    def histogram(self, name: str, unit: str = 'ns') -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram(name, unit)
+        return histogram
+
+    def record(self, name: str, value, unit: str = 'ns') -> None:
+        self.histogram(name, unit).record(value)
+
+    def record_many(self, name: str, values, unit: str = 'ns') -> None:
+        self.histogram(name, unit).record_many(values)
+
+    def reset(self) -> None:
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def as_dict(self) -> dict:
+        return {name: histogram.as_dict() for name, histogram in self.histograms.items()}
+
+    def __str__(self) -> str:
+        return " | ".join(str(histogram) for histogram in self.histograms.values())
+
+
+class SampledLog:
+    """
+    Lets hot-path debug logging through at most once every `interval_s` seconds.
+    """
+    def __init__(self, interval_s: float):
+        self.interval_ns = int(interval_s * 1e9)
+        self.next_ns = 0
+        self.num_suppressed = 0
+
+    def ready(self) -> bool:
+        now_ns = time.monotonic_ns()
+        if now_ns < self.next_ns:
+            self.num_suppressed += 1
+            return False
+        self.next_ns = now_ns + self.interval_ns
+        return True
+
+
+class StatsService:
+    """
+    REP endpoint answering stats requests with a JSON document (requires a zmq.asyncio context).
+    """
+    def __init__(self, context: zmq.Context, endpoint: str):
+        self.endpoint = endpoint
+        self.socket = context.socket(zmq.REP)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(endpoint)
+        self.num_requests = 0
+
+    async def serve(self, stats_fn) -> None:
+        while True:
+            request = await self.socket.recv()
+            if request != STATS_REQUEST:
+                logger.warning(f"Unknown stats request: {request[:32]}")
+
+            await self.socket.send(json.dumps(stats_fn(), default=float).encode())
+            self.num_requests += 1
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def request_stats(context: zmq.Context, endpoint: str, timeout_ms: int = 500) -> dict:
+    """
+    Requests the RTD server's stats. Returns None when the server does not answer in time.
+    """
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    socket.setsockopt(zmq.SNDTIMEO, timeout_ms)
+    socket.connect(endpoint)
+
+    try:
+        socket.send(STATS_REQUEST)
+        reply = socket.recv()
+    except zmq.Again:
+        return None
+    finally:
+        socket.close()
+
+    return json.loads(reply)
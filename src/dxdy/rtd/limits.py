@@ -0,0 +1,321 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Real-time risk limit evaluation for the RTD server.
+#
+#   risk_limits (DB) ──> checks, built when rows / groups are added (never on the tick path)
+#
+#   group checks:  gross  |mkt_value[long] - mkt_value[short]| / aum      (RunningAggregates sums)
+#                  net    |mkt_value[portfolio]| / aum
+#                  sector |mkt_value[sector]| / aum
+#   row checks:    single name |mkt_value[row]| / latest_cash_balance[row] (updated rows only)
+#
+#   value > threshold                         ──> breach   ┐
+#   value <= threshold * (1 - hysteresis)     ──> clear    ┴─> LIMIT_EVENT_DTYPE ──> PUB MSG_LIMIT_EVENTS
+#                                                                                 └─> risk_limit_events (DB)
+#
+# Every check of a batch is one gather + compare over a few hundred floats. Thresholds are
+# fractions of the portfolio AUM (latest cash balance), e.g. 2.0 for a 200% gross limit.
+#
+
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+
+from dxdy.rtd import wire_format
+from dxdy.rtd.aggregates import AGG_PORTFOLIO, AGG_SECTOR, AGG_SIDE
+
+
+LIMIT_GROSS = 0
+LIMIT_NET = 1
+LIMIT_SINGLE_NAME = 2
+LIMIT_SECTOR = 3
+
+# risk_limits.limit_type
+LIMIT_TYPES = {
+    'gross_exposure': LIMIT_GROSS,
+    'net_exposure': LIMIT_NET,
+    'single_name_pct_aum': LIMIT_SINGLE_NAME,
+    'sector_pct_aum': LIMIT_SECTOR,
+}
+LIMIT_TYPE_NAMES = {code: name for name, code in LIMIT_TYPES.items()}
+
+EVENT_CLEAR = 0
+EVENT_BREACH = 1
+
+
+class LimitEngine:
+    """
+    Evaluates the risk limits of the book against the running aggregates.
+
+    Args:
+        book: the position book.
+        aggregates: RunningAggregates of the book (updated before `evaluate`).
+        limits_df: risk_limits rows (limit_id, portfolio_id, limit_type, scope, threshold).
+        clear_hysteresis: a breach clears once the value is back under threshold * (1 - hysteresis).
+        breached: check keys (see `breached_keys`) already in breach, e.g. from the engine of a
+            book that was rebuilt, so they are not reported again.
+    """
+    def __init__(self, book, aggregates, limits_df: pd.DataFrame, clear_hysteresis: float = 0.0, breached=None):
+        self.book = book
+        self.aggregates = aggregates
+        self.clear_hysteresis = clear_hysteresis
+
+        known = limits_df['limit_type'].isin(LIMIT_TYPES.keys())
+        if not known.all():
+            logger.warning(f"Unknown risk limit types skipped: {sorted(limits_df.loc[~known, 'limit_type'].unique())}")
+        self.limits_df = limits_df[known].reset_index(drop=True)
+
+        self.num_evaluations = 0
+        self.num_events = 0
+        self.rebuild(breached)
+
+    @property
+    def num_checks(self) -> int:
+        return self.threshold.shape[0] + self.pair_threshold.shape[0]
+
+    def _aum(self) -> dict:
+        rows = {portfolio_id: rows[0] for portfolio_id, rows in self.book.portfolio_index.items()}
+        return {portfolio_id: float(self.book.latest_cash_balance[row]) for portfolio_id, row in rows.items()}
+
+    def breached_keys(self) -> set:
+        keys = {key for key, breached in zip(self.check_keys, self.breached.tolist()) if breached}
+        keys |= {key for key, breached in zip(self.pair_keys, self.pair_breached.tolist()) if breached}
+        return keys
+
+    def rebuild(self, breached=None) -> None:
+        """
+        Re-derives the checks from the limits, the book rows and the aggregate groups (new
+        lines or groups), keeping the breach state of the checks that still exist.
+        """
+        if breached is None and hasattr(self, 'breached'):
+            breached = self.breached_keys()
+        breached = breached or set()
+
+        aum = self._aum()
+        group_index = self.aggregates.group_index
+        cids = self.book.static_df[self.book.cid_col].tolist()
+
+        # group checks: value = |mkt_value[g1] + sign * mkt_value[g2]| / aum (-1: no group, 0)
+        checks = []
+        # row checks: value = |mkt_value[row]| / latest_cash_balance[row]
+        pairs = []
+
+        for limit in self.limits_df.itertuples(index=False):
+            portfolio_id = limit.portfolio_id
+            if portfolio_id not in aum:
+                continue
+            limit_type = LIMIT_TYPES[limit.limit_type]
+            scope = limit.scope if isinstance(limit.scope, str) and limit.scope != '' else None
+            check = (int(limit.limit_id), portfolio_id, limit_type, float(limit.threshold), aum[portfolio_id])
+
+            if limit_type == LIMIT_GROSS:
+                long = group_index.get((AGG_SIDE, portfolio_id, 'long'), -1)
+                short = group_index.get((AGG_SIDE, portfolio_id, 'short'), -1)
+                checks.append(check + ('', long, short, -1.0))
+
+            elif limit_type == LIMIT_NET:
+                checks.append(check + ('', group_index.get((AGG_PORTFOLIO, portfolio_id, ''), -1), -1, 0.0))
+
+            elif limit_type == LIMIT_SECTOR:
+                for (dimension, group_portfolio_id, key), group in group_index.items():
+                    if dimension == AGG_SECTOR and group_portfolio_id == portfolio_id and scope in (None, key):
+                        checks.append(check + (key, group, -1, 0.0))
+
+            elif limit_type == LIMIT_SINGLE_NAME:
+                for row in self.book.portfolio_index[portfolio_id].tolist():
+                    if scope in (None, cids[row]):
+                        pairs.append((row, int(limit.limit_id), portfolio_id, float(limit.threshold), str(cids[row])))
+
+        columns = ['limit_id', 'portfolio_id', 'limit_type', 'threshold', 'aum', 'key', 'group', 'other_group', 'sign']
+        checks_df = pd.DataFrame(checks, columns=columns)
+        self.limit_id = checks_df['limit_id'].to_numpy(dtype=np.int64)
+        self.portfolio_id = checks_df['portfolio_id'].to_numpy(dtype=np.int64)
+        self.limit_type = checks_df['limit_type'].to_numpy(dtype=np.uint32)
+        self.threshold = checks_df['threshold'].to_numpy(dtype=np.float64)
+        self.aum = checks_df['aum'].to_numpy(dtype=np.float64)
+        self.key = np.asarray([key.encode() for key in checks_df['key']], dtype=wire_format.LIMIT_EVENT_DTYPE['key'])
+        self.group = checks_df['group'].to_numpy(dtype=np.intp)
+        self.other_group = checks_df['other_group'].to_numpy(dtype=np.intp)
+        self.sign = checks_df['sign'].to_numpy(dtype=np.float64)
+        self.check_keys = list(zip(self.limit_id.tolist(), checks_df['key'].tolist()))
+        self.breached = np.fromiter((key in breached for key in self.check_keys), dtype=bool, count=len(self.check_keys))
+
+        # row checks sorted by row, row_ptr[row]:row_ptr[row + 1] are the checks of a row (CSR)
+        pairs.sort(key=lambda pair: pair[0])
+        pairs_df = pd.DataFrame(pairs, columns=['row', 'limit_id', 'portfolio_id', 'threshold', 'key'])
+        self.pair_row = pairs_df['row'].to_numpy(dtype=np.intp)
+        self.pair_limit_id = pairs_df['limit_id'].to_numpy(dtype=np.int64)
+        self.pair_portfolio_id = pairs_df['portfolio_id'].to_numpy(dtype=np.int64)
+        self.pair_threshold = pairs_df['threshold'].to_numpy(dtype=np.float64)
+        self.pair_key = np.asarray([key.encode() for key in pairs_df['key']], dtype=self.key.dtype)
+        self.row_ptr = np.searchsorted(self.pair_row, np.arange(self.book.size + 1))
+        self.pair_keys = list(zip(self.pair_limit_id.tolist(), self.book.row_num[self.pair_row].tolist()))
+        self.pair_breached = np.fromiter((key in breached for key in self.pair_keys), dtype=bool, count=len(self.pair_keys))
+
+        logger.info(f"Risk limits: {len(self.limits_df)} limits, {self.threshold.shape[0]} group checks, "
+                    f"{self.pair_threshold.shape[0]} single-name checks")
+
+    def _transitions(self, value: np.ndarray, threshold: np.ndarray, breached: np.ndarray) -> tuple:
+        # NaN values (no price yet, zero AUM) never change the state
+        breach = ~breached & (value > threshold)
+        clear = breached & (value <= threshold * (1.0 - self.clear_hysteresis))
+        breached[breach] = True
+        breached[clear] = False
+        return breach | clear
+
+    def evaluate(self, rows, timestamp_ns: int) -> np.ndarray:
+        """
+        Checks the group limits and the single-name limits of the updated rows.
+
+        Returns the breach / clear events (LIMIT_EVENT_DTYPE, empty when nothing changed).
+        """
+        self.num_evaluations += 1
+        events = []
+
+        if self.threshold.shape[0] > 0:
+            # padded with a 0 for the groups that do not exist (-1)
+            mkt_value = np.append(self.aggregates.mkt_value, 0.0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                value = np.abs(mkt_value[self.group] + self.sign * mkt_value[self.other_group]) / self.aum
+            changed = np.flatnonzero(self._transitions(value, self.threshold, self.breached))
+            if changed.shape[0] > 0:
+                events.append(self._events(timestamp_ns, changed, value[changed], self.breached[changed],
+                                           self.limit_id, self.portfolio_id, self.limit_type, self.key, self.threshold,
+                                           np.full(changed.shape[0], -1, dtype=np.int64)))
+
+        rows = np.asarray(rows, dtype=np.intp)
+        if self.pair_threshold.shape[0] > 0 and rows.shape[0] > 0:
+            starts = self.row_ptr[rows]
+            counts = self.row_ptr[rows + 1] - starts
+            total = int(counts.sum())
+            if total > 0:
+                # the check positions of every updated row, concatenated
+                idx = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+                book_rows = self.pair_row[idx]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value = np.abs(self.book.mkt_value[book_rows]) / self.book.latest_cash_balance[book_rows]
+                breached = self.pair_breached[idx]
+                changed = self._transitions(value, self.pair_threshold[idx], breached)
+                self.pair_breached[idx] = breached
+                if changed.any():
+                    pairs = idx[changed]
+                    events.append(self._events(timestamp_ns, pairs, value[changed], breached[changed],
+                                               self.pair_limit_id, self.pair_portfolio_id,
+                                               np.full(self.pair_threshold.shape[0], LIMIT_SINGLE_NAME, dtype=np.uint32),
+                                               self.pair_key, self.pair_threshold, self.book.row_num[self.pair_row[pairs]]))
+
+        if len(events) == 0:
+            return np.empty(0, dtype=wire_format.LIMIT_EVENT_DTYPE)
+
+        events = np.concatenate(events)
+        self.num_events += events.shape[0]
+        return events
+
+    @staticmethod
+    def _events(timestamp_ns, idx, value, breached, limit_id, portfolio_id, limit_type, key, threshold, row_num) -> np.ndarray:
+        events = np.empty(idx.shape[0], dtype=wire_format.LIMIT_EVENT_DTYPE)
+        events['timestamp_ns'] = timestamp_ns
+        events['limit_id'] = limit_id[idx]
+        events['portfolio_id'] = portfolio_id[idx]
+        events['row_num'] = row_num
+        events['limit_type'] = limit_type[idx]
+        events['event'] = np.where(breached, EVENT_BREACH, EVENT_CLEAR)
+        events['key'] = key[idx]
+        events['value'] = value
+        events['threshold'] = threshold[idx]
+        return events
+
+    def as_dict(self) -> dict:
+        return {
+            'limits': len(self.limits_df),
+            'checks': self.num_checks,
+            'breached': int(self.breached.sum() + self.pair_breached.sum()),
+            'evaluations': self.num_evaluations,
+            'events': self.num_events,
+        }
+
+
+def limit_events_dataframe(events: np.ndarray, cob_date, local_tz=None) -> pd.DataFrame:
+    """
+    Limit events as risk_limit_events rows.
+    """
+    event_time = pd.to_datetime(events['timestamp_ns'], unit='ns', utc=True)
+    if local_tz is not None:
+        event_time = event_time.tz_convert(local_tz)
+    return pd.DataFrame({
+        'event_time': event_time.tz_localize(None),
+        'cob_date': cob_date,
+        'limit_id': events['limit_id'],
+        'portfolio_id': events['portfolio_id'],
+        'limit_type': [LIMIT_TYPE_NAMES[code] for code in events['limit_type'].tolist()],
+        'scope': [key.decode() for key in events['key'].tolist()],
+        'row_num': events['row_num'],
+        'event': np.where(events['event'] == EVENT_BREACH, 'breach', 'clear'),
+        'value': events['value'],
+        'threshold': events['threshold'],
+    })
+
+
+class LimitEventWriter:
+    """
+    Appends the limit events to risk_limit_events on a background thread, so the event loop
+    never waits on the database. Events are written in batches collected over `flush_interval_s`.
+
+    Every flush opens a read-write DuckDB connection, which locks the database file for the other
+    processes (TUI, EOD tasks) while it is open: a longer interval means fewer lock windows, at the
+    cost of events reaching risk_limit_events later (they are published on the wire immediately).
+
+    Args:
+        persist_fn: events frame (see limit_events_dataframe) -> None.
+    """
+    _CLOSE = object()
+
+    def __init__(self, persist_fn, cob_date, local_tz=None, flush_interval_s: float = 30.0):
+        self.persist_fn = persist_fn
+        self.cob_date = cob_date
+        self.local_tz = local_tz
+        self.flush_interval_s = flush_interval_s
+        self.num_written = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="rtd-limit-events", daemon=True)
+        self._thread.start()
+
+    def put(self, events: np.ndarray) -> None:
+        if events.shape[0] > 0:
+            self._queue.put(events.copy())
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            batches = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_s
+            while batches[-1] is not self._CLOSE:
+                remaining_s = deadline - time.monotonic()
+                if remaining_s <= 0:
+                    break
+                try:
+                    batches.append(self._queue.get(timeout=remaining_s))
+                except queue.Empty:
+                    break
+            if any(batch is self._CLOSE for batch in batches):
+                closing = True
+                batches = [batch for batch in batches if batch is not self._CLOSE]
+            if len(batches) == 0:
+                continue
+
+            events_df = limit_events_dataframe(np.concatenate(batches), self.cob_date, self.local_tz)
+            try:
+                self.persist_fn(events_df)
+                self.num_written += events_df.shape[0]
+            except Exception as e:
+                logger.error(f"Persisting {events_df.shape[0]} risk limit events failed: {e}")
+
+    def close(self) -> None:
+        self._queue.put(self._CLOSE)
+        self._thread.join()
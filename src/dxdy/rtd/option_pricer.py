@@ -0,0 +1,299 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Real-time option revaluation for the RTD calculation server.
+#
+#   underlying tick (cid) ──> underlying_index { cid -> [slot, ...] }
+#                                   │
+#                                   ▼
+#   strike[] phi[] expiry_ns[] sigma[] spot[] ──> black_scholes() ──> book.model_price / delta / gamma / vega / theta
+#                                                                      (and book.price when marking to model)
+#
+# One slot per option row of the book. Implied vols are calibrated once at startup from the
+# option and underlying closes (as of the close of the market COB date). When marking to
+# model, an option print re-implies its vol at the current underlying price, so the model
+# carries on from the print instead of snapping back to the close vol on the next tick.
+#
+
+import math
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+
+_SQRT_2PI = math.sqrt(2.0 * math.pi)
+_NS_PER_YEAR = 365.0 * 86400 * 1e9
+
+# time to expiry floor (years), keeps d1 finite on the expiration day
+_MIN_T = 1e-9
+
+VOL_MIN = 1e-4
+VOL_MAX = 5.0
+
+
+def black_scholes(spot, strike, t, sigma, phi, rate: float = 0.0, dividend_yield: float = 0.0):
+    """
+    European prices and Greeks (Black-Scholes-Merton) over arrays.
+
+    phi is +1 for calls and -1 for puts, t the time to expiry in years. Vega is per vol
+    point (0.01) and theta per calendar day.
+
+    Returns (price, delta, gamma, vega, theta).
+    """
+    t = np.maximum(t, _MIN_T)
+    sqrt_t = np.sqrt(t)
+    sigma_sqrt_t = sigma * sqrt_t
+
+    spot_q = spot * np.exp(-dividend_yield * t)
+    strike_r = strike * np.exp(-rate * t)
+
+    d1 = (np.log(spot / strike) + (rate - dividend_yield + 0.5 * sigma * sigma) * t) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+
+    n_d1 = ndtr(phi * d1)
+    n_d2 = ndtr(phi * d2)
+    pdf_d1 = np.exp(-0.5 * d1 * d1) / _SQRT_2PI
+
+    price = phi * (spot_q * n_d1 - strike_r * n_d2)
+    delta = phi * (spot_q / spot) * n_d1
+    gamma = (spot_q / spot) * pdf_d1 / (spot * sigma_sqrt_t)
+    vega = spot_q * pdf_d1 * sqrt_t
+    theta = -spot_q * pdf_d1 * sigma / (2.0 * sqrt_t) - phi * rate * strike_r * n_d2 + phi * dividend_yield * spot_q * n_d1
+
+    return price, delta, gamma, vega * 0.01, theta / 365.0
+
+
+def implied_vol(price, spot, strike, t, phi, rate: float = 0.0, dividend_yield: float = 0.0,
+                tol: float = 1e-6, max_iter: int = 64) -> np.ndarray:
+    """
+    Vectorized implied vol: Newton steps, falling back to bisection whenever a step leaves
+    the [lo, hi] bracket.
+
+    NaN where the price is outside the no-arbitrage bounds, an input is missing or the
+    iteration did not converge to within `tol` (in price).
+    """
+    t = np.maximum(t, _MIN_T)
+    spot_q = spot * np.exp(-dividend_yield * t)
+    strike_r = strike * np.exp(-rate * t)
+
+    with np.errstate(all='ignore'):
+        lower = np.maximum(phi * (spot_q - strike_r), 0.0)
+        upper = np.where(phi > 0, spot_q, strike_r)
+        valid = (price > lower) & (price < upper) & (strike > 0)
+
+        lo = np.full(price.shape, VOL_MIN)
+        hi = np.full(price.shape, VOL_MAX)
+        # Brenner-Subrahmanyam guess (at-the-money approximation)
+        sigma = np.clip(np.sqrt(2.0 * math.pi / t) * price / spot, VOL_MIN, VOL_MAX)
+        sigma = np.where(valid, sigma, 0.2)
+
+        converged = np.zeros(price.shape, dtype=bool)
+        for _ in range(max_iter):
+            model, _, _, vega, _ = black_scholes(spot, strike, t, sigma, phi, rate, dividend_yield)
+            diff = model - price
+            converged = np.abs(diff) < tol
+            if np.all(converged | ~valid):
+                break
+
+            hi = np.where(diff > 0, sigma, hi)
+            lo = np.where(diff <= 0, sigma, lo)
+            step = sigma - diff / (vega * 100.0)
+            sigma = np.where((step > lo) & (step < hi), step, 0.5 * (lo + hi))
+
+    return np.where(valid & converged, sigma, np.nan)
+
+
+def local_time_ns(dates, time_of_day: str, local_tz) -> np.ndarray:
+    """
+    ns timestamps of `time_of_day` ("HH:MM", local time) on each of `dates`.
+    """
+    timestamps = pd.to_datetime(pd.Series(dates)) + pd.Timedelta(f"{time_of_day}:00")
+    return pd.DatetimeIndex(timestamps).tz_localize(local_tz).asi8
+
+
+class OptionPricer:
+    """
+    Reprices the option rows of a PositionBook from their underlying's ticks.
+
+    Option rows are the rows with a strike_price, contract_type, expiration_date and
+    underlying_cid (see get_rtd_positions). Their model price and Greeks are written to the
+    book's OPTION_COLUMNS.
+
+    Args:
+        book: the position book.
+        close_date: market COB date of the close prices the vols are calibrated from.
+        rate: continuously compounded risk-free rate.
+        dividend_yield: continuous dividend yield of the underlyings.
+        mark_to_model: mark option rows at the model price between option prints.
+        expiry_time: local time of day the options expire (and the close is taken), "HH:MM".
+    """
+    def __init__(self, book, close_date, rate: float = 0.0, dividend_yield: float = 0.0,
+                 mark_to_model: bool = True, expiry_time: str = "16:00"):
+        self.book = book
+        self.rate = rate
+        self.dividend_yield = dividend_yield
+        self.mark_to_model = mark_to_model
+        self.expiry_time = expiry_time
+
+        # per slot
+        self.rows = np.empty(0, dtype=np.intp)
+        self.strike = np.empty(0, dtype=np.float64)
+        self.phi = np.empty(0, dtype=np.float64)
+        self.expiry_ns = np.empty(0, dtype=np.int64)
+        self.sigma = np.empty(0, dtype=np.float64)
+        self.spot = np.empty(0, dtype=np.float64)
+
+        # underlying cid -> slots, option cid -> slots
+        self.underlying_index = {}
+        self.option_index = {}
+        # last price of each underlying (its close until it ticks)
+        self.spot_by_cid = {}
+
+        self.num_uncalibrated = 0
+
+        close_ns = int(local_time_ns([close_date], self.expiry_time, self.book.local_tz)[0])
+        self.add_rows(np.arange(self.book.size), close_ns)
+
+    @property
+    def size(self) -> int:
+        return self.rows.shape[0]
+
+    def add_rows(self, rows, timestamp_ns: int) -> int:
+        """
+        Adds the option rows among `rows` (book row positions) and calibrates their vols from
+        their close_price at `timestamp_ns`.
+
+        Returns the number of options added.
+        """
+        static_df = self.book.static_df.iloc[rows]
+        if 'underlying_cid' not in static_df.columns:
+            return 0
+
+        is_option = static_df['underlying_cid'].notna() & static_df['strike_price'].notna() \
+                  & static_df['expiration_date'].notna() & static_df['contract_type'].isin(['Call', 'Put'])
+        static_df = static_df[is_option]
+        if static_df.shape[0] == 0:
+            return 0
+
+        rows = np.asarray(rows, dtype=np.intp)[is_option.to_numpy()]
+        underlying_cids = static_df['underlying_cid'].tolist()
+
+        for cid, close in zip(underlying_cids, static_df['underlying_close_price'].tolist()):
+            if cid not in self.spot_by_cid or pd.isna(self.spot_by_cid[cid]):
+                self.spot_by_cid[cid] = close
+
+        strike = static_df['strike_price'].to_numpy(dtype=np.float64)
+        phi = np.where(static_df['contract_type'].to_numpy() == 'Call', 1.0, -1.0)
+        expiry_ns = local_time_ns(static_df['expiration_date'], self.expiry_time, self.book.local_tz)
+        spot = np.array([self.spot_by_cid[cid] for cid in underlying_cids], dtype=np.float64)
+
+        t = (expiry_ns - timestamp_ns) / _NS_PER_YEAR
+        sigma = implied_vol(self.book.close_price[rows], spot, strike, t, phi, self.rate, self.dividend_yield)
+        self.num_uncalibrated += int(np.isnan(sigma).sum())
+
+        first_slot = self.size
+        self.rows = np.concatenate([self.rows, rows])
+        self.strike = np.concatenate([self.strike, strike])
+        self.phi = np.concatenate([self.phi, phi])
+        self.expiry_ns = np.concatenate([self.expiry_ns, expiry_ns])
+        self.sigma = np.concatenate([self.sigma, sigma])
+        self.spot = np.concatenate([self.spot, spot])
+
+        slots = np.arange(first_slot, self.size)
+        option_cids = static_df[self.book.cid_col].tolist()
+        for slot, underlying_cid, option_cid in zip(slots.tolist(), underlying_cids, option_cids):
+            self.underlying_index[underlying_cid] = np.append(self.underlying_index.get(underlying_cid, np.empty(0, dtype=np.intp)), slot)
+            self.option_index[option_cid] = np.append(self.option_index.get(option_cid, np.empty(0, dtype=np.intp)), slot)
+
+        self._price(slots, timestamp_ns)
+        return slots.shape[0]
+
+    def subscription_request(self, req: pd.DataFrame) -> pd.DataFrame:
+        """
+        Extends a real-time subscription request (book rows) with the underlyings that are
+        not held themselves.
+        """
+        cid_col = self.book.cid_col
+        missing = [cid for cid in self.underlying_index if cid not in self.book.cid_index]
+        if len(missing) == 0:
+            return req
+
+        underlyings_df = pd.DataFrame({
+            cid_col: missing,
+            'close_price': [self.spot_by_cid[cid] for cid in missing],
+        })
+        return pd.concat([req, underlyings_df], ignore_index=True)
+
+    def on_quotes(self, quotes: dict, timestamp_ns: int) -> np.ndarray:
+        """
+        Reprices the options on every underlying ticked in `quotes` ({ cid: (last, bid, ask,
+        quote_timestamp_ns) }, as for PositionBook.apply_quotes, which must run first).
+
+        Returns the book rows repriced (empty when the batch holds no underlying or option).
+        """
+        underlying_groups = []
+        printed_groups = []
+
+        for cid, quote in quotes.items():
+            slots = self.underlying_index.get(cid)
+            if slots is not None:
+                self.spot_by_cid[cid] = quote[0]
+                self.spot[slots] = quote[0]
+                underlying_groups.append(slots)
+
+            slots = self.option_index.get(cid)
+            if slots is not None:
+                printed_groups.append(slots)
+
+        if len(underlying_groups) == 0 and len(printed_groups) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        printed = np.concatenate(printed_groups) if len(printed_groups) > 0 else np.empty(0, dtype=np.intp)
+        if self.mark_to_model and printed.shape[0] > 0:
+            # the print becomes the model: re-imply its vol at the current underlying price
+            t = (self.expiry_ns[printed] - timestamp_ns) / _NS_PER_YEAR
+            sigma = implied_vol(self.book.price[self.rows[printed]], self.spot[printed], self.strike[printed], t,
+                                self.phi[printed], self.rate, self.dividend_yield)
+            self.sigma[printed] = np.where(np.isnan(sigma), self.sigma[printed], sigma)
+
+        slots = np.unique(np.concatenate(underlying_groups + printed_groups))
+        self._price(slots, timestamp_ns)
+
+        if self.mark_to_model and len(underlying_groups) > 0:
+            # options not printed in this batch move with their underlying
+            marked = np.setdiff1d(np.concatenate(underlying_groups), printed)
+            rows = self.rows[marked]
+            rows = rows[~np.isnan(self.book.model_price[rows])]
+            self.book.price[rows] = self.book.model_price[rows]
+            self.book.revalue(rows)
+
+        return self.rows[slots]
+
+    def _price(self, slots, timestamp_ns: int) -> None:
+        t = (self.expiry_ns[slots] - timestamp_ns) / _NS_PER_YEAR
+        spot = self.spot[slots]
+        strike = self.strike[slots]
+        phi = self.phi[slots]
+        sigma = self.sigma[slots]
+
+        with np.errstate(all='ignore'):
+            price, delta, gamma, vega, theta = black_scholes(spot, strike, t, sigma, phi, self.rate, self.dividend_yield)
+
+            expired = t <= 0
+            if expired.any():
+                intrinsic = phi * (spot - strike)
+                price = np.where(expired, np.maximum(intrinsic, 0.0), price)
+                delta = np.where(expired, np.where(intrinsic > 0, phi, 0.0), delta)
+                gamma = np.where(expired, 0.0, gamma)
+                vega = np.where(expired, 0.0, vega)
+                theta = np.where(expired, 0.0, theta)
+
+        rows = self.rows[slots]
+        book = self.book
+        book.underlying_price[rows] = spot
+        book.implied_vol[rows] = sigma
+        book.model_price[rows] = price
+        book.delta[rows] = delta
+        book.gamma[rows] = gamma
+        book.vega[rows] = vega
+        book.theta[rows] = theta
@@ -0,0 +1,48 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Partitioning of the position book across RTD shard processes.
+#
+#   shard k = crc32(cid) % N          (shard_by = "cid":       each instrument is subscribed once)
+#   shard k = portfolio_id % N        (shard_by = "portfolio": each portfolio is revalued in one place)
+#
+#   shard k publishes deltas on   tcp://{shard_host}:{shard_base_port + 2k}
+#           serves snapshots on   tcp://{shard_host}:{shard_base_port + 2k + 1}
+#
+# crc32 is used instead of hash() so every process agrees on the partition.
+#
+
+import zlib
+
+import pandas as pd
+
+
+SHARD_BY = ('cid', 'portfolio')
+
+
+def shard_of(portfolio_id, cid, num_shards: int, shard_by: str = 'cid') -> int:
+    if shard_by == 'cid':
+        return zlib.crc32(str(cid).encode()) % num_shards
+    elif shard_by == 'portfolio':
+        return int(portfolio_id) % num_shards
+    else:
+        raise ValueError(f"Unknown RTD shard key: {shard_by}, expected one of {SHARD_BY}")
+
+
+def shard_mask(positions_df: pd.DataFrame, cid_col: str, shard_id: int, num_shards: int, shard_by: str = 'cid') -> pd.Series:
+    """
+    Boolean mask of the positions owned by `shard_id`.
+    """
+    shards = [
+        shard_of(pid, cid, num_shards, shard_by)
+        for pid, cid in zip(positions_df['portfolio_id'], positions_df[cid_col])
+    ]
+    return pd.Series(shards, index=positions_df.index) == shard_id
+
+
+def shard_endpoints(sharding: dict, shard_id: int) -> tuple:
+    """
+    (pub_endpoint, snapshot_endpoint) of a shard.
+    """
+    port = sharding['base_port'] + 2 * shard_id
+    host = sharding['host']
+    return f"tcp://{host}:{port}", f"tcp://{host}:{port + 1}"
@@ -0,0 +1,254 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Memory-mapped intraday P&L time-series store (one file per portfolio and day).
+#
+#   +---------------------------------------------+--------------------------------------------+
+#   | header (PNL_HEADER_DTYPE, 512 bytes)        | records: capacity x record dtype           |
+#   | magic | version | header_size | record_size |   timestamp_ns | net | long | short | ...  |
+#   | portfolio_id | start_time_ns | num_records  |   (only the first num_records are valid)   |
+#   | capacity | record_dtype (JSON descr)        |                                            |
+#   +---------------------------------------------+--------------------------------------------+
+#
+# The writer (RTD server) pre-allocates the file and appends records through an mmap,
+# publishing them by bumping `num_records` last. Readers map the file, view the records
+# with `np.frombuffer` and tail from the last offset they read.
+#
+
+import json
+import mmap
+import time
+from pathlib import Path
+
+import numpy as np
+
+from loguru import logger
+
+
+PNL_MAGIC = b"DXDY-PNL"
+PNL_FORMAT_VERSION = 1
+PNL_HEADER_SIZE = 512
+
+# net: total, long / short: lines with positive / negative quantity, gross: sum of |line P&L|
+PNL_SERIES = ('net', 'long', 'short', 'gross')
+
+# one trading day at one record per second
+DEFAULT_CAPACITY = 86400
+
+PNL_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u2'),
+    ('header_size', '<u2'),
+    ('record_size', '<u4'),
+    ('portfolio_id', '<i8'),
+    ('start_time_ns', '<i8'),
+    ('num_records', '<u8'),
+    ('capacity', '<u8'),
+    ('record_dtype', f'S{PNL_HEADER_SIZE - 48}'),
+])
+
+# byte offset of num_records: readers only need this field to tail the file
+_NUM_RECORDS_OFFSET = PNL_HEADER_DTYPE.fields['num_records'][1]
+
+
+def pnl_record_dtype(series=PNL_SERIES) -> np.dtype:
+    return np.dtype([('timestamp_ns', '<i8')] + [(name, '<f8') for name in series])
+
+
+def intraday_pnl_file_path(directory, cob_date, portfolio_id) -> Path:
+    return Path(directory) / f'intraday_pnl_{cob_date}_{portfolio_id}.pnl'
+
+
+def _read_header(buffer) -> np.void:
+    if len(buffer) < PNL_HEADER_SIZE:
+        raise ValueError(f"Intraday P&L file too short: {len(buffer)} bytes")
+
+    header = np.frombuffer(buffer, dtype=PNL_HEADER_DTYPE, count=1)[0].copy()
+
+    if header['magic'] != PNL_MAGIC:
+        raise ValueError("Not an intraday P&L file")
+
+    if header['version'] != PNL_FORMAT_VERSION:
+        raise ValueError(f"Unsupported intraday P&L file version {int(header['version'])}")
+
+    return header
+
+
+def _header_record_dtype(header) -> np.dtype:
+    descr = json.loads(header['record_dtype'].decode())
+    try:
+        return np.dtype([tuple(field) for field in descr])
+    except (TypeError, KeyError) as e:
+        raise ValueError(f"Invalid intraday P&L record dtype: {e}")
+
+
+class PnlSeriesWriter:
+    """
+    Appends fixed-size records to an intraday P&L file through an mmap.
+
+    Re-opening an existing file (e.g. after a server restart) resumes after its last
+    record. A file that is not a valid series of this portfolio (corrupt, truncated, other
+    series) is renamed aside and a new one is created.
+    """
+    def __init__(self, path, portfolio_id: int, start_time_ns: int, series=PNL_SERIES,
+                 capacity: int = DEFAULT_CAPACITY):
+        self.path = Path(path)
+        self.dtype = pnl_record_dtype(series)
+        self.series = tuple(series)
+
+        self.file = None
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self.file = open(self.path, 'r+b')
+            try:
+                self._validate(portfolio_id)
+            except ValueError as e:
+                self.file.close()
+                self.file = None
+                aside = self.path.with_name(f"{self.path.name}.{time.strftime('%Y%m%d%H%M%S')}.bad")
+                logger.warning(f"{e}: moved to {aside}, starting a new intraday P&L file")
+                self.path.rename(aside)
+
+        if self.file is None:
+            self.file = open(self.path, 'w+b')
+            self.file.truncate(PNL_HEADER_SIZE + capacity * self.dtype.itemsize)
+            self._map()
+
+            header = np.zeros(1, dtype=PNL_HEADER_DTYPE)
+            header['magic'] = PNL_MAGIC
+            header['version'] = PNL_FORMAT_VERSION
+            header['header_size'] = PNL_HEADER_SIZE
+            header['record_size'] = self.dtype.itemsize
+            header['portfolio_id'] = portfolio_id
+            header['start_time_ns'] = start_time_ns
+            header['capacity'] = capacity
+            header['record_dtype'] = json.dumps(self.dtype.descr).encode()
+            self.mmap[:PNL_HEADER_SIZE] = header.tobytes()
+
+    def _validate(self, portfolio_id: int) -> None:
+        # maps an existing file, raises ValueError (unmapped) when it cannot be resumed
+        size = self.path.stat().st_size
+        if size < PNL_HEADER_SIZE:
+            raise ValueError(f"{self.path} is truncated ({size} bytes)")
+
+        self._map()
+        try:
+            header = _read_header(self.mmap)
+            if _header_record_dtype(header) != self.dtype:
+                raise ValueError(f"{self.path} holds series {_header_record_dtype(header).names[1:]}, expected {self.series}")
+            if int(header['portfolio_id']) != portfolio_id:
+                raise ValueError(f"{self.path} belongs to portfolio {int(header['portfolio_id'])}")
+            if (int(header['num_records']) > int(header['capacity'])
+                    or size < PNL_HEADER_SIZE + int(header['capacity']) * self.dtype.itemsize):
+                raise ValueError(f"{self.path} is truncated ({size} bytes for {int(header['capacity'])} records)")
+        except ValueError:
+            self._unmap()
+            raise
+
+    def _map(self) -> None:
+        self.mmap = mmap.mmap(self.file.fileno(), 0)
+        self.header = np.frombuffer(self.mmap, dtype=PNL_HEADER_DTYPE, count=1)
+        self.records = np.frombuffer(self.mmap, dtype=self.dtype, offset=PNL_HEADER_SIZE,
+                                     count=(len(self.mmap) - PNL_HEADER_SIZE) // self.dtype.itemsize)
+
+    def _unmap(self) -> None:
+        # the numpy views must go before the mmap can be closed
+        self.header = None
+        self.records = None
+        self.mmap.close()
+
+    def _grow(self) -> None:
+        capacity = int(self.header['capacity'][0]) * 2
+        self._unmap()
+        self.file.truncate(PNL_HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._map()
+        self.header['capacity'] = capacity
+
+    def __len__(self) -> int:
+        return int(self.header['num_records'][0])
+
+    def append(self, timestamp_ns: int, values) -> None:
+        """
+        Appends one record; `values` is a sequence in series order or a {series: value} mapping.
+        """
+        n = len(self)
+        if n >= int(self.header['capacity'][0]):
+            self._grow()
+
+        record = self.records[n:n + 1]
+        record['timestamp_ns'] = timestamp_ns
+        if isinstance(values, dict):
+            for name in self.series:
+                record[name] = values[name]
+        else:
+            for name, value in zip(self.series, values):
+                record[name] = value
+
+        # publish the record to readers only once it is complete
+        self.header['num_records'] = n + 1
+
+    def flush(self) -> None:
+        self.mmap.flush()
+
+    def close(self) -> None:
+        if self.mmap.closed:
+            return
+        self.mmap.flush()
+        self._unmap()
+        self.file.close()
+
+
+class PnlSeriesReader:
+    """
+    Reads an intraday P&L file written by PnlSeriesWriter.
+
+    The file is mapped only for the duration of each read, so the writer is free to grow it.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.offset = 0
+        self.header = None
+        self.dtype = None
+
+    def _read(self, start: int) -> np.ndarray:
+        # missing, or still being created by the writer (empty, or header not written yet): no data yet
+        if not self.path.exists() or self.path.stat().st_size < PNL_HEADER_SIZE:
+            return None
+
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if self.header is None:
+                    try:
+                        header = _read_header(mm)
+                        self.dtype = _header_record_dtype(header)
+                    except ValueError:
+                        return None
+                    self.header = header
+
+                num_records = int(np.frombuffer(mm, dtype='<u8', count=1, offset=_NUM_RECORDS_OFFSET)[0])
+                count = max(num_records - start, 0)
+                view = np.frombuffer(mm, dtype=self.dtype, count=count,
+                                     offset=PNL_HEADER_SIZE + start * self.dtype.itemsize)
+                # copy out of the mapping, the view must be released before it is closed
+                records = view.copy()
+                del view
+
+        return records
+
+    def read(self, start: int = 0) -> np.ndarray:
+        """
+        Returns every record from `start` (None when the file does not exist or is not initialized yet).
+        """
+        return self._read(start)
+
+    def tail(self) -> np.ndarray:
+        """
+        Returns the records appended since the previous call (None when the file does not exist or
+        is not initialized yet).
+        """
+        records = self._read(self.offset)
+        if records is not None:
+            self.offset += records.shape[0]
+        return records
+
+    @property
+    def series(self) -> tuple:
+        return () if self.dtype is None else self.dtype.names[1:]
@@ -0,0 +1,344 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Columnar (array-backed) position book for the RTD calculation server.
+#
+#   positions_df (pandas, from get_rtd_positions)
+#        │
+#        ▼
+#   +-------------------------------+        cid_index
+#   | static_df (tickers, names...) |      { figi -> [row, row, ...] }
+#   | price[]  bid[]  ask[]  ...    | <──── O(k) lookup per tick
+#   +-------------------------------+
+#        │
+#        ▼
+#   to_dataframe() (export view only)
+#
+
+import numpy as np
+import pandas as pd
+
+from dxdy.rtd.clock import get_clock
+
+
+def update_avg_cost(old_qty, old_cost, qty_change, trade_price, commission=0.0):
+    """
+    Applies one execution to a weighted-average-cost position, following the same rules as
+    `compute_positions_asof_date` in eod/tasks.py.
+
+    Returns (new_qty, new_avg_cost, realized_pnl).
+    """
+    new_qty = old_qty + qty_change
+    realized_pnl = 0.0
+
+    if old_qty * new_qty < 0:
+        # crossing from long to short or short to long in one trade
+        realized_pnl = -old_qty * (trade_price - old_cost) - commission
+        return new_qty, trade_price, realized_pnl
+
+    if old_qty == 0:
+        # opening from zero, commission capitalized into the cost
+        if new_qty == 0:
+            return 0, 0.0, 0.0
+        return new_qty, (trade_price * abs(new_qty) + commission) / abs(new_qty), 0.0
+
+    if old_qty * new_qty > 0:
+        if abs(new_qty) > abs(old_qty):
+            # net add to position => recalc weighted avg cost
+            new_cost = (old_qty * old_cost + qty_change * trade_price + commission) / new_qty
+            return new_qty, new_cost, 0.0
+
+        # partial close (realize PnL on the closed portion), cost basis unchanged
+        realized_pnl = (old_qty - new_qty) * (trade_price - old_cost) - commission
+        return new_qty, old_cost, realized_pnl
+
+    # new_qty == 0 => fully closed
+    realized_pnl = old_qty * (trade_price - old_cost) - commission
+    return 0, 0.0, realized_pnl
+
+
+class PositionBook:
+    """
+    Holds the real-time position book as one NumPy array per numeric field.
+
+    The descriptive columns (ticker, name, ccy, ...) stay in a static DataFrame that is
+    only touched when exporting. Ticks are applied through a precomputed
+    cid -> row-indices index, so a tick touching k rows costs O(k) instead of a boolean
+    scan over the whole book.
+    """
+
+    # mutable / numeric fields held as float64 arrays
+    FLOAT_COLUMNS = [
+        'latest_cash_balance',
+        'fx_rate',
+        'close_fx_rate',
+        'close_price',
+        'avg_cost',
+        'price',
+        'bid',
+        'ask',
+        'mkt_value',
+        'pct_aum',
+        'gain_loss',
+        'chg',
+        'pct_chg',
+        'pnl',
+        'price_pnl',
+        'fx_pnl',
+        'delay',
+    ]
+
+    # model price and Greeks of option rows, NaN elsewhere (see rtd/option_pricer.py)
+    OPTION_COLUMNS = [
+        'underlying_price',
+        'implied_vol',
+        'model_price',
+        'delta',
+        'gamma',
+        'vega',
+        'theta',
+    ]
+
+    # integer fields, kept in their native dtype
+    INT_COLUMNS = [
+        'row_num',
+        'portfolio_id',
+        'quantity',
+        'multiplier',
+    ]
+
+    def __init__(self, positions_df: pd.DataFrame, cid_col: str, local_tz=None):
+        self.cid_col = cid_col
+        self.local_tz = local_tz
+
+        self.static_df = positions_df.reset_index(drop=True)
+        self.size = self.static_df.shape[0]
+
+        for col in self.FLOAT_COLUMNS:
+            setattr(self, col, self.static_df[col].to_numpy(dtype=np.float64, copy=True))
+
+        for col in self.INT_COLUMNS:
+            setattr(self, col, self.static_df[col].to_numpy(copy=True))
+
+        for col in self.OPTION_COLUMNS:
+            if col in self.static_df.columns:
+                setattr(self, col, self.static_df[col].to_numpy(dtype=np.float64, copy=True))
+            else:
+                setattr(self, col, np.full(self.size, np.nan))
+
+        self.quote_timestamp_ns = np.full(self.size, get_clock().now_ns(), dtype=np.int64)
+        # time of the last revaluation (ns); converted to a datetime only on export
+        self.timestamp_ns = None
+
+        self.cid_index = self._build_index(self.cid_col)
+        self.portfolio_index = self._build_index('portfolio_id')
+
+        # (portfolio_id, cid) -> row position
+        self.line_index = {
+            (pid, cid): row for row, (pid, cid) in enumerate(zip(self.portfolio_id.tolist(), self.static_df[self.cid_col]))
+        }
+
+        # row_num (the wire / display key) -> row position
+        self.row_num_index = {row_num: row for row, row_num in enumerate(self.row_num.tolist())}
+
+    def _build_index(self, col: str) -> dict:
+        indices = self.static_df.groupby(col, sort=False).indices
+        return {key: np.asarray(rows, dtype=np.intp) for key, rows in indices.items()}
+
+    def portfolio_ids(self) -> list:
+        return list(self.portfolio_index.keys())
+
+    def apply_quotes(self, quotes: dict, local_time_ns: int):
+        """
+        Marks a micro-batch of quotes { cid: (last, bid, ask, quote_timestamp_ns) } and
+        revalues every affected row in a single vectorized pass.
+
+        `delay` is the time from the quote's receive (or source) timestamp to `local_time_ns`.
+
+        Returns the row positions that were updated (empty when no cid is in the book).
+        """
+        row_groups = []
+        last_prices = []
+        bid_prices = []
+        ask_prices = []
+        quote_timestamps = []
+
+        for cid, (last_price, bid_price, ask_price, quote_timestamp_ns) in quotes.items():
+            rows = self.cid_index.get(cid)
+            if rows is None:
+                continue
+            row_groups.append(rows)
+            last_prices.append(last_price)
+            bid_prices.append(np.nan if bid_price is None else bid_price)
+            ask_prices.append(np.nan if ask_price is None else ask_price)
+            quote_timestamps.append(quote_timestamp_ns)
+
+        if len(row_groups) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        counts = [len(rows) for rows in row_groups]
+        rows = np.concatenate(row_groups)
+
+        self.price[rows] = np.repeat(last_prices, counts)
+        self.bid[rows] = np.repeat(bid_prices, counts)
+        self.ask[rows] = np.repeat(ask_prices, counts)
+
+        quote_timestamp_ns = np.repeat(np.asarray(quote_timestamps, dtype=np.int64), counts)
+        self.quote_timestamp_ns[rows] = quote_timestamp_ns
+        self.delay[rows] = (local_time_ns - quote_timestamp_ns) * 1e-9
+
+        self.revalue(rows)
+        return rows
+
+    def revalue(self, rows) -> None:
+        """
+        Mark-to-market for the given row positions (rows not ticked yet are marked at the close).
+
+        The P&L is split into a price component, at the close FX rate, and an FX component on
+        the current value: pnl = price_pnl + fx_pnl.
+        """
+        close_price = self.close_price[rows]
+        price = self.price[rows]
+        price = np.where(np.isnan(price), close_price, price)
+        quantity = self.quantity[rows]
+        multiplier = self.multiplier[rows]
+        fx_rate = self.fx_rate[rows]
+        close_fx_rate = self.close_fx_rate[rows]
+
+        mkt_value = price * quantity * multiplier * fx_rate
+        chg = price - close_price
+        price_pnl = (chg * quantity) * multiplier * close_fx_rate
+        fx_pnl = price * quantity * multiplier * (fx_rate - close_fx_rate)
+
+        self.mkt_value[rows] = mkt_value
+        self.chg[rows] = chg
+        self.pct_chg[rows] = price / close_price - 1
+        self.price_pnl[rows] = price_pnl
+        self.fx_pnl[rows] = fx_pnl
+        self.pnl[rows] = price_pnl + fx_pnl
+
+        self.pct_aum[rows] = mkt_value / self.latest_cash_balance[rows]
+        self.gain_loss[rows] = mkt_value - (self.avg_cost[rows] * quantity)
+
+    def apply_fill(self, portfolio_id, cid, quantity, price, commission=0.0):
+        """
+        Applies an intraday execution to the (portfolio_id, cid) line: updates quantity and
+        avg_cost in place and re-marks the row.
+
+        Returns the row position, or None when the line is not in the book (see `insert_line`).
+        """
+        row = self.line_index.get((portfolio_id, cid))
+        if row is None:
+            return None
+
+        new_qty, new_cost, _ = update_avg_cost(self.quantity[row], self.avg_cost[row], quantity, price, commission)
+        self.quantity[row] = new_qty
+        self.avg_cost[row] = new_cost
+
+        # not ticked yet: revalue marks it at the close
+        self.revalue(np.array([row], dtype=np.intp))
+
+        return row
+
+    def insert_line(self, line) -> int:
+        """
+        Appends a new (portfolio_id, cid) line to the book without rebuilding it.
+
+        `line` is a mapping (dict / Series) holding the get_rtd_positions columns. Its
+        row_num is kept when set (e.g. by a shard allocating from its own range), otherwise
+        the next free one is assigned. Returns the new row position.
+        """
+        row = self.size
+        line = dict(line)
+        if pd.isna(line.get('row_num')):
+            line['row_num'] = int(self.row_num.max()) + 1 if self.size > 0 else 1
+
+        for col in self.FLOAT_COLUMNS:
+            value = line.get(col)
+            value = np.nan if value is None else value
+            setattr(self, col, np.append(getattr(self, col), np.float64(value)))
+
+        for col in self.INT_COLUMNS:
+            array = getattr(self, col)
+            setattr(self, col, np.append(array, np.asarray(line[col], dtype=array.dtype)))
+
+        for col in self.OPTION_COLUMNS:
+            setattr(self, col, np.append(getattr(self, col), np.nan))
+
+        self.quote_timestamp_ns = np.append(self.quote_timestamp_ns, np.int64(get_clock().now_ns()))
+
+        self.static_df = pd.concat([self.static_df, pd.DataFrame([line])], ignore_index=True)
+        self.size += 1
+
+        cid = line[self.cid_col]
+        portfolio_id = line['portfolio_id']
+        self.cid_index[cid] = np.append(self.cid_index.get(cid, np.empty(0, dtype=np.intp)), row)
+        self.portfolio_index[portfolio_id] = np.append(self.portfolio_index.get(portfolio_id, np.empty(0, dtype=np.intp)), row)
+        self.line_index[(portfolio_id, cid)] = row
+        self.row_num_index[int(line['row_num'])] = row
+
+        return row
+
+    def apply_rows(self, body) -> np.ndarray:
+        """
+        Writes wire-format rows (e.g. a POSITION_ROW_DTYPE delta from another server)
+        into the book by row_num. Rows not in the book are ignored.
+
+        Returns the row positions that were updated.
+        """
+        rows = np.fromiter((self.row_num_index.get(row_num, -1) for row_num in body['row_num'].tolist()),
+                           dtype=np.intp, count=body.shape[0])
+        known = rows >= 0
+        rows = rows[known]
+        body = body[known]
+
+        for name in body.dtype.names:
+            if name != 'row_num':
+                getattr(self, name)[rows] = body[name]
+
+        self.chg[rows] = self.price[rows] - self.close_price[rows]
+        return rows
+
+    def portfolio_pnl_series(self, portfolio_id) -> dict:
+        """
+        Net, long, short and gross (sum of |line P&L|) intraday P&L of a portfolio.
+        """
+        rows = self.portfolio_index.get(portfolio_id)
+        if rows is None:
+            return {'net': 0.0, 'long': 0.0, 'short': 0.0, 'gross': 0.0}
+
+        pnl = self.pnl[rows]
+        quantity = self.quantity[rows]
+        return {
+            'net': float(np.nansum(pnl)),
+            'long': float(np.nansum(pnl[quantity > 0])),
+            'short': float(np.nansum(pnl[quantity < 0])),
+            'gross': float(np.nansum(np.abs(pnl))),
+        }
+
+    def to_dataframe(self, rows=None) -> pd.DataFrame:
+        """
+        Exports the book (or a subset of row positions) as a pandas DataFrame with the same
+        columns as `get_rtd_positions`.
+        """
+        if rows is None:
+            df = self.static_df.copy()
+            rows = slice(None)
+        else:
+            df = self.static_df.iloc[rows].copy()
+
+        for col in self.FLOAT_COLUMNS + self.INT_COLUMNS + self.OPTION_COLUMNS:
+            df[col] = getattr(self, col)[rows]
+
+        timestamp = None
+        if self.timestamp_ns is not None:
+            timestamp = pd.Timestamp(self.timestamp_ns, unit='ns', tz='UTC')
+            if self.local_tz is not None:
+                timestamp = timestamp.tz_convert(self.local_tz)
+        df['timestamp'] = timestamp
+
+        quote_timestamp = pd.to_datetime(self.quote_timestamp_ns[rows], unit='ns', utc=True)
+        if self.local_tz is not None:
+            quote_timestamp = quote_timestamp.tz_convert(self.local_tz)
+        df['quote_timestamp'] = quote_timestamp
+
+        return df
@@ -5,17 +5,17 @@
 import sys
 from multiprocessing import Process
 
-import struct
 import duckdb
+import numpy as np
 import pandas as pd
 from tabulate import tabulate
 
-import ntplib
 import time
-from datetime import datetime, date, timedelta
-from zoneinfo import ZoneInfo
+
+import asyncio
 
 import zmq
+import zmq.asyncio
 
 
 # disable default logger
@@ -41,14 +41,40 @@ else:
     from typing_extensions import Literal
 
 from dxdy.db.market_data import MarketDataApi, MarketDataApiFactory
+from dxdy.bbg.subscriptions import SubscriptionManager
 from dxdy.settings import Settings
 import dxdy.db.utils as db_utils
 from dxdy.email.reports import send_intraday_pnl_report
 from dxdy.eod.tasks import task_load_intraday_transactions_data
+from dxdy.rtd.position_book import PositionBook
+from dxdy.rtd.tick_batcher import TickBatcher
+from dxdy.rtd.wire_format import WireEncoder
+from dxdy.rtd.snapshot import SnapshotService
+from dxdy.rtd.intraday_fills import IntradayFillWorker
+from dxdy.rtd.runtime import MeteredQueue, every
+from dxdy.rtd.pnl_store import PnlSeriesWriter, intraday_pnl_file_path
+from dxdy.rtd.partition import shard_of, shard_mask, shard_endpoints
+from dxdy.rtd.tick_capture import TickRecorder
+from dxdy.rtd.latency import LatencyStats, SampledLog, StatsService
+from dxdy.rtd.clock import ClockService, get_clock
+from dxdy.rtd.option_pricer import OptionPricer
+from dxdy.rtd.fx_rates import FxRateVector
+from dxdy.rtd.aggregates import RunningAggregates
+from dxdy.rtd.shm_book import SharedBookPublisher
+from dxdy.rtd.limits import LimitEngine, LimitEventWriter
+from dxdy.rtd.var import CovarianceCache, IntradayVar
 
 API_SELECTION = "bbg"
 #API_SELECTION = "spgi"
 
+# captured ticks instead of the live feed (see rtd/tick_capture.py)
+if Settings().get_tick_replay_config()['enabled']:
+    API_SELECTION = "replay"
+
+# load testing (see quant/synthetic_feed.py)
+elif Settings().get_synthetic_feed_config()['enabled']:
+    API_SELECTION = "synthetic"
+
 
 API : MarketDataApi = MarketDataApiFactory().get_api(API_SELECTION)
 CID = API.securities_identifier()
@@ -197,6 +223,22 @@ CID = API.securities_identifier()
 
 
 
+# one sector per security (the first by name when a security is mapped to several)
+SECTOR_QUERY = """
+    SELECT
+        sector_mappings.security_id,
+        MIN(sectors.sector_name) AS sector_name
+    FROM
+        sector_mappings
+    JOIN
+        sectors
+    ON
+        sectors.sector_id = sector_mappings.sector_id
+    GROUP BY
+        sector_mappings.security_id
+"""
+
+
 def get_rtd_positions(cur_cob_date, mkt_cob_date) -> pd.DataFrame:
     db_conn = Settings().get_db_connection()
     
@@ -207,6 +249,7 @@ def get_rtd_positions(cur_cob_date, mkt_cob_date) -> pd.DataFrame:
                 ROW_NUMBER() OVER() as row_num,
                 psn.portfolio_id,
                 portfolio_name,
+                portfolios.portfolio_ccy,
                 cash_balances.latest_cash_balance,
                 s.security_id,
                 s.figi,
@@ -231,6 +274,10 @@ def get_rtd_positions(cur_cob_date, mkt_cob_date) -> pd.DataFrame:
                 psn.avg_cost,
                 o.contract_type,
                 o.expiration_date,
+                o.strike_price,
+                us.{CID} AS underlying_cid,
+                um.close_price AS underlying_close_price,
+                sm.sector_name,
                 CAST(NULL AS DOUBLE) AS price,
                 CAST(NULL AS DOUBLE) AS bid,
                 CAST(NULL AS DOUBLE) AS ask,
@@ -258,6 +305,21 @@ def get_rtd_positions(cur_cob_date, mkt_cob_date) -> pd.DataFrame:
                 options o
             ON
                 o.security_id = psn.security_id
+            LEFT JOIN
+                securities us
+            ON
+                us.security_id = o.underlying_security_id
+            LEFT JOIN
+                market_data um
+            ON
+                um.security_id = o.underlying_security_id
+            AND
+                um.trade_date = '{mkt_cob_date}'
+            LEFT JOIN
+                ({SECTOR_QUERY}) sm
+            ON
+                -- options are reported in the sector of their underlying
+                sm.security_id = COALESCE(o.underlying_security_id, s.security_id)
             --LEFT JOIN
             --    market_data m
             --ON 
@@ -297,7 +359,7 @@ def get_rtd_positions(cur_cob_date, mkt_cob_date) -> pd.DataFrame:
     #                         on=['portfolio_id', 'security_id'], how='left')
         
     positions_df['timestamp'] = 0       
-    positions_df['quote_timestamp'] = datetime.now().astimezone(ZoneInfo("America/New_York"))
+    positions_df['quote_timestamp'] = get_clock().now()
     positions_df['delay'] = float('nan')
     positions_df['price'] = float('nan')
         
@@ -308,29 +370,213 @@ def get_rtd_positions(cur_cob_date, mkt_cob_date) -> pd.DataFrame:
     positions_df['chg'] = 0.0
     positions_df['pct_chg'] = 0.0
     positions_df['pnl'] = 0.0
+    # P&L split: price moves at the close FX rate, FX moves on the current value
+    positions_df['close_fx_rate'] = positions_df['fx_rate']
+    positions_df['price_pnl'] = 0.0
+    positions_df['fx_pnl'] = 0.0
     
     
     
     return positions_df    
 
-def get_ntp_time(local_tz, ntp_stats):
-        if ntp_stats is None:
-            current_time_ns = time.time_ns() 
-            local_dt = datetime.now()
-            return current_time_ns, local_dt
-        
-        #delay = self.ntp_stats.delay
-        offset = ntp_stats.offset
-        current_time_ns = time.time_ns()
-        corrected_time_ns = current_time_ns + int(offset * 1e9)
-        utc_ntp_corrected_time = datetime.fromtimestamp(corrected_time_ns / 1e9, tz=ZoneInfo("UTC"))
-        # precision = self.ntp_stats.precision
-        # root_delay = self.ntp_stats.root_delay
-        # root_dispersion = self.ntp_stats.root_dispersion
-        # epsilon = 2 ** precision
-        # total_error = (delay / 2) + (root_delay / 2) + root_dispersion + epsilon
-        local_dt = utc_ntp_corrected_time.astimezone(local_tz)
-        return corrected_time_ns, local_dt
+
+def get_rtd_fx_rates(mkt_cob_date) -> pd.DataFrame:
+    """
+    EOD FX rate of every currency (ccy, fx_rate) on the market COB date.
+    """
+    with Settings().get_db_connection() as db_conn:
+        sql_query = f"""
+            SELECT 
+                ccy,
+                fx_rate
+            FROM 
+                fx_rates_data
+            WHERE
+                fx_date = '{mkt_cob_date}'
+            """
+        return db_conn.execute(sql_query).fetchdf()
+
+
+def get_rtd_risk_limits() -> pd.DataFrame:
+    """
+    Enabled risk limits (limit_id, portfolio_id, limit_type, scope, threshold).
+    """
+    with Settings().get_db_connection() as db_conn:
+        sql_query = """
+            SELECT
+                limit_id,
+                portfolio_id,
+                limit_type,
+                scope,
+                threshold
+            FROM
+                risk_limits
+            WHERE
+                enabled
+            ORDER BY
+                limit_id
+            """
+        try:
+            return db_conn.execute(sql_query).fetchdf()
+        except duckdb.CatalogException:
+            logger.warning("No risk_limits table in the database, real-time limits disabled")
+            return pd.DataFrame(columns=['limit_id', 'portfolio_id', 'limit_type', 'scope', 'threshold'])
+
+
+def persist_risk_limit_events(events_df: pd.DataFrame) -> None:
+    with Settings().get_db_connection(readonly=False) as db_conn:
+        with db_utils.DuckDBTemporaryTable(db_conn, 'tmp_risk_limit_events', events_df):
+            db_conn.execute("""
+                INSERT INTO risk_limit_events (event_time, cob_date, limit_id, portfolio_id, limit_type, scope, row_num, event, value, threshold)
+                SELECT event_time, cob_date, limit_id, portfolio_id, limit_type, scope, row_num, event, value, threshold
+                FROM tmp_risk_limit_events
+                """)
+
+
+def get_rtd_daily_returns(cids, mkt_cob_date, lookback_days: int) -> pd.DataFrame:
+    """
+    Last `lookback_days` daily returns (cid, trade_date, daily_return) of every cid up to the
+    market COB date.
+    """
+    cids_df = pd.DataFrame({'cid': list(cids)})
+    with Settings().get_db_connection() as db_conn:
+        with db_utils.DuckDBTemporaryTable(db_conn, 'tmp_var_cids', cids_df):
+            sql_query = f"""
+                SELECT
+                    s.{CID} AS cid,
+                    m.trade_date,
+                    m.daily_return
+                FROM
+                    market_daily_returns m
+                JOIN
+                    securities s
+                ON
+                    s.security_id = m.security_id
+                JOIN
+                    tmp_var_cids c
+                ON
+                    c.cid = s.{CID}
+                WHERE
+                    m.trade_date <= '{mkt_cob_date}'
+                AND
+                    m.daily_return IS NOT NULL
+                QUALIFY
+                    ROW_NUMBER() OVER (PARTITION BY s.{CID} ORDER BY m.trade_date DESC) <= {int(lookback_days)}
+                """
+            return db_conn.execute(sql_query).fetchdf()
+
+
+def get_rtd_covariance_cache(mkt_cob_date, var_config: dict) -> CovarianceCache:
+    return CovarianceCache(Settings().get_var_cache_dir(), mkt_cob_date,
+                           lambda cids: get_rtd_daily_returns(cids, mkt_cob_date, var_config['lookback_days']),
+                           lookback_days=var_config['lookback_days'],
+                           min_observations=var_config['min_observations'])
+
+
+def get_rtd_new_lines(cur_cob_date, mkt_cob_date, lines) -> pd.DataFrame:
+    """
+    Static data of (portfolio_id, cid) lines opened intraday, with the get_rtd_positions columns.
+
+    quantity and avg_cost start at zero: the RTD server applies the executions on top.
+    """
+    lines_df = pd.DataFrame(lines, columns=['portfolio_id', 'cid'])
+
+    with Settings().get_db_connection() as db_conn:
+        with db_utils.DuckDBTemporaryTable(db_conn, 'tmp_rtd_new_lines', lines_df):
+            sql_query = f"""
+                SELECT 
+                    CAST(NULL AS BIGINT) AS row_num,
+                    l.portfolio_id,
+                    portfolio_name,
+                    portfolios.portfolio_ccy,
+                    cash_balances.latest_cash_balance,
+                    s.security_id,
+                    s.figi,
+                    CASE
+                        WHEN s.security_type_2 = 'Option' THEN s.security_description
+                        ELSE s.ticker
+                    END AS  ticker,
+                    s.exch_code,
+                    s.name,
+                    s.ccy,
+                    fx2.fx_rate / fx1.fx_rate AS fx_rate,
+                    s.security_type_2,
+                    0 AS quantity,
+                    COALESCE(o.shares_per_contract, 1) AS multiplier,
+                    psn.close_price AS close_price,
+                    0.0 AS avg_cost,
+                    o.contract_type,
+                    o.expiration_date,
+                    o.strike_price,
+                    us.{CID} AS underlying_cid,
+                    um.close_price AS underlying_close_price,
+                    sm.sector_name
+                FROM 
+                    tmp_rtd_new_lines l
+                JOIN
+                    securities s
+                ON
+                    s.{CID} = l.cid
+                JOIN
+                    portfolios 
+                ON 
+                    portfolios.portfolio_id = l.portfolio_id
+                LEFT JOIN
+                    (SELECT * FROM daily_positions WHERE cob_date = '{cur_cob_date}') AS psn
+                ON
+                    psn.portfolio_id = l.portfolio_id
+                AND
+                    psn.security_id = s.security_id
+                LEFT JOIN
+                    latest_cash_balance_view cash_balances
+                ON
+                    cash_balances.portfolio_id = l.portfolio_id
+                LEFT JOIN
+                    options o
+                ON
+                    o.security_id = s.security_id
+                LEFT JOIN
+                    securities us
+                ON
+                    us.security_id = o.underlying_security_id
+                LEFT JOIN
+                    market_data um
+                ON
+                    um.security_id = o.underlying_security_id
+                AND
+                    um.trade_date = '{mkt_cob_date}'
+                LEFT JOIN
+                    ({SECTOR_QUERY}) sm
+                ON
+                    sm.security_id = COALESCE(o.underlying_security_id, s.security_id)
+                LEFT JOIN
+                    fx_rates_data fx1
+                ON
+                    fx1.ccy = portfolios.portfolio_ccy
+                AND
+                    fx1.fx_date = '{mkt_cob_date}'
+                LEFT JOIN
+                    fx_rates_data fx2
+                ON
+                    fx2.ccy = s.ccy
+                AND
+                    fx2.fx_date = '{mkt_cob_date}'
+                """
+            positions_df = db_conn.execute(sql_query).fetchdf()
+
+    positions_df['timestamp'] = 0
+    positions_df['quote_timestamp'] = get_clock().now()
+    for col in ['delay', 'price', 'bid', 'ask', 'pct_aum', 'gain_loss']:
+        positions_df[col] = float('nan')
+    positions_df['mkt_value'] = 0.0
+    positions_df['chg'] = 0.0
+    positions_df['pct_chg'] = 0.0
+    positions_df['pnl'] = 0.0
+    positions_df['close_fx_rate'] = positions_df['fx_rate']
+    positions_df['price_pnl'] = 0.0
+    positions_df['fx_pnl'] = 0.0
+
+    return positions_df
 
 
 def send_intraday_email(positions_df):
@@ -339,8 +585,6 @@ def send_intraday_email(positions_df):
         
 class RtdCalcServer:
     # Constants and configurations
-    ntp_client = ntplib.NTPClient()
-
     ZMQ_PUB = None
     zmq_context = None
 
@@ -353,38 +597,485 @@ class RtdCalcServer:
     
     intraday_files = {}
         
-    def __init__(self):
+    def __init__(self, shard_id : int = None, api : MarketDataApi = None, startup_fills_df : pd.DataFrame = None):
         
-        self.ntp_stats = None
+        # shared clock: monotonic base + NTP offset refreshed on a background thread
+        self.clock : ClockService = get_clock()
+        # market data provider (the configured one unless injected, e.g. by rtd/bench.py)
+        self.api : MarketDataApi = api if api is not None else API
         self.context = None
         self.pub_socket = None
-        self.positions_df = None
+        self.snapshot_service : SnapshotService = None
+        self.stats_service : StatsService = None
+        self.encoder = WireEncoder()
+        self.book : PositionBook = None
+        self.batcher : TickBatcher = None
+        self.fill_worker : IntradayFillWorker = None
+        self.tick_recorder : TickRecorder = None
+        self.option_pricer : OptionPricer = None
+        self.fx_rates : FxRateVector = None
+        self.aggregates : RunningAggregates = None
         self.tickers = None
+        self.subscriptions : SubscriptionManager = None
+
+        # bounded hand-offs between the runtime tasks (created on the event loop)
+        self.quotes_queue : MeteredQueue = None
+        self.publish_queue : MeteredQueue = None
         
         self.ZMQ_PUB = Settings().get_realtime_calculation_tcp_socket()
+        self.ZMQ_SNAPSHOT = Settings().get_realtime_snapshot_tcp_socket()
+        self.ZMQ_STATS = Settings().get_realtime_stats_tcp_socket()
+        self.pub_hwm = Settings().get_rtd_pub_hwm()
         self.db_file = Settings()._get_db_file()
         self.NTP_SERVER = Settings().get_ntp_server()
         self.local_tz = Settings().get_timezone()
         self.cur_cob_date = db_utils.get_current_cob_date()
         self.next_cob_date = db_utils.get_next_cob_date()
+        self.batch_config = Settings().get_rtd_batch_config()
+        self.fills_poll_interval = Settings().get_rtd_fills_poll_interval()
+        self.runtime_config = Settings().get_rtd_runtime_config()
+        self.option_config = Settings().get_option_pricing_config()
+        self.fx_streaming = Settings().get_rtd_fx_streaming()
+        self.shared_book_config = Settings().get_shared_book_config()
+        self.shared_book : SharedBookPublisher = None
+        self.limits_config = Settings().get_risk_limits_config()
+        self.limits : LimitEngine = None
+        self.limit_writer : LimitEventWriter = None
+        self.var_config = Settings().get_intraday_var_config()
+        self.var : IntradayVar = None
+
+        # per-stage latency / queue depth histograms (see rtd/latency.py)
+        self.stats = LatencyStats()
+        self.log_sampler = SampledLog(self.runtime_config['log_sample_interval_s'])
+
+        # replay: batches and timestamps follow the captured ticks, so every run gives the same output
+        self.replay = API_SELECTION == "replay"
+        # intraday fills are not replayed
+        self.poll_fills = not self.replay
+        self.tick_capture_config = Settings().get_tick_capture_config()
+
+        # sharded mode: this process owns one partition and publishes to the aggregator,
+        # which writes the intraday P&L files and sends the emails
+        self.sharding = Settings().get_rtd_sharding_config()
+        self.shard_id = shard_id
+        self.next_row_num = None
+        # sharded: blotter snapshot read by run_sharded() before it loaded the transactions
+        self.startup_fills_df = startup_fills_df
+        if self.shard_id is not None:
+            self.ZMQ_PUB, self.ZMQ_SNAPSHOT = shard_endpoints(self.sharding, self.shard_id)
+            # the aggregator serves the stats endpoint
+            self.ZMQ_STATS = None
+
+
+    def clock_ns(self) -> int:
+        # NTP-corrected wall clock as integer ns (no datetime), for stamping on the tick path
+        return self.clock.now_ns()
+
+    def is_sharded(self) -> bool:
+        return self.shard_id is not None
+
+    def owns_line(self, portfolio_id, cid) -> bool:
+        if not self.is_sharded():
+            return True
+        return shard_of(portfolio_id, cid, self.sharding['shards'], self.sharding['shard_by']) == self.shard_id
+
+    def load_intraday_transactions(self) -> None:
+        # shards: the aggregator loads the intraday transactions once before starting them
+        if not self.is_sharded():
+            task_load_intraday_transactions_data(self.next_cob_date, self.cur_cob_date)
+
+    def load_book(self) -> PositionBook:
+        positions_df = get_rtd_positions(self.next_cob_date, self.cur_cob_date)
+        if not self.is_sharded():
+            return PositionBook(positions_df, CID, self.local_tz)
+
+        # row_nums of lines opened intraday are allocated per shard so they stay unique
+        num_shards = self.sharding['shards']
+        max_row_num = int(positions_df['row_num'].max()) if positions_df.shape[0] > 0 else 0
+        self.next_row_num = max_row_num + 1 + self.shard_id
+
+        mask = shard_mask(positions_df, CID, self.shard_id, num_shards, self.sharding['shard_by'])
+        logger.info(f"RTD shard {self.shard_id}/{num_shards}: {mask.sum()} of {positions_df.shape[0]} positions")
+        return PositionBook(positions_df[mask], CID, self.local_tz)
+
+    def open_intraday_file(self, portfolio_id):
+        file_path = intraday_pnl_file_path(Settings().get_intraday_pnl_files_dir(), self.cur_cob_date, portfolio_id)
+        self.intraday_files[portfolio_id] = PnlSeriesWriter(file_path, int(portfolio_id), self.clock_ns())
+
+    def is_quoted(self, cid) -> bool:
+        # a cid is streamed while one of its lines is open, or while it prices options or FX
+        rows = self.book.cid_index.get(cid)
+        if rows is not None and np.any(self.book.quantity[rows] != 0):
+            return True
+        if self.option_pricer is not None and cid in self.option_pricer.underlying_index:
+            return True
+        return self.fx_rates is not None and cid in self.fx_rates.ccy_of_cid
+
+    def update_subscriptions(self, cids) -> None:
+        """
+        Subscribes the `cids` opened intraday and unsubscribes the ones whose lines went flat.
+        """
+        opened = [cid for cid in cids if cid not in self.tickers and self.is_quoted(cid)]
+        closed = [cid for cid in cids if cid in self.tickers and not self.is_quoted(cid)]
+        if len(opened) == 0 and len(closed) == 0:
+            return
+
+        if self.subscriptions is None:
+            for cid in opened:
+                logger.warning(f"{cid} was opened intraday and is not in the real-time subscription")
+            return
+
+        if len(opened) > 0:
+            self.subscriptions.subscribe(opened)
+            self.tickers.update(opened)
+        if len(closed) > 0:
+            logger.info(f"Unsubscribing {len(closed)} flat cids: {closed[:10]}")
+            self.subscriptions.unsubscribe(closed)
+            self.tickers.difference_update(closed)
+
+    def apply_intraday_fills(self, local_time_ns) -> list:
+        """
+        Applies the executions queued by the fill worker to the book.
+
+        Returns the messages to publish: the affected rows, or a reload when lines were inserted.
+        """
+        fill_rows = []
+        new_rows = []
+        # cids whose lines changed: subscribed or unsubscribed once the fills are applied
+        changed_cids = set()
+
+        for new_lines_df, executions_df in self.fill_worker.drain():
+            for _, line in new_lines_df.iterrows():
+                if pd.isna(line['close_price']):
+                    # no close for a line opened today: P&L is measured from the first execution
+                    first = executions_df[(executions_df['portfolio_id'] == line['portfolio_id']) & (executions_df['cid'] == line[CID])]
+                    line['close_price'] = first['price'].iloc[0] if first.shape[0] > 0 else float('nan')
+
+                if self.is_sharded():
+                    line['row_num'] = self.next_row_num
+                    self.next_row_num += self.sharding['shards']
+
+                new_rows.append(self.book.insert_line(line))
+
+                changed_cids.add(line[CID])
+                if not pd.isna(line.get('underlying_cid')):
+                    changed_cids.add(line['underlying_cid'])
+
+                if not self.is_sharded() and line['portfolio_id'] not in self.intraday_files:
+                    self.open_intraday_file(line['portfolio_id'])
+
+            for execution in executions_df.itertuples(index=False):
+                row = self.book.apply_fill(execution.portfolio_id, execution.cid, execution.quantity, execution.price)
+                if row is None:
+                    logger.warning(f"intraday execution for unknown line ({execution.portfolio_id}, {execution.cid}) skipped")
+                else:
+                    fill_rows.append(row)
+                    changed_cids.add(execution.cid)
+
+        if self.fx_rates is not None and len(new_rows) > 0:
+            self.fx_rates.add_rows(np.asarray(new_rows, dtype=np.intp))
+
+        if self.option_pricer is not None and len(new_rows) > 0:
+            # options opened intraday: vol implied from their first execution (close_price)
+            self.option_pricer.add_rows(np.asarray(new_rows, dtype=np.intp), local_time_ns)
+
+        self.update_subscriptions(changed_cids)
+
+        if len(new_rows) > 0 or len(fill_rows) > 0:
+            logger.info(f"Applied intraday fills: {len(fill_rows)} executions, {len(new_rows)} new lines")
+
+        if len(new_rows) > 0:
+            if self.aggregates is not None:
+                self.aggregates.add_rows(np.asarray(new_rows, dtype=np.intp))
+                self.aggregates.rebuild()
+            if self.shared_book is not None:
+                self.shared_book.publish_all(self.book, local_time_ns)
+            # new rows: subscribers re-sync from the snapshot endpoint
+            messages = [self.encoder.encode_reload(local_time_ns)]
+            if self.limits is not None:
+                self.limits.rebuild()
+                messages += self.limit_event_messages(np.arange(self.book.size), local_time_ns)
+            if self.var is not None:
+                self.var.add_rows(np.asarray(new_rows, dtype=np.intp))
+                messages.append(self.encoder.encode_var(self.var.portfolio_var(), local_time_ns))
+            return messages
+        elif len(fill_rows) > 0:
+            fill_rows = np.unique(fill_rows)
+            messages = [self.encoder.encode_position_rows(self.book, fill_rows, local_time_ns)]
+            if self.shared_book is not None:
+                self.shared_book.publish(self.book, fill_rows, local_time_ns)
+            if self.aggregates is not None:
+                groups = self.aggregates.update(fill_rows)
+                messages.append(self.encoder.encode_aggregates(self.aggregates, groups, local_time_ns))
+            if self.limits is not None:
+                messages += self.limit_event_messages(fill_rows, local_time_ns)
+            if self.var is not None:
+                portfolios = self.var.update(fill_rows)
+                if len(portfolios) > 0:
+                    messages.append(self.encoder.encode_var(self.var.portfolio_var(portfolios), local_time_ns))
+            return messages
+        return []
+
+    def limit_event_messages(self, rows, local_time_ns) -> list:
+        events = self.limits.evaluate(rows, local_time_ns)
+        if events.shape[0] == 0:
+            return []
+        self.limit_writer.put(events)
+        return [self.encoder.encode_limit_events(events, local_time_ns)]
+
+    ################################################################################################
+    # runtime tasks
+    ################################################################################################
+
+    async def ingest_task(self):
+        """
+        Feed ingest: hands the tick batcher's micro-batches to the revaluation task.
+        """
+        while True:
+            try:
+                # the batcher blocks on its reader thread's queue, keep that off the event loop
+                quotes = await asyncio.to_thread(self.batcher.next_batch, 0.1)
+            except StopIteration:
+                logger.info("real-time data stream ended")
+                await self.quotes_queue.put(None)
+                return
+
+            if len(quotes) > 0:
+                await self.quotes_queue.put((quotes, self.batcher.last_batch_timestamp_ns))
+
+    async def revalue_task(self):
+        """
+        Revaluation: applies every pending batch to the book in one vectorized pass and
+        queues the encoded delta for the publisher.
+        """
+        while True:
+            batch = await self.quotes_queue.get()
+            revalue_start_ns = time.perf_counter_ns()
+            if batch is None:
+                await self.publish_queue.put(None)
+                return
+            quotes, source_timestamp_ns = batch
+
+            # the publisher or the loop fell behind: coalesce the queued batches, latest quote wins
+            # (not in replay, where it would depend on the timing of the run)
+            while not self.replay and not self.quotes_queue.empty():
+                more_batch = self.quotes_queue.get_nowait()
+                if more_batch is None:
+                    await self.quotes_queue.put(None)
+                    break
+                quotes.update(more_batch[0])
+
+            local_time_ns = source_timestamp_ns if self.replay else self.clock_ns()
+            self.book.timestamp_ns = local_time_ns
+
+            # feed receive (or replayed source) time of each quote -> start of its revaluation
+            quote_timestamps = np.fromiter((quote[3] for quote in quotes.values()), dtype=np.int64, count=len(quotes))
+            self.stats.record_many('feed_to_revalue', local_time_ns - quote_timestamps)
+
+            # single vectorized revaluation of every row touched by the batch
+            ticker_rows = self.book.apply_quotes(quotes, local_time_ns)
+
+            # FX ticks: every row quoted or reported in the ticked currencies, one vectorized pass
+            if self.fx_rates is not None:
+                fx_rows = self.fx_rates.on_quotes(quotes)
+                if len(fx_rows) > 0:
+                    ticker_rows = np.union1d(ticker_rows, fx_rows)
+
+            # options on the ticked underlyings, repriced in one vectorized Black-Scholes pass
+            option_rows = None
+            if self.option_pricer is not None:
+                option_start_ns = time.perf_counter_ns()
+                option_rows = self.option_pricer.on_quotes(quotes, local_time_ns)
+                self.stats.record('option_reprice', time.perf_counter_ns() - option_start_ns)
+                if self.option_pricer.mark_to_model and len(option_rows) > 0:
+                    ticker_rows = np.union1d(ticker_rows, option_rows)
+
+            if len(ticker_rows) == 0:
+                continue
 
-
-    def check_intraday_fills(self):
-        pass
-
-    def main(self):
-        self.context = zmq.Context()
+            # encoded here, so the snapshot (taken on this loop) always matches the last seq
+            message = self.encoder.encode_position_rows(self.book, ticker_rows, local_time_ns)
+            option_message = None
+            if option_rows is not None and len(option_rows) > 0:
+                option_message = self.encoder.encode_option_rows(self.book, option_rows, local_time_ns)
+
+            # running totals: only the groups of the updated rows change
+            aggregates_message = None
+            if self.aggregates is not None:
+                groups = self.aggregates.update(ticker_rows)
+                aggregates_message = self.encoder.encode_aggregates(self.aggregates, groups, local_time_ns)
+
+            # risk limits on the updated totals and rows
+            limits_message = None
+            if self.limits is not None:
+                limits_start_ns = time.perf_counter_ns()
+                events = self.limits.evaluate(ticker_rows, local_time_ns)
+                self.stats.record('limits', time.perf_counter_ns() - limits_start_ns)
+                if events.shape[0] > 0:
+                    limits_message = self.encoder.encode_limit_events(events, local_time_ns)
+                    self.limit_writer.put(events)
+
+            # VaR: rank-one updates of the exposures that moved (option deltas move with their
+            # underlying even when the options are not marked to model)
+            var_message = None
+            if self.var is not None:
+                var_start_ns = time.perf_counter_ns()
+                var_rows = ticker_rows if option_rows is None else np.union1d(ticker_rows, option_rows)
+                portfolios = self.var.update(var_rows)
+                self.stats.record('var', time.perf_counter_ns() - var_start_ns)
+                if len(portfolios) > 0:
+                    var_message = self.encoder.encode_var(self.var.portfolio_var(portfolios), local_time_ns)
+
+            if self.shared_book is not None:
+                self.shared_book.publish(self.book, ticker_rows, local_time_ns)
+            self.stats.record('revalue', time.perf_counter_ns() - revalue_start_ns)
+
+            self.stats.record('tick_queue_depth', self.batcher.queue_depth(), unit='count')
+            self.stats.record('quotes_queue_depth', self.quotes_queue.depth(), unit='count')
+            self.stats.record('publish_queue_depth', self.publish_queue.depth(), unit='count')
+
+            await self.publish_queue.put((message, time.perf_counter_ns(), int(quote_timestamps.min())))
+            if option_message is not None:
+                await self.publish_queue.put((option_message, time.perf_counter_ns(), None))
+            if aggregates_message is not None:
+                await self.publish_queue.put((aggregates_message, time.perf_counter_ns(), None))
+            if limits_message is not None:
+                await self.publish_queue.put((limits_message, time.perf_counter_ns(), None))
+            if var_message is not None:
+                await self.publish_queue.put((var_message, time.perf_counter_ns(), None))
+
+            # hot path: the formatted book is only logged once per log_sample_interval_s
+            if self.log_sampler.ready():
+                logger.debug(f"\n{self.book.to_dataframe(ticker_rows)[['ticker','quantity','price', 'bid', 'ask', 'mkt_value', 'pct_aum', 'gain_loss', 'chg','pct_chg','pnl', 'fx_pnl', 'delay']]}")
+
+    async def publish_task(self):
+        """
+        Publishing: sends the encoded messages in order.
+
+        Queue items are (message, enqueue perf_counter ns, oldest quote timestamp ns or None).
+        """
+        while True:
+            item = await self.publish_queue.get()
+            if item is None:
+                return
+
+            message, enqueue_ns, quote_timestamp_ns = item
+            await self.pub_socket.send(message, copy=False)
+
+            self.stats.record('publish', time.perf_counter_ns() - enqueue_ns)
+            # replayed quotes carry their captured timestamps, not comparable to the wall clock
+            if quote_timestamp_ns is not None and not self.replay:
+                self.stats.record('tick_to_publish', self.clock_ns() - quote_timestamp_ns)
+
+    async def snapshot_task(self):
+        # late joiners / subscribers with gaps: full book as of the last published seq
+        await self.snapshot_service.serve(lambda: self.book, self.encoder, self.clock_ns)
+
+    def persist_intraday_pnl(self):
+        # intraday pnl files (mmap, see rtd/pnl_store.py): one net/long/short/gross record per portfolio
+        local_time_ns = self.clock_ns()
+        for portfolio_id in self.book.portfolio_ids():
+            self.intraday_files[portfolio_id].append(local_time_ns, self.aggregates.portfolio_pnl_series(portfolio_id))
+
+    async def fills_task(self):
+        """
+        Fill polling: blotter reads and DB writes run in the default executor, the book is
+        updated on the event loop.
+        """
+        async def poll():
+            try:
+                await asyncio.to_thread(self.fill_worker.poll)
+            except Exception as e:
+                logger.error(f"intraday fills poll failed: {e}")
+
+            local_time_ns = self.clock_ns()
+            for message in self.apply_intraday_fills(local_time_ns):
+                await self.publish_queue.put((message, time.perf_counter_ns(), None))
+
+        await every(self.fills_poll_interval, poll)
+
+    async def var_task(self):
+        """
+        VaR of every portfolio (for late joiners) and the marginal / component VaR of the
+        portfolios updated since the last run, at most once per contributions_interval_s.
+        """
+        async def publish():
+            local_time_ns = self.clock_ns()
+            contributions = self.var.contributions(dirty=True)
+            await self.publish_queue.put((self.encoder.encode_var(self.var.portfolio_var(), local_time_ns), time.perf_counter_ns(), None))
+            if contributions.shape[0] > 0:
+                await self.publish_queue.put((self.encoder.encode_var_contributions(contributions, local_time_ns), time.perf_counter_ns(), None))
+
+        await every(self.var_config['contributions_interval_s'], publish)
+
+    async def stats_task(self):
+        await self.stats_service.serve(self.metrics)
+
+    def spawn_intraday_email(self):
+        proc = Process(target=send_intraday_email,  args = (self.book.to_dataframe(),))
+        proc.start()
+
+    def log_metrics(self):
+        logger.debug(f"tick batches: {self.batcher.metrics}, queue depth={self.batcher.queue_depth()}")
+        logger.debug(f"stages: {self.quotes_queue} | {self.publish_queue}")
+        logger.debug(f"latency: {self.stats}")
+
+    def metrics(self) -> dict:
+        return {
+            'timestamp_ns': self.clock_ns(),
+            'latency': self.stats.as_dict(),
+            'tick_batches': self.batcher.metrics.as_dict(),
+            'tick_queue_depth': self.batcher.queue_depth(),
+            'quotes_queue': self.quotes_queue.as_dict(),
+            'publish_queue': self.publish_queue.as_dict(),
+            'subscriptions': self.subscriptions.as_dict() if self.subscriptions is not None else None,
+            'limits': self.limits.as_dict() if self.limits is not None else None,
+            'var': self.var.as_dict() if self.var is not None else None,
+        }
+
+    ################################################################################################
+
+    async def main(self):
+        self.context = zmq.asyncio.Context()
         self.pub_socket = self.context.socket(zmq.PUB)
-        self.pub_socket.setsockopt(zmq.SNDHWM, 1)    # only keep the last message in the buffer
-        self.pub_socket.setsockopt(zmq.CONFLATE, 1)  # only keep the last message to ensure real-time data streaming
+        # deltas are not conflated: every row update is delivered, subscribers that still
+        # fall behind detect the sequence gap and re-sync from the snapshot endpoint
+        self.pub_socket.setsockopt(zmq.SNDHWM, self.pub_hwm)
 
         self.pub_socket.bind(self.ZMQ_PUB)
         
-        task_load_intraday_transactions_data(self.next_cob_date, self.cur_cob_date)
-        self.positions_df = get_rtd_positions(self.next_cob_date, self.cur_cob_date)
+        self.snapshot_service = SnapshotService(self.context, self.ZMQ_SNAPSHOT)
+        if self.ZMQ_STATS is not None:
+            self.stats_service = StatsService(self.context, self.ZMQ_STATS)
+        
+        # one blotter read primes the fill tracker before the book is built: fills landing
+        # after it are applied by the first poll, none is lost or applied twice
+        # (sharded: the snapshot was taken by run_sharded() before its single database load)
+        startup_fills_df = None
+        if self.poll_fills:
+            startup_fills_df = self.startup_fills_df if self.is_sharded() else self.api.intraday_fills_api(self.next_cob_date)
+        
+        self.load_intraday_transactions()
+        self.book = self.load_book()
+        
+        # new fills are polled and persisted in the executor, only applied on the event loop
+        # (sharded: every shard applies its own lines, only shard 0 writes the database)
+        persists = not self.is_sharded() or self.shard_id == 0
+        self.fill_worker = IntradayFillWorker(
+            fills_fn=self.api.intraday_fills_api,
+            persist_fn=(lambda: task_load_intraday_transactions_data(self.next_cob_date, self.cur_cob_date)) if persists else None,
+            lookup_lines_fn=lambda lines: get_rtd_new_lines(self.next_cob_date, self.cur_cob_date, lines),
+            cob_date=self.next_cob_date,
+            known_lines=self.book.line_index.keys(),
+            cid_col=CID,
+            line_filter=self.owns_line if self.is_sharded() else None,
+        )
+        if startup_fills_df is not None:
+            self.fill_worker.prime(startup_fills_df)
         
         
-        self.tickers = self.positions_df.groupby(['ticker'])['close_price'].mean()
+        # cids of the book in the real-time subscription
+        self.tickers = set(self.book.cid_index.keys())
         
         
         if len(self.tickers) == 0:
@@ -392,201 +1083,150 @@ class RtdCalcServer:
         
     
         
-        portfolio_ids = self.positions_df['portfolio_id'].unique()
-        for portfolio_id in portfolio_ids:
-            file_path = Settings().get_intraday_pnl_files_dir() / f'intraday_pnl_{self.cur_cob_date}_{portfolio_id}.bin'
-            self.intraday_files[portfolio_id] = open(file_path, 'ab')
+        if not self.is_sharded():
+            for portfolio_id in self.book.portfolio_ids():
+                self.open_intraday_file(portfolio_id)
         
+        if self.fx_streaming:
+            # EOD rates of the market COB date, then the FX ticks
+            fx_rates_df = get_rtd_fx_rates(self.cur_cob_date)
+            fx_cids = {ccy: self.api.fx_rate_identifier(ccy) for ccy in fx_rates_df['ccy'].tolist()}
+            self.fx_rates = FxRateVector(self.book, fx_rates_df, fx_cids)
+            logger.info(f"FX rates: {len(self.fx_rates.ccys)} currencies, streaming {sorted(self.fx_rates.fx_cids.values())}")
         
-        self.ntp_stats = self.ntp_client.request(self.NTP_SERVER, version=4)
-        local_time_ns_prev, local_time_prev = get_ntp_time(self.local_tz, self.ntp_stats)
+        if self.option_config['enabled']:
+            # vols implied from the closes of the market COB date
+            self.option_pricer = OptionPricer(self.book, self.cur_cob_date,
+                                              rate=self.option_config['rate'],
+                                              dividend_yield=self.option_config['dividend_yield'],
+                                              mark_to_model=self.option_config['mark_to_model'],
+                                              expiry_time=self.option_config['expiry_time'])
+            logger.info(f"Option pricer: {self.option_pricer.size} options on {len(self.option_pricer.underlying_index)} underlyings, "
+                        f"{self.option_pricer.num_uncalibrated} without an implied vol")
         
-        intraday_chart_timer_ns_prev = local_time_ns_prev
-        intraday_email_timer_ns_prev = local_time_ns_prev
-        intraday_fills_timer_ns_prev = local_time_ns_prev
+        if not self.is_sharded():
+            # sharded: the aggregator keeps the totals of the merged book
+            self.aggregates = RunningAggregates(self.book)
+        
+        if self.limits_config['enabled'] and not self.is_sharded():
+            # sharded: the aggregator checks the limits on the merged book
+            limits_df = get_rtd_risk_limits()
+            if limits_df.shape[0] > 0:
+                self.limits = LimitEngine(self.book, self.aggregates, limits_df, self.limits_config['clear_hysteresis'])
+                self.limit_writer = LimitEventWriter(persist_risk_limit_events, self.next_cob_date, self.local_tz,
+                                                     self.limits_config['flush_interval_s'])
+                # limits already breached at the close
+                self.limit_writer.put(self.limits.evaluate(np.arange(self.book.size), self.clock_ns()))
+        
+        if self.var_config['enabled'] and not self.is_sharded():
+            # sharded: a portfolio can span shards, the aggregator computes the VaR on the merged book
+            covariance = await asyncio.to_thread(get_rtd_covariance_cache, self.cur_cob_date, self.var_config)
+            self.var = await asyncio.to_thread(IntradayVar, self.book, covariance.get,
+                                               confidence=self.var_config['confidence'],
+                                               horizon_days=self.var_config['horizon_days'],
+                                               recompute_every=self.var_config['recompute_every'])
+            logger.info(f"Intraday VaR: {self.var.size} portfolios on {len(self.var.factors)} factors")
+        
+        if self.shared_book_config['enabled'] and not self.is_sharded():
+            self.shared_book = SharedBookPublisher(self.shared_book_config['name'],
+                                                   self.shared_book_config['notify_endpoint'],
+                                                   self.book,
+                                                   headroom=self.shared_book_config['headroom'])
         
-        # num_quotes = 0
-        start_time_ns = local_time_ns_prev
         
-        is_start_iteration = True
-
         rich.print("[cyan]Real-time data calculation server starting")
         icnt = 0
         while icnt < 1:
             print(".")
-            time.sleep(1)
+            await asyncio.sleep(1)
             icnt += 1
         print("\n")
 
         ####################################  third-party API here ################################### 
-        req = self.positions_df        
-        rt_api = API.real_time_api(req)
+        req = self.book.to_dataframe()
+        if self.fx_rates is not None:
+            req = self.fx_rates.subscription_request(req)
+        if self.option_pricer is not None:
+            # the underlyings of the options tick even when they are not held
+            req = self.option_pricer.subscription_request(req)
+        rt_api = self.api.real_time_api(req)
+        # long-lived sessions take the lines opened intraday without resubscribing the book
+        self.subscriptions = rt_api if isinstance(rt_api, SubscriptionManager) else None
         ##############################################################################################
         
         #logger.info(f"subscribing to real-time data stream: {req}")
-        
-
-        while(True):
-            local_time_ns, local_time = get_ntp_time(self.local_tz, self.ntp_stats)
-            self.positions_df['timestamp'] = local_time
-            
-            
-            ################################################################################################
-
-            # try:
-            cid, last_price, bid_price, ask_price = next(rt_api)
-            ticker_mask = self.positions_df[CID] == cid
-
-            # except StopIteration:
-            #     logger.debug("real-time data stream ended")
-            #     #exit(1)
-            #     time.sleep(1)
-            #     continue
-
-            if cid is None:
-                logger.debug("real-time data stream ended")
-                continue
-
-            ################################################################################################
-            
-            
-
-            if not ticker_mask.any():
-                continue
-            
-
-            if last_price is None:
-                continue
 
-            self.positions_df.loc[ticker_mask, 'price'] = last_price
-            self.positions_df.loc[ticker_mask, 'bid'] = bid_price
-            self.positions_df.loc[ticker_mask, 'ask'] = ask_price
-                
-            local_time_ns, local_time = get_ntp_time(self.local_tz, self.ntp_stats)
-            
-            
-            quote_timestamp_ns = local_time_ns
-            quote_timestamp = local_time
-                
-                
-            delay_ns = local_time_ns - quote_timestamp_ns
-                    
-            self.positions_df.loc[ticker_mask, 'quote_timestamp'] = quote_timestamp
-            self.positions_df.loc[ticker_mask, 'delay'] = delay_ns * 1e-9
-    
-            price = self.positions_df.loc[ticker_mask, 'price'].values
-            close_price = self.positions_df.loc[ticker_mask, 'close_price'].values
-            quantity = self.positions_df.loc[ticker_mask, 'quantity'].values
-            multiplier = self.positions_df.loc[ticker_mask, 'multiplier'].values
-            aum = self.positions_df.loc[ticker_mask, 'latest_cash_balance'].values
-            avg_cost = self.positions_df.loc[ticker_mask, 'avg_cost'].values
-            fx_rate = self.positions_df.loc[ticker_mask, 'fx_rate'].values
-            
-            mkt_value = price * quantity * multiplier * fx_rate
-            chg = price - close_price
-            pct_chg = price / close_price - 1
-            pnl = (chg * quantity) * multiplier * fx_rate
-                
-            self.positions_df.loc[ticker_mask, 'mkt_value'] = mkt_value
-            self.positions_df.loc[ticker_mask, 'chg'] = chg
-            self.positions_df.loc[ticker_mask, 'pct_chg'] = pct_chg
-            self.positions_df.loc[ticker_mask, 'pnl'] = pnl
-
-            self.positions_df.loc[ticker_mask, 'pct_aum'] = mkt_value / aum
-            self.positions_df.loc[ticker_mask, 'gain_loss'] = mkt_value - (avg_cost * quantity)
-            
-            #rich.print(self.positions_df[['ticker','quantity','price','mkt_value','chg','pct_chg','pnl']])
-
-            buffer = []
-            sentinel_flag = struct.pack('i', 0)  # Set the sentinel flag to 1
-            buffer.append(sentinel_flag)
-
-            for index, row in self.positions_df[ticker_mask].iterrows():
-                row_num = row['row_num']
-                quantity = row['quantity']
-                price = row['price']
-                bid = row['bid']
-                ask = row['ask']
-                mkt_value = row['mkt_value']
-                pct_aum = row['pct_aum']
-                gain_loss = row['gain_loss']
-                pct_chg = row['pct_chg']
-                pnl = row['pnl']
-                
-                wire_format_str = 'qiddddddddd'
-                data_bytes = struct.pack(wire_format_str, local_time_ns, row_num, quantity, price, bid, ask, mkt_value, pct_aum, gain_loss, pct_chg, pnl)
-                buffer.append(data_bytes)
-                
-            binary_wire_format_data = b''.join(buffer)
-            #self.pub_socket.send(binary_wire_format_data)
-            self.pub_socket.send(binary_wire_format_data)
-            
-            logger.debug(f"\n{self.positions_df.loc[ticker_mask, ['ticker','quantity','price', 'bid', 'ask', 'mkt_value', 'pct_aum', 'gain_loss', 'chg','pct_chg','pnl']]}")
-            
-            # num_quotes += 1
-            # self.ticks_per_second = round(num_quotes / (local_time_ns - start_time_ns) * 1e9)
-            
-                
-            # save intraday pnl file every second
-            delta_time_ns = local_time_ns - intraday_chart_timer_ns_prev
-            if delta_time_ns > 1e9:
-                for portfolio_id in portfolio_ids:
-                    total_pnl = self.positions_df.loc[self.positions_df['portfolio_id'] == portfolio_id, 'pnl'].sum()
-                        
-                    data_bytes = struct.pack('iqd', portfolio_id, local_time_ns, total_pnl)
-                    self.intraday_files[portfolio_id].write(data_bytes)
-                    self.intraday_files[portfolio_id].flush()
-                        
-                    intraday_chart_timer_ns_prev = local_time_ns
-
-            # check for intraday fills every X seconds
-            delta_time_ns = local_time_ns - intraday_fills_timer_ns_prev
-            if is_start_iteration or delta_time_ns * 1e-9 > 30:
-                # check for intraday fills
-                #self.check_intraday_fills()
-                #self.cur_cob_date = db_utils.get_current_cob_date()
-                
-                task_load_intraday_transactions_data(self.next_cob_date, self.cur_cob_date)
-
-
-                self.positions_df = get_rtd_positions(self.next_cob_date, self.cur_cob_date)
-
-                logger.info("Loaded intraday transactions data")
-                
-                intraday_fills_timer_ns_prev = local_time_ns
-                is_start_iteration = False
-                
-                # send a sentinel flag to indicate the end of the intraday fills
-                sentinel_flag = struct.pack('i', 1)  # Set the sentinel flag to 1
-                self.pub_socket.send(sentinel_flag)
-
-            # send email every 30 minutes
-            delta_time_ns = local_time_ns - intraday_email_timer_ns_prev
-            if is_start_iteration or delta_time_ns * 1e-9 > 1800:
-                proc = Process(target=send_intraday_email,  args = (self.positions_df.copy(),))
-                proc.start()
-                    
-                
-                intraday_email_timer_ns_prev = local_time_ns
-                is_start_iteration = False
-                
-            
+        if self.tick_capture_config['enabled'] and not self.replay:
+            self.tick_recorder = TickRecorder(Settings().get_tick_capture_dir(), self.next_cob_date,
+                                              tag='rtd' if not self.is_sharded() else f'shard{self.shard_id}',
+                                              flush_rows=self.tick_capture_config['flush_rows'],
+                                              flush_interval_s=self.tick_capture_config['flush_interval_s'],
+                                              clock_ns=self.clock_ns)
+            rt_api = self.tick_recorder.capture(rt_api)
+        
+        if self.batch_config['enabled']:
+            self.batcher = TickBatcher(rt_api, self.batch_config['window_ms'], self.batch_config['max_ticks'], 
+                                       source_time=self.replay, clock_ns=self.clock_ns)
+        else:
+            # one tick per iteration
+            self.batcher = TickBatcher(rt_api, window_ms=0, max_ticks=1, source_time=self.replay, clock_ns=self.clock_ns)
+        
+        self.quotes_queue = MeteredQueue('quotes', self.runtime_config['quotes_queue_size'])
+        self.publish_queue = MeteredQueue('publish', self.runtime_config['publish_queue_size'])
+
+        # the pipeline ends when the feed does, the periodic tasks are cancelled then
+        pipeline = [
+            asyncio.create_task(self.ingest_task(), name='ingest'),
+            asyncio.create_task(self.revalue_task(), name='revalue'),
+            asyncio.create_task(self.publish_task(), name='publish'),
+        ]
+        periodic = [
+            asyncio.create_task(self.snapshot_task(), name='snapshot'),
+            asyncio.create_task(every(self.runtime_config['metrics_interval_s'], self.log_metrics), name='metrics'),
+        ]
+        if self.poll_fills:
+            periodic.append(asyncio.create_task(self.fills_task(), name='fills'))
+        if self.stats_service is not None:
+            periodic.append(asyncio.create_task(self.stats_task(), name='stats'))
+        if self.var is not None:
+            periodic.append(asyncio.create_task(self.var_task(), name='var'))
+        if not self.is_sharded():
+            periodic += [
+                asyncio.create_task(every(self.runtime_config['pnl_interval_s'], self.persist_intraday_pnl), name='pnl'),
+                asyncio.create_task(every(self.runtime_config['email_interval_s'], self.spawn_intraday_email), name='email'),
+            ]
 
-            #self.recent_updates.append([local_time, cid])
-            # live.console.print(f"recent updates: {self.recent_updates}")
-            
-            #live.update(self.refresh_display())
+        try:
+            await asyncio.gather(*pipeline)
+        finally:
+            for task in periodic:
+                task.cancel()
+            await asyncio.gather(*periodic, return_exceptions=True)
     
     def run(self):
         try:
-            self.main()
+            asyncio.run(self.main())
             
         except KeyboardInterrupt:
             logger.info("Real-time data calculation server exiting")
             
         finally:
+            if self.subscriptions is not None:
+                self.subscriptions.close()
+            if self.shared_book is not None:
+                self.shared_book.close()
+            if self.limit_writer is not None:
+                self.limit_writer.close()
+            if self.tick_recorder is not None:
+                self.tick_recorder.close()
             for file in self.intraday_files.values():
                 file.close()
             self.intraday_files.clear()
-            self.pub_socket.close()
-            self.context.term()
\ No newline at end of file
+            if self.snapshot_service is not None:
+                self.snapshot_service.close()
+            if self.stats_service is not None:
+                self.stats_service.close()
+            if self.pub_socket is not None:
+                self.pub_socket.close()
+            if self.context is not None:
+                self.context.term()
@@ -0,0 +1,99 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# asyncio building blocks for the RTD calculation server.
+#
+#   ingest ──[quotes]──> revalue ──[messages]──> publish
+#                           ▲
+#   fills ──────────────────┘ (same event loop: the book is only mutated on the loop thread)
+#   pnl / email / metrics: independent periodic tasks
+#
+# Every hand-off is a bounded MeteredQueue, so a slow stage blocks its producer
+# instead of growing memory, and the blocking shows up in the stage metrics.
+#
+
+import asyncio
+import time
+
+from loguru import logger
+
+
+class MeteredQueue:
+    """
+    Bounded asyncio queue that records backpressure.
+
+    Args:
+        name: stage name used in the metrics.
+        maxsize: queue capacity (puts wait when full).
+    """
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+        self.num_put = 0
+        self.num_get = 0
+        self.num_blocked = 0        # puts that found the queue full
+        self.blocked_ns = 0         # total time producers waited on a full queue
+        self.max_depth = 0
+
+    async def put(self, item) -> None:
+        if self.queue.full():
+            self.num_blocked += 1
+            start_ns = time.perf_counter_ns()
+            await self.queue.put(item)
+            self.blocked_ns += time.perf_counter_ns() - start_ns
+        else:
+            self.queue.put_nowait(item)
+
+        self.num_put += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def get(self):
+        item = await self.queue.get()
+        self.num_get += 1
+        return item
+
+    def get_nowait(self):
+        item = self.queue.get_nowait()
+        self.num_get += 1
+        return item
+
+    def empty(self) -> bool:
+        return self.queue.empty()
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'maxsize': self.queue.maxsize,
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'num_put': self.num_put,
+            'num_get': self.num_get,
+            'num_blocked': self.num_blocked,
+            'blocked_ms': self.blocked_ns * 1e-6,
+        }
+
+    def __str__(self) -> str:
+        return (f"{self.name}: depth={self.depth()}/{self.queue.maxsize} max_depth={self.max_depth} "
+                f"put={self.num_put} get={self.num_get} blocked={self.num_blocked} ({self.blocked_ns * 1e-6:.1f} ms)")
+
+
+async def every(interval_s: float, fn, *args) -> None:
+    """
+    Calls `fn(*args)` (awaiting it when it is a coroutine function) at once, then every
+    `interval_s` seconds, measured from the start of each call so a slow call does not drift
+    the rate. A call that raises is logged and the next one runs on schedule.
+    """
+    loop = asyncio.get_running_loop()
+    next_time = loop.time()
+    while True:
+        await asyncio.sleep(max(next_time - loop.time(), 0))
+        next_time += interval_s
+        try:
+            result = fn(*args)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.exception(f"periodic call {getattr(fn, '__name__', fn)} failed: {e}")
@@ -0,0 +1,269 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Shared-memory position table for same-host consumers (zero-copy reads).
+#
+#   +-------------------------------------------+---------------------------------------------------+
+#   | header (SHM_HEADER_DTYPE, 64 bytes)       | table: capacity x POSITION_SNAPSHOT_DTYPE         |
+#   | magic | version | state | row_size | seq  |   row i = book row position i                     |
+#   | num_rows | capacity | timestamp_ns | ...  |   (only the first num_rows are valid)             |
+#   +-------------------------------------------+---------------------------------------------------+
+#
+#   RTD server: seq += 1 (odd) ──> write the updated rows ──> seq += 1 (even) ──> PUB MSG_TABLE_ROWS
+#   reader:     seq (even) ──> compute on the table view ──> seq unchanged ? done : retry
+#
+# The seqlock makes a read consistent without copying: the reader's function runs on the live
+# view and its result is only kept when no write overlapped it. ZMQ only carries the changed
+# row positions (ipc:// by default). When the book outgrows the segment, the server marks it
+# MOVED and recreates it larger under the same name; readers re-attach on their next read.
+#
+
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import zmq
+
+from loguru import logger
+
+from dxdy.rtd import wire_format
+
+
+SHM_MAGIC = b"DXDY-SHM"
+SHM_FORMAT_VERSION = 1
+SHM_HEADER_SIZE = 64
+
+# header state
+STATE_LIVE = 1
+STATE_MOVED = 2         # recreated (larger) under the same name, re-attach
+STATE_CLOSED = 3        # the server stopped
+
+SHM_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u2'),
+    ('state', '<u2'),
+    ('row_size', '<u4'),
+    ('seq', '<u8'),
+    ('num_rows', '<u8'),
+    ('capacity', '<u8'),
+    ('timestamp_ns', '<i8'),
+    ('reserved', 'S16'),
+])
+
+TABLE_DTYPE = wire_format.POSITION_SNAPSHOT_DTYPE
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # before 3.13 attaching registers the segment with the resource tracker, which would
+    # unlink it (under the server) when this process exits
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _views(shm: shared_memory.SharedMemory, capacity: int) -> tuple:
+    header = np.ndarray(1, dtype=SHM_HEADER_DTYPE, buffer=shm.buf)
+    table = np.ndarray(capacity, dtype=TABLE_DTYPE, buffer=shm.buf, offset=SHM_HEADER_SIZE)
+    return header, table
+
+
+class SharedPositionTable:
+    """
+    Writer side: the RTD position book mirrored into a named shared-memory segment.
+
+    Args:
+        name: segment name (readers attach by name).
+        book: the position book.
+        headroom: spare rows for the lines opened intraday before the segment is recreated.
+    """
+    def __init__(self, name: str, book, headroom: int = 1024):
+        self.name = name
+        self.headroom = headroom
+        self.shm = None
+        self._create(book.size + headroom, start_seq=0)
+        self.write_all(book, 0)
+
+    @property
+    def seq(self) -> int:
+        return int(self.header['seq'][0])
+
+    def _create(self, capacity: int, start_seq: int) -> None:
+        try:
+            # left behind by a server that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            logger.warning(f"Removed a stale shared-memory position table {self.name}")
+        except FileNotFoundError:
+            pass
+
+        self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=SHM_HEADER_SIZE + capacity * TABLE_DTYPE.itemsize)
+        self.capacity = capacity
+        self.header, self.table = _views(self.shm, capacity)
+
+        self.header[0] = (SHM_MAGIC, SHM_FORMAT_VERSION, STATE_LIVE, TABLE_DTYPE.itemsize, start_seq, 0, capacity, 0, b'')
+        logger.info(f"Shared-memory position table {self.name}: {capacity} rows, {self.shm.size / 2**20:.1f} MB")
+
+    def _release(self, state: int) -> int:
+        # readers still mapping the old segment see the state on their next read
+        self.header['state'] = state
+        self.header['seq'] += 2
+        seq = self.seq
+        self.header = self.table = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        return seq
+
+    def write(self, book, rows, timestamp_ns: int) -> np.ndarray:
+        """
+        Copies the given rows of the book into the table under the seqlock.
+
+        Returns the table rows written (every row when the segment had to grow).
+        """
+        if book.size > self.capacity:
+            seq = self._release(STATE_MOVED)
+            self._create(book.size + self.headroom, start_seq=seq)
+            return self.write_all(book, timestamp_ns)
+
+        header = self.header
+        header['seq'] += 1
+        for name in TABLE_DTYPE.names:
+            self.table[name][rows] = getattr(book, name)[rows]
+        header['num_rows'] = book.size
+        header['timestamp_ns'] = timestamp_ns
+        header['seq'] += 1
+        return rows
+
+    def write_all(self, book, timestamp_ns: int) -> np.ndarray:
+        return self.write(book, np.arange(book.size), timestamp_ns)
+
+    def close(self) -> None:
+        if self.shm is not None:
+            self._release(STATE_CLOSED)
+
+
+class SharedBookPublisher:
+    """
+    Shared-memory table plus the ZMQ notifications (MSG_TABLE_ROWS) of the rows that changed.
+
+    Notifications are sent without blocking: a reader that misses some (sequence gap) just
+    re-reads the whole table.
+    """
+    def __init__(self, name: str, notify_endpoint: str, book, headroom: int = 1024, hwm: int = 10000):
+        self.table = SharedPositionTable(name, book, headroom)
+        self.encoder = wire_format.WireEncoder()
+
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, hwm)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(notify_endpoint)
+        self.num_dropped = 0
+
+    def publish(self, book, rows, timestamp_ns: int) -> None:
+        rows = self.table.write(book, rows, timestamp_ns)
+        try:
+            self.socket.send(self.encoder.encode_table_rows(rows, timestamp_ns), zmq.NOBLOCK)
+        except zmq.Again:
+            self.num_dropped += 1
+
+    def publish_all(self, book, timestamp_ns: int) -> None:
+        self.publish(book, np.arange(book.size), timestamp_ns)
+
+    def close(self) -> None:
+        self.table.close()
+        self.socket.close()
+        self.context.term()
+
+
+class SharedPositionReader:
+    """
+    Reader side: attaches to the server's table by name.
+
+    `read(fn)` runs `fn` on a read-only view of the valid rows and returns (seq, result) once
+    no write overlapped the call; the default `fn` copies the rows. `view()` is the live view
+    without any consistency check.
+
+    Args:
+        name: segment name of the server's table.
+        timeout_s: how long to wait for the segment to (re)appear.
+    """
+    def __init__(self, name: str, timeout_s: float = 10.0):
+        self.name = name
+        self.timeout_s = timeout_s
+        self.shm = None
+        self.num_retries = 0
+        self._attach()
+
+    def _attach(self) -> None:
+        deadline = time.monotonic() + self.timeout_s
+        while True:
+            try:
+                shm = _attach(self.name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+
+        header = np.ndarray(1, dtype=SHM_HEADER_DTYPE, buffer=shm.buf)
+        if header['magic'][0] != SHM_MAGIC:
+            shm.close()
+            raise ValueError(f"{self.name} is not an RTD position table")
+        if header['version'][0] != SHM_FORMAT_VERSION:
+            shm.close()
+            raise ValueError(f"Unsupported RTD position table version {int(header['version'][0])}")
+        if header['row_size'][0] != TABLE_DTYPE.itemsize:
+            shm.close()
+            raise ValueError(f"RTD position table row size mismatch: {int(header['row_size'][0])} != {TABLE_DTYPE.itemsize}")
+
+        self.close()
+        self.shm = shm
+        self.header, self.table = _views(shm, int(header['capacity'][0]))
+        self.table.flags.writeable = False
+
+    @property
+    def seq(self) -> int:
+        return int(self.header['seq'][0])
+
+    @property
+    def num_rows(self) -> int:
+        return int(self.header['num_rows'][0])
+
+    def view(self) -> np.ndarray:
+        return self.table[:self.num_rows]
+
+    def read(self, fn=np.copy):
+        while True:
+            state = self.header['state'][0]
+            if state == STATE_MOVED:
+                self._attach()
+                continue
+            if state == STATE_CLOSED:
+                raise EOFError(f"RTD position table {self.name} was closed")
+
+            seq = self.seq
+            if seq & 1:
+                # a write is in progress
+                self.num_retries += 1
+                time.sleep(0)
+                continue
+
+            result = fn(self.table[:self.num_rows])
+            if self.seq == seq:
+                return seq, result
+            self.num_retries += 1
+
+    def close(self) -> None:
+        if self.shm is not None:
+            self.header = self.table = None
+            try:
+                self.shm.close()
+            except BufferError:
+                # views returned by read(fn) still map it, unmapped once they are released
+                pass
+            self.shm = None
@@ -0,0 +1,142 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Snapshot-plus-delta service for RTD subscribers.
+#
+#   subscriber                                   RtdCalcServer
+#   ----------                                   -------------
+#   SUB connect  ─────────────────────────────── PUB  (deltas, seq = 1, 2, 3, ...)
+#   REQ "SNAPSHOT" ──────────────────────────>   REP  (SnapshotService)
+#              <── [header + numeric rows, static columns (Arrow IPC)] as of seq S
+#   apply buffered / new deltas with seq > S only
+#
+# The numeric part uses the wire_format codec (MSG_SNAPSHOT / SCHEMA_POSITION_SNAPSHOT_V2),
+# the descriptive columns (ticker, name, portfolio_name, ...) travel as an Arrow IPC stream.
+#
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import zmq
+
+from loguru import logger
+
+from dxdy.rtd import wire_format
+
+
+SNAPSHOT_REQUEST = b"SNAPSHOT"
+
+# per-tick columns that are rebuilt from the numeric part of the snapshot
+_VOLATILE_COLUMNS = ['timestamp', 'quote_timestamp']
+
+
+def _encode_static_columns(static_df: pd.DataFrame) -> bytes:
+    numeric_cols = set(wire_format.POSITION_SNAPSHOT_DTYPE.names)
+    cols = [col for col in static_df.columns if col not in numeric_cols and col not in _VOLATILE_COLUMNS]
+
+    table = pa.Table.from_pandas(static_df[cols], preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_snapshot(frames, local_tz=None):
+    """
+    Decodes a snapshot reply into (header, positions_df).
+
+    positions_df has the same columns as `get_rtd_positions` and is ordered like the
+    server's position book.
+    """
+    header, body = wire_format.decode(frames[0])
+    if header['msg_type'] != wire_format.MSG_SNAPSHOT:
+        raise ValueError(f"Expected an RTD snapshot, got message type {int(header['msg_type'])}")
+
+    static_buffer = frames[1].buffer if hasattr(frames[1], 'buffer') else frames[1]
+    positions_df = pa.ipc.open_stream(static_buffer).read_all().to_pandas()
+
+    for name in body.dtype.names:
+        positions_df[name] = body[name]
+
+    # keep the integer columns integers, as in get_rtd_positions
+    for name in ['quantity', 'multiplier']:
+        positions_df[name] = positions_df[name].astype(np.int64)
+
+    quote_timestamp = pd.to_datetime(positions_df['quote_timestamp_ns'], unit='ns', utc=True)
+    if local_tz is not None:
+        quote_timestamp = quote_timestamp.dt.tz_convert(local_tz)
+    positions_df['quote_timestamp'] = quote_timestamp
+    positions_df['timestamp'] = int(header['timestamp_ns'])
+
+    return header, positions_df
+
+
+class SnapshotService:
+    """
+    REP endpoint answering snapshot requests from the RTD server's main loop.
+
+    Requests are served between publishes (`serve` as an asyncio task), so the book and
+    the sequence number in the reply are always consistent with the deltas already encoded.
+    """
+    def __init__(self, context: zmq.Context, endpoint: str):
+        self.endpoint = endpoint
+        self.socket = context.socket(zmq.REP)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(endpoint)
+
+        self.num_requests = 0
+        self._static_book = None
+        self._static_size = 0
+        self._static_frame = None
+
+    async def serve(self, book_fn, encoder: wire_format.WireEncoder, clock_fn) -> None:
+        """
+        Answers requests forever (requires a zmq.asyncio context).
+
+        The book is read on the event loop between the revaluation task's updates, so the
+        reply is consistent with the last encoded sequence number.
+        """
+        while True:
+            request = await self.socket.recv()
+            if request != SNAPSHOT_REQUEST:
+                logger.warning(f"Unknown snapshot request: {request[:32]}")
+
+            await self.socket.send_multipart(self.encode(book_fn(), encoder, clock_fn()), copy=False)
+            self.num_requests += 1
+
+    def encode(self, book, encoder: wire_format.WireEncoder, timestamp_ns: int) -> list:
+        # the descriptive columns only change when the book is rebuilt or a line is inserted
+        if self._static_book is not book or self._static_size != book.size:
+            self._static_frame = _encode_static_columns(book.static_df)
+            self._static_book = book
+            self._static_size = book.size
+
+        rows = np.arange(book.size)
+        return [encoder.encode_snapshot(book, rows, timestamp_ns), self._static_frame]
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def request_snapshot(context: zmq.Context, endpoint: str, timeout_ms: int = 5000, local_tz=None):
+    """
+    Requests the current position book from the RTD server.
+
+    Returns (header, positions_df), or None when the server does not answer in time.
+    """
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    socket.setsockopt(zmq.SNDTIMEO, timeout_ms)
+    socket.connect(endpoint)
+
+    try:
+        socket.send(SNAPSHOT_REQUEST)
+        frames = socket.recv_multipart(copy=False)
+    except zmq.Again:
+        logger.warning(f"RTD snapshot request to {endpoint} timed out")
+        return None
+    finally:
+        socket.close()
+
+    return decode_snapshot(frames, local_tz)
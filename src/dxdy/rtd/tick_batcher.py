@@ -0,0 +1,194 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Micro-batched tick ingestion for the RTD calculation server.
+#
+#   rt_api generator ──(reader thread)──> queue ──> next_batch() ──> { cid: latest quote }
+#
+# The third-party real-time APIs are blocking generators, so a daemon thread drains them
+# into a queue, stamping each tick with its receive time. The server then pulls everything that arrives within a short window
+# (or up to N ticks) and keeps only the latest quote per cid.
+#
+
+import queue
+import threading
+import time
+
+from loguru import logger
+
+from dxdy.rtd.clock import get_clock
+
+
+class BatchMetrics:
+    """
+    Counters describing the micro-batches handed to the server.
+    """
+    def __init__(self, window_ns: int, max_ticks: int):
+        self.window_ns = window_ns
+        self.max_ticks = max_ticks
+
+        self.num_batches = 0
+        self.num_ticks = 0
+        self.num_coalesced = 0          # ticks superseded by a later quote for the same cid (or empty)
+        self.last_batch_size = 0        # raw ticks drained in the last batch
+        self.last_batch_cids = 0        # distinct cids in the last batch
+        self.last_window_ns = 0         # time spent draining the last batch
+        self.max_batch_size = 0
+
+    def record(self, batch_size: int, batch_cids: int, window_ns: int) -> None:
+        self.num_batches += 1
+        self.num_ticks += batch_size
+        self.num_coalesced += batch_size - batch_cids
+        self.last_batch_size = batch_size
+        self.last_batch_cids = batch_cids
+        self.last_window_ns = window_ns
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+
+    def avg_batch_size(self) -> float:
+        if self.num_batches == 0:
+            return 0.0
+        return self.num_ticks / self.num_batches
+
+    def as_dict(self) -> dict:
+        return {
+            'window_ms': self.window_ns * 1e-6,
+            'max_ticks': self.max_ticks,
+            'num_batches': self.num_batches,
+            'num_ticks': self.num_ticks,
+            'num_coalesced': self.num_coalesced,
+            'avg_batch_size': self.avg_batch_size(),
+            'max_batch_size': self.max_batch_size,
+            'last_batch_size': self.last_batch_size,
+            'last_batch_cids': self.last_batch_cids,
+            'last_window_ms': self.last_window_ns * 1e-6,
+        }
+
+    def __str__(self) -> str:
+        return (f"batches={self.num_batches} ticks={self.num_ticks} coalesced={self.num_coalesced} "
+                f"avg_batch={self.avg_batch_size():.1f} max_batch={self.max_batch_size} "
+                f"last_batch={self.last_batch_size} ({self.last_batch_cids} cids, {self.last_window_ns * 1e-6:.3f} ms) "
+                f"window={self.window_ns * 1e-6:.3f} ms max_ticks={self.max_ticks}")
+
+
+class TickBatcher:
+    """
+    Drains a blocking real-time API generator on a background thread and hands the
+    server coalesced micro-batches.
+
+    Args:
+        rt_api: generator yielding (cid, last, bid, ask) tuples, or
+            (cid, last, bid, ask, timestamp_ns) when the source stamps its ticks (replay).
+        window_ms: how long to keep draining after the first tick of a batch arrives.
+        max_ticks: upper bound on raw ticks drained per batch.
+        source_time: measure the window on the ticks' own timestamps instead of the wall
+            clock, so the batches only depend on the input (deterministic replay, as long as
+            the input does not pause for flush_timeout_s inside a window).
+        clock_ns: receive-time clock of the reader thread (wall clock ns, default: the
+            process-wide NTP-corrected clock).
+        flush_timeout_s: source-time batches are flushed when no tick arrives for this long
+            (paced replay: the last batch of a burst is not held until the next burst).
+    """
+
+    _END_OF_STREAM = object()
+
+    def __init__(self, rt_api, window_ms: float = 5.0, max_ticks: int = 1000, source_time: bool = False,
+                 clock_ns=None, flush_timeout_s: float = 0.05):
+        self.rt_api = rt_api
+        self.window_ns = int(window_ms * 1e6)
+        self.max_ticks = max(int(max_ticks), 1)
+        self.source_time = source_time
+        self.clock_ns = clock_ns if clock_ns is not None else get_clock().now_ns
+        self.flush_timeout_s = flush_timeout_s
+
+        # source (or receive) timestamp of the last tick of the last batch
+        self.last_batch_timestamp_ns = None
+        # first tick of the next batch, read past the end of a source-time window
+        self._pending = None
+
+        self.queue = queue.Queue()
+        self.metrics = BatchMetrics(self.window_ns, self.max_ticks)
+
+        self._reader_thread = threading.Thread(target=self._reader, name="rtd-tick-reader", daemon=True)
+        self._reader_thread.start()
+
+    def _reader(self) -> None:
+        try:
+            for tick in self.rt_api:
+                self.queue.put((tick, self.clock_ns()))
+        except Exception as e:
+            logger.error(f"real-time data stream failed: {e}")
+        finally:
+            self.queue.put(self._END_OF_STREAM)
+
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def next_batch(self, timeout: float = 1.0) -> dict:
+        """
+        Blocks up to `timeout` seconds for the first tick, then drains until the window
+        closes or `max_ticks` ticks were read.
+
+        Returns { cid: (last, bid, ask, timestamp_ns) } holding the latest quote per cid
+        (possibly empty). timestamp_ns is the source timestamp, or the receive time for
+        unstamped sources.
+        Raises StopIteration once the underlying stream has ended.
+        """
+        quotes = {}
+
+        if self._pending is not None:
+            tick, self._pending = self._pending, None
+        else:
+            try:
+                tick = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                return quotes
+
+        start_ns = time.perf_counter_ns()
+        deadline_ns = start_ns + self.window_ns
+        num_ticks = 0
+        self.last_batch_timestamp_ns = None
+
+        while True:
+            if tick is self._END_OF_STREAM:
+                if num_ticks == 0:
+                    raise StopIteration
+                # re-queue so the next call ends the stream after this batch is processed
+                self.queue.put(tick)
+                break
+
+            tick, recv_timestamp_ns = tick
+            timestamp_ns = tick[4] if len(tick) > 4 else recv_timestamp_ns
+            if self.source_time:
+                if num_ticks == 0:
+                    window_start_ns = timestamp_ns
+                elif timestamp_ns - window_start_ns > self.window_ns:
+                    self._pending = (tick, recv_timestamp_ns)
+                    break
+
+            num_ticks += 1
+            cid, last_price, bid_price, ask_price = tick[:4]
+            if cid is not None and last_price is not None:
+                quotes[cid] = (last_price, bid_price, ask_price, timestamp_ns)
+            self.last_batch_timestamp_ns = timestamp_ns
+
+            if num_ticks >= self.max_ticks:
+                break
+
+            if self.source_time:
+                # the batch ends on the input's timestamps, or when the input pauses (paced replay)
+                try:
+                    tick = self.queue.get(timeout=self.flush_timeout_s)
+                except queue.Empty:
+                    break
+                continue
+
+            remaining_ns = deadline_ns - time.perf_counter_ns()
+            if remaining_ns <= 0:
+                break
+
+            try:
+                tick = self.queue.get(timeout=remaining_ns * 1e-9)
+            except queue.Empty:
+                break
+
+        self.metrics.record(num_ticks, len(quotes), time.perf_counter_ns() - start_ns)
+        return quotes
@@ -0,0 +1,198 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Raw tick capture and deterministic replay.
+#
+#   capture:  rt_api ──> TickRecorder.capture() ──> TickBatcher
+#                              │ (writer thread)
+#                              ▼
+#             {directory}/{YYYY-MM-DD}/ticks-{tag}-{part:05d}.parquet   (zstd, rolled every flush)
+#
+#   replay:   replay_ticks(directory, date, speed) ──> (cid, last, bid, ask, recv_timestamp_ns)
+#
+# Every tick is recorded as received (recv_timestamp_ns, seq, cid, last, bid, ask), before
+# batching or coalescing. Replay reads a day's parts in file order, sorts by
+# (recv_timestamp_ns, file, seq) and yields the ticks with their captured timestamp, so the
+# server can batch and stamp them in source time and produce the same output on every run.
+#
+
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from loguru import logger
+
+from dxdy.rtd.clock import get_clock
+
+
+TICK_SCHEMA = pa.schema([
+    ('recv_timestamp_ns', pa.int64()),
+    ('seq', pa.int64()),
+    ('cid', pa.string()),
+    ('last', pa.float64()),
+    ('bid', pa.float64()),
+    ('ask', pa.float64()),
+])
+
+
+def tick_capture_dir(directory, cob_date) -> Path:
+    return Path(directory) / str(cob_date)
+
+
+class TickRecorder:
+    """
+    Records raw ticks to rolling Parquet files from a background writer thread.
+
+    Args:
+        directory: capture root; files go to {directory}/{cob_date}/.
+        tag: distinguishes concurrent recorders of the same day (e.g. RTD shards).
+        flush_rows: ticks per part file.
+        flush_interval_s: a partial part is written after this many seconds.
+        clock_ns: receive-time clock of the ticks recorded without a timestamp
+            (default: the process-wide NTP-corrected clock).
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, directory, cob_date, tag: str = 'rtd', flush_rows: int = 50000, flush_interval_s: float = 5.0,
+                 clock_ns=None):
+        self.directory = tick_capture_dir(directory, cob_date)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.tag = tag
+        self.flush_rows = max(int(flush_rows), 1)
+        self.flush_interval_ns = int(flush_interval_s * 1e9)
+        self.clock_ns = clock_ns if clock_ns is not None else get_clock().now_ns
+
+        # continue numbering after the parts of an earlier run of the same day
+        self.part = len(list(self.directory.glob(f'ticks-{self.tag}-*.parquet')))
+        self.seq = 0
+        self.num_ticks = 0
+        self.num_files = 0
+
+        self._buffer = self._new_buffer()
+        self._buffer_start_ns = time.monotonic_ns()
+        self._lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer, name="rtd-tick-capture", daemon=True)
+        self._writer_thread.start()
+
+    @staticmethod
+    def _new_buffer() -> dict:
+        return {name: [] for name in TICK_SCHEMA.names}
+
+    def record(self, cid, last_price, bid_price, ask_price, recv_timestamp_ns: int = None) -> None:
+        if recv_timestamp_ns is None:
+            recv_timestamp_ns = self.clock_ns()
+
+        with self._lock:
+            buffer = self._buffer
+            buffer['recv_timestamp_ns'].append(recv_timestamp_ns)
+            buffer['seq'].append(self.seq)
+            buffer['cid'].append(None if cid is None else str(cid))
+            buffer['last'].append(last_price)
+            buffer['bid'].append(bid_price)
+            buffer['ask'].append(ask_price)
+            self.seq += 1
+
+            if (len(buffer['seq']) >= self.flush_rows
+                    or time.monotonic_ns() - self._buffer_start_ns >= self.flush_interval_ns):
+                self._rotate()
+
+    def _rotate(self) -> None:
+        # called with the lock held: hand the full buffer to the writer thread
+        if len(self._buffer['seq']) > 0:
+            self._queue.put((self.part, self._buffer))
+            self.part += 1
+        self._buffer = self._new_buffer()
+        self._buffer_start_ns = time.monotonic_ns()
+
+    def _writer(self) -> None:
+        while True:
+            # wake up when the current buffer is due, so a partial part is written after
+            # flush_interval_s even when no further tick arrives
+            timeout_ns = self.flush_interval_ns - (time.monotonic_ns() - self._buffer_start_ns)
+            try:
+                item = self._queue.get(timeout=max(timeout_ns, 1000000) * 1e-9)
+            except queue.Empty:
+                with self._lock:
+                    if time.monotonic_ns() - self._buffer_start_ns >= self.flush_interval_ns:
+                        self._rotate()
+                continue
+
+            if item is self._CLOSE:
+                return
+
+            part, buffer = item
+            path = self.directory / f'ticks-{self.tag}-{part:05d}.parquet'
+            try:
+                table = pa.Table.from_pydict(buffer, schema=TICK_SCHEMA)
+                pq.write_table(table, path, compression='zstd')
+                self.num_ticks += table.num_rows
+                self.num_files += 1
+            except Exception as e:
+                logger.error(f"tick capture: failed to write {path}: {e}")
+
+    def capture(self, rt_api):
+        """
+        Wraps a real-time API generator: ticks are recorded, then passed through unchanged.
+        """
+        for tick in rt_api:
+            self.record(*tick[:4])
+            yield tick
+
+    def close(self) -> None:
+        with self._lock:
+            self._rotate()
+        self._queue.put(self._CLOSE)
+        self._writer_thread.join()
+        logger.info(f"tick capture: {self.num_ticks} ticks in {self.num_files} files under {self.directory}")
+
+
+def load_ticks(directory, cob_date, cids=None) -> pa.Table:
+    """
+    Reads the ticks captured on `cob_date` in replay order, optionally restricted to `cids`.
+    """
+    files = sorted(tick_capture_dir(directory, cob_date).glob('ticks-*.parquet'))
+    if len(files) == 0:
+        raise ValueError(f"No captured ticks for {cob_date} under {directory}")
+
+    tables = []
+    for file_idx, file in enumerate(files):
+        table = pq.read_table(file, schema=TICK_SCHEMA)
+        tables.append(table.append_column('file_idx', pa.array(np.full(table.num_rows, file_idx, dtype=np.int64))))
+    table = pa.concat_tables(tables)
+
+    if cids is not None:
+        table = table.filter(pc.is_in(table['cid'], value_set=pa.array([str(cid) for cid in cids])))
+
+    return table.sort_by([('recv_timestamp_ns', 'ascending'), ('file_idx', 'ascending'), ('seq', 'ascending')])
+
+
+def replay_ticks(directory, cob_date, cids=None, speed: float = 0.0):
+    """
+    Yields the captured ticks as (cid, last, bid, ask, recv_timestamp_ns).
+
+    speed <= 0 replays as fast as possible, otherwise at `speed` x the captured pace.
+    """
+    table = load_ticks(directory, cob_date, cids)
+    logger.info(f"replaying {table.num_rows} ticks of {cob_date} at {'max' if speed <= 0 else f'{speed}x'} speed")
+
+    timestamps = table['recv_timestamp_ns'].to_numpy()
+    columns = [table[name].to_pylist() for name in ['cid', 'last', 'bid', 'ask']]
+
+    start_ns = time.monotonic_ns()
+    first_ns = int(timestamps[0]) if len(timestamps) > 0 else 0
+
+    for i, (cid, last_price, bid_price, ask_price) in enumerate(zip(*columns)):
+        timestamp_ns = int(timestamps[i])
+        if speed > 0:
+            wait_ns = (timestamp_ns - first_ns) / speed - (time.monotonic_ns() - start_ns)
+            if wait_ns > 0:
+                time.sleep(wait_ns * 1e-9)
+        yield cid, last_price, bid_price, ask_price, timestamp_ns
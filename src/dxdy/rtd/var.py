@@ -0,0 +1,325 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Intraday delta-normal VaR of the RTD position book.
+#
+#   market_daily_returns (DB) ──> Σ (factors x factors, daily) ──> covariance_<cob_date>_<N>d.npz
+#                                   computed once per market COB date, re-read on restart
+#
+#   row exposure:  stock  mkt_value                                           factor = cid
+#                  option delta * underlying_price * quantity * multiplier * fx  factor = underlying_cid
+#
+#   X (portfolios x factors)   Y = X Σ   q = diag(X Σ Xᵀ)
+#
+#   updated rows ──> dx (changed portfolios x changed factors)
+#                    q += 2 dx·Y[:, K] + dx Σ_KK dxᵀ        (rank-one per ticked factor)
+#                    Y += dx Σ[K, :]
+#                    X[:, K] += dx
+#
+#   VaR = z √q √h     marginal_i = z √h Y_i / √q     component_i = X_i marginal_i  (Σ component = VaR)
+#
+# A batch costs O(portfolios x ticked factors x factors) instead of a full X Σ Xᵀ. The quadratic
+# form is recomputed from the row exposures every `recompute_every` updates so rounding does not
+# accumulate. Exposures are in the portfolio currency; FX risk is not modelled.
+#
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+from loguru import logger
+
+from dxdy.rtd import wire_format
+
+
+def covariance_from_returns(returns_df: pd.DataFrame, cids: list, min_observations: int = 20) -> tuple:
+    """
+    Daily covariance of the cids' returns (pairwise over the dates both have a return).
+
+    The matrix is projected onto the nearest positive semi-definite one, so the VaR of any
+    position vector is defined. Cids with fewer than `min_observations` returns get a zero
+    row / column (no risk until they have a history).
+
+    Args:
+        returns_df: cid, trade_date, daily_return rows.
+        cids: factor order of the matrix.
+        min_observations: returns a cid needs to enter the matrix.
+
+    Returns:
+        (matrix, num_observations per cid)
+    """
+    if returns_df.shape[0] == 0:
+        return np.zeros((len(cids), len(cids))), np.zeros(len(cids), dtype=np.int64)
+
+    returns = returns_df.pivot_table(index='trade_date', columns='cid', values='daily_return', aggfunc='last')
+    returns = returns.reindex(columns=cids)
+    num_observations = returns.notna().sum().to_numpy(dtype=np.int64)
+
+    matrix = returns.cov(min_periods=min_observations).to_numpy(dtype=np.float64)
+    missing = num_observations < min_observations
+    matrix[missing, :] = 0.0
+    matrix[:, missing] = 0.0
+    matrix = np.nan_to_num(matrix)
+
+    # pairwise estimates need not be PSD: clip the negative eigenvalues
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    if len(eigenvalues) > 0 and eigenvalues.min() < 0:
+        matrix = (eigenvectors * np.maximum(eigenvalues, 0.0)) @ eigenvectors.T
+        matrix = (matrix + matrix.T) / 2
+
+    return matrix, num_observations
+
+
+class CovarianceCache:
+    """
+    Factor covariance of one market COB date, computed once and kept in memory and on disk.
+
+    Factors not in the cache yet (lines opened intraday on new underlyings) are added by
+    recomputing the matrix over the union, which is written back.
+
+    Args:
+        directory: cache directory.
+        cob_date: market COB date (last return of the window).
+        returns_fn: fn(cids) -> cid, trade_date, daily_return rows of the lookback window.
+        lookback_days: daily returns per cid.
+        min_observations: returns a cid needs to enter the matrix.
+    """
+    def __init__(self, directory: Path, cob_date, returns_fn, lookback_days: int = 250, min_observations: int = 20):
+        self.file_path = Path(directory) / f"covariance_{cob_date}_{lookback_days}d.npz"
+        self.returns_fn = returns_fn
+        self.min_observations = min_observations
+
+        self.cids = []
+        self.index = {}
+        self.matrix = np.zeros((0, 0))
+        self.num_observations = np.empty(0, dtype=np.int64)
+        self.num_computes = 0
+
+        if self.file_path.exists():
+            with np.load(self.file_path, allow_pickle=False) as cached:
+                self._set(cached['cids'].tolist(), cached['matrix'], cached['num_observations'])
+            logger.info(f"Covariance of {len(self.cids)} factors read from {self.file_path}")
+
+    def _set(self, cids: list, matrix: np.ndarray, num_observations: np.ndarray) -> None:
+        self.cids = list(cids)
+        self.index = {cid: i for i, cid in enumerate(self.cids)}
+        self.matrix = matrix
+        self.num_observations = num_observations
+
+    def get(self, cids: list) -> np.ndarray:
+        """
+        Covariance of `cids`, in that order.
+        """
+        missing = [cid for cid in dict.fromkeys(cids) if cid not in self.index]
+        if len(missing) > 0:
+            all_cids = self.cids + missing
+            start_ns = time.perf_counter_ns()
+            matrix, num_observations = covariance_from_returns(self.returns_fn(all_cids), all_cids, self.min_observations)
+            self._set(all_cids, matrix, num_observations)
+            self.num_computes += 1
+
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(self.file_path, cids=np.asarray(all_cids, dtype=str), matrix=matrix, num_observations=num_observations)
+            logger.info(f"Covariance of {len(all_cids)} factors ({len(missing)} new, "
+                        f"{int((num_observations < self.min_observations).sum())} without enough history) "
+                        f"computed in {(time.perf_counter_ns() - start_ns) * 1e-6:.0f} ms, cached in {self.file_path}")
+
+        positions = np.fromiter((self.index[cid] for cid in cids), dtype=np.intp, count=len(cids))
+        return self.matrix[np.ix_(positions, positions)]
+
+
+class IntradayVar:
+    """
+    Per-portfolio delta-normal VaR kept up to date from the updated book rows.
+
+    Args:
+        book: the position book.
+        covariance_fn: fn(cids) -> daily covariance of the cids (e.g. CovarianceCache.get).
+        confidence: one-sided confidence level, e.g. 0.99.
+        horizon_days: VaR horizon in trading days (square-root-of-time scaling).
+        recompute_every: updates between two full recomputations of the quadratic forms.
+    """
+    def __init__(self, book, covariance_fn, confidence: float = 0.99, horizon_days: float = 1.0, recompute_every: int = 1000):
+        self.book = book
+        self.covariance_fn = covariance_fn
+        self.confidence = confidence
+        self.horizon_days = horizon_days
+        self.scale = float(ndtri(confidence)) * np.sqrt(horizon_days)
+        self.recompute_every = max(int(recompute_every), 1)
+
+        self.portfolio_ids = []
+        self.portfolio_index = {}
+        self.factors = []
+        self.factor_index = {}
+        self.sigma = np.zeros((0, 0))
+
+        # per book row
+        self.row_portfolio = np.empty(0, dtype=np.intp)
+        self.row_factor = np.empty(0, dtype=np.intp)
+        self.row_option = np.empty(0, dtype=bool)
+        self.row_exposure = np.empty(0)
+
+        # per portfolio (X, Y: portfolios x factors)
+        self.X = np.zeros((0, 0))
+        self.Y = np.zeros((0, 0))
+        self.q = np.empty(0)
+        # portfolios updated since the last `contributions(dirty=True)`
+        self.dirty = set()
+
+        self.num_updates = 0
+        self.num_recomputes = 0
+
+        self.add_rows(np.arange(book.size))
+
+    @property
+    def size(self) -> int:
+        return len(self.portfolio_ids)
+
+    def _exposure(self, rows) -> np.ndarray:
+        book = self.book
+        # options: delta-equivalent position in the underlying (their premium until the pricer has a delta)
+        delta_value = book.delta[rows] * book.underlying_price[rows] * book.quantity[rows] * book.multiplier[rows] * book.fx_rate[rows]
+        exposure = np.where(self.row_option[rows] & ~np.isnan(delta_value), delta_value, book.mkt_value[rows])
+        return np.nan_to_num(exposure)
+
+    def add_rows(self, rows) -> None:
+        """
+        Adds new book rows (appended by insert_line), with their portfolios and factors, and
+        recomputes the quadratic forms.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        static_df = self.book.static_df.iloc[rows]
+
+        cids = static_df[self.book.cid_col].tolist()
+        if 'underlying_cid' in static_df.columns:
+            underlying_cids = static_df['underlying_cid'].tolist()
+            is_option = static_df['underlying_cid'].notna().to_numpy()
+        else:
+            underlying_cids = [None] * len(cids)
+            is_option = np.zeros(len(cids), dtype=bool)
+        factors = [underlying if option else cid for cid, underlying, option in zip(cids, underlying_cids, is_option.tolist())]
+
+        new_factors = [factor for factor in dict.fromkeys(factors) if factor not in self.factor_index]
+        if len(new_factors) > 0:
+            self.factors += new_factors
+            self.factor_index = {factor: i for i, factor in enumerate(self.factors)}
+            self.sigma = self.covariance_fn(self.factors)
+
+        for portfolio_id in self.book.portfolio_id[rows].tolist():
+            if portfolio_id not in self.portfolio_index:
+                self.portfolio_index[portfolio_id] = len(self.portfolio_ids)
+                self.portfolio_ids.append(portfolio_id)
+
+        self.row_portfolio = np.concatenate([self.row_portfolio, [self.portfolio_index[pid] for pid in self.book.portfolio_id[rows].tolist()]]).astype(np.intp)
+        self.row_factor = np.concatenate([self.row_factor, [self.factor_index[factor] for factor in factors]]).astype(np.intp)
+        self.row_option = np.concatenate([self.row_option, is_option])
+        self.row_exposure = np.concatenate([self.row_exposure, np.zeros(len(rows))])
+
+        self.recompute()
+
+    def recompute(self) -> None:
+        """
+        Full recomputation of X, Y and q from the current exposures of every row.
+        """
+        rows = np.arange(self.row_exposure.shape[0])
+        self.row_exposure = self._exposure(rows)
+
+        self.X = np.zeros((self.size, len(self.factors)))
+        np.add.at(self.X, (self.row_portfolio, self.row_factor), self.row_exposure)
+        self.Y = self.X @ self.sigma
+        self.q = np.einsum('pk,pk->p', self.X, self.Y)
+        self.dirty.update(range(self.size))
+        self.num_recomputes += 1
+
+    def update(self, rows) -> np.ndarray:
+        """
+        Applies the exposure changes of the updated rows to the quadratic forms.
+
+        Returns the portfolio slots whose VaR changed.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        exposure = self._exposure(rows)
+        change = exposure - self.row_exposure[rows]
+        self.row_exposure[rows] = exposure
+
+        changed = change != 0
+        if not changed.any():
+            return np.empty(0, dtype=np.intp)
+
+        self.num_updates += 1
+        if self.num_updates % self.recompute_every == 0:
+            portfolios = np.unique(self.row_portfolio[rows[changed]])
+            self.recompute()
+            return portfolios
+
+        # changes summed per (portfolio, factor): e.g. an underlying and the options on it
+        portfolios, portfolio_pos = np.unique(self.row_portfolio[rows[changed]], return_inverse=True)
+        factors, factor_pos = np.unique(self.row_factor[rows[changed]], return_inverse=True)
+        dx = np.zeros((len(portfolios), len(factors)))
+        np.add.at(dx, (portfolio_pos, factor_pos), change[changed])
+
+        Y_K = self.Y[np.ix_(portfolios, factors)]
+        sigma_KK = self.sigma[np.ix_(factors, factors)]
+        self.q[portfolios] += 2 * np.einsum('pk,pk->p', dx, Y_K) + np.einsum('pk,pk->p', dx @ sigma_KK, dx)
+        self.Y[portfolios] += dx @ self.sigma[factors]
+        self.X[np.ix_(portfolios, factors)] += dx
+
+        self.dirty.update(portfolios.tolist())
+        return portfolios
+
+    def volatility(self, portfolios=None) -> np.ndarray:
+        q = self.q if portfolios is None else self.q[portfolios]
+        return np.sqrt(np.maximum(q, 0.0))
+
+    def portfolio_var(self, portfolios=None) -> np.ndarray:
+        """
+        VAR_DTYPE rows of the given portfolio slots (every portfolio by default).
+        """
+        if portfolios is None:
+            portfolios = np.arange(self.size)
+        volatility = self.volatility(portfolios)
+
+        out = np.empty(len(portfolios), dtype=wire_format.VAR_DTYPE)
+        out['portfolio_id'] = np.asarray(self.portfolio_ids, dtype=np.int64)[portfolios]
+        out['exposure'] = self.X[portfolios].sum(axis=1)
+        out['volatility'] = volatility
+        out['var'] = self.scale * volatility
+        out['confidence'] = self.confidence
+        out['horizon_days'] = self.horizon_days
+        return out
+
+    def contributions(self, portfolios=None, dirty: bool = False) -> np.ndarray:
+        """
+        VAR_CONTRIBUTION_DTYPE rows (factors with an exposure) of the given portfolio slots,
+        or of the portfolios updated since the last dirty call.
+        """
+        if dirty:
+            portfolios = np.asarray(sorted(self.dirty), dtype=np.intp)
+            self.dirty.clear()
+        elif portfolios is None:
+            portfolios = np.arange(self.size)
+
+        X = self.X[portfolios]
+        slots, factors = np.nonzero(X)
+        volatility = self.volatility(portfolios)[slots]
+        marginal = np.divide(self.scale * self.Y[portfolios][slots, factors], volatility,
+                             out=np.zeros(len(slots)), where=volatility > 0)
+
+        out = np.empty(len(slots), dtype=wire_format.VAR_CONTRIBUTION_DTYPE)
+        out['portfolio_id'] = np.asarray(self.portfolio_ids, dtype=np.int64)[portfolios][slots]
+        out['key'] = np.asarray(self.factors, dtype=object)[factors].astype(str).astype(wire_format.VAR_CONTRIBUTION_DTYPE['key'])
+        out['exposure'] = X[slots, factors]
+        out['marginal_var'] = marginal
+        out['component_var'] = X[slots, factors] * marginal
+        return out
+
+    def as_dict(self) -> dict:
+        return {
+            'portfolios': self.size,
+            'factors': len(self.factors),
+            'updates': self.num_updates,
+            'recomputes': self.num_recomputes,
+            'var': {int(pid): float(var) for pid, var in zip(self.portfolio_ids, (self.scale * self.volatility()).tolist())},
+        }
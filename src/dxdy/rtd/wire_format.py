@@ -0,0 +1,367 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# RTD publish/subscribe wire protocol (shared by the RTD server, the TUI and third-party consumers).
+#
+#   +----------------------------------+-----------------------------------------------+
+#   | header (HEADER_DTYPE, 32 bytes)  | body: row_count records of SCHEMAS[schema_id] |
+#   +----------------------------------+-----------------------------------------------+
+#
+#   header: magic | version | msg_type | schema_id | reserved | seq | timestamp_ns | row_count | row_size
+#
+# All fields are little-endian. The body is a NumPy structured array: the server encodes it
+# with `tobytes()` and clients decode it with `np.frombuffer` (a read-only view, no copy).
+# `seq` increases by one for every message a publisher sends, so subscribers can detect gaps.
+#
+# Only NumPy is required, so this module can be vendored by non-dxdy consumers.
+#
+
+import numpy as np
+
+
+MAGIC = 0xD1D1
+PROTOCOL_VERSION = 1
+
+# message types
+MSG_POSITION_ROWS = 1       # delta: updated rows of the position book
+MSG_RELOAD = 2              # the position book was rebuilt; clients must re-initialize (no body)
+MSG_SNAPSHOT = 3            # full position book as of `seq` (reply of the snapshot endpoint)
+MSG_OPTION_ROWS = 4         # delta: model price and Greeks of repriced option rows
+MSG_AGGREGATES = 5          # delta: portfolio / sector / currency / long-short totals that changed
+MSG_TABLE_ROWS = 6          # notification: rows of the shared-memory position table that changed
+MSG_LIMIT_EVENTS = 7        # risk limit breaches and clears
+MSG_VAR = 8                 # intraday VaR of the portfolios that changed
+MSG_VAR_CONTRIBUTIONS = 9   # marginal / component VaR per factor of the portfolios that changed
+
+# body schemas
+SCHEMA_NONE = 0
+SCHEMA_POSITION_ROWS_V1 = 1
+SCHEMA_POSITION_SNAPSHOT_V1 = 2
+SCHEMA_OPTION_ROWS_V1 = 3
+SCHEMA_POSITION_ROWS_V2 = 4         # V1 + fx_rate and the price / FX split of the P&L
+SCHEMA_POSITION_SNAPSHOT_V2 = 5     # V1 + close_fx_rate and the price / FX split of the P&L
+SCHEMA_AGGREGATES_V1 = 6
+SCHEMA_TABLE_ROWS_V1 = 7
+SCHEMA_LIMIT_EVENTS_V1 = 8
+SCHEMA_VAR_V1 = 9
+SCHEMA_VAR_CONTRIBUTIONS_V1 = 10
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u2'),
+    ('version', '<u1'),
+    ('msg_type', '<u1'),
+    ('schema_id', '<u2'),
+    ('reserved', '<u2'),
+    ('seq', '<u8'),
+    ('timestamp_ns', '<i8'),
+    ('row_count', '<u4'),
+    ('row_size', '<u4'),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+POSITION_ROW_V1_DTYPE = np.dtype([
+    ('quote_timestamp_ns', '<i8'),
+    ('row_num', '<i8'),
+    ('quantity', '<f8'),
+    ('price', '<f8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('mkt_value', '<f8'),
+    ('pct_aum', '<f8'),
+    ('gain_loss', '<f8'),
+    ('pct_chg', '<f8'),
+    ('pnl', '<f8'),
+])
+
+POSITION_ROW_DTYPE = np.dtype(POSITION_ROW_V1_DTYPE.descr + [
+    ('fx_rate', '<f8'),
+    ('price_pnl', '<f8'),
+    ('fx_pnl', '<f8'),
+])
+
+POSITION_SNAPSHOT_V1_DTYPE = np.dtype([
+    ('quote_timestamp_ns', '<i8'),
+    ('row_num', '<i8'),
+    ('portfolio_id', '<i8'),
+    ('quantity', '<f8'),
+    ('multiplier', '<f8'),
+    ('latest_cash_balance', '<f8'),
+    ('fx_rate', '<f8'),
+    ('close_price', '<f8'),
+    ('avg_cost', '<f8'),
+    ('price', '<f8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('mkt_value', '<f8'),
+    ('pct_aum', '<f8'),
+    ('gain_loss', '<f8'),
+    ('chg', '<f8'),
+    ('pct_chg', '<f8'),
+    ('pnl', '<f8'),
+    ('delay', '<f8'),
+])
+
+POSITION_SNAPSHOT_DTYPE = np.dtype(POSITION_SNAPSHOT_V1_DTYPE.descr + [
+    ('close_fx_rate', '<f8'),
+    ('price_pnl', '<f8'),
+    ('fx_pnl', '<f8'),
+])
+
+OPTION_ROW_DTYPE = np.dtype([
+    ('row_num', '<i8'),
+    ('underlying_price', '<f8'),
+    ('implied_vol', '<f8'),
+    ('model_price', '<f8'),
+    ('delta', '<f8'),
+    ('gamma', '<f8'),
+    ('vega', '<f8'),
+    ('theta', '<f8'),
+])
+
+# dimension: 0 portfolio, 1 sector, 2 currency, 3 long/short (see rtd/aggregates.py)
+# key: sector name, currency or b'long' / b'short' (empty for the portfolio total), NUL-padded
+AGGREGATE_DTYPE = np.dtype([
+    ('group_id', '<u4'),
+    ('dimension', '<u4'),
+    ('portfolio_id', '<i8'),
+    ('key', 'S32'),
+    ('mkt_value', '<f8'),
+    ('pnl', '<f8'),
+    ('price_pnl', '<f8'),
+    ('fx_pnl', '<f8'),
+    ('gross_pnl', '<f8'),
+])
+
+# row positions in the shared-memory position table (see rtd/shm_book.py)
+TABLE_ROW_DTYPE = np.dtype([
+    ('row', '<u4'),
+])
+
+# limit_type: 0 gross, 1 net, 2 single name, 3 sector; event: 1 breach, 0 clear (see rtd/limits.py)
+# key: sector name or cid of the check (empty for portfolio-wide limits); row_num -1 unless single name
+LIMIT_EVENT_DTYPE = np.dtype([
+    ('timestamp_ns', '<i8'),
+    ('limit_id', '<i8'),
+    ('portfolio_id', '<i8'),
+    ('row_num', '<i8'),
+    ('limit_type', '<u4'),
+    ('event', '<u4'),
+    ('key', 'S32'),
+    ('value', '<f8'),
+    ('threshold', '<f8'),
+])
+
+# delta-normal VaR in the portfolio currency (see rtd/var.py); volatility is the 1-day P&L std dev
+VAR_DTYPE = np.dtype([
+    ('portfolio_id', '<i8'),
+    ('exposure', '<f8'),
+    ('volatility', '<f8'),
+    ('var', '<f8'),
+    ('confidence', '<f8'),
+    ('horizon_days', '<f8'),
+])
+
+# key: cid of the risk factor (the underlying of option rows), NUL-padded
+VAR_CONTRIBUTION_DTYPE = np.dtype([
+    ('portfolio_id', '<i8'),
+    ('key', 'S32'),
+    ('exposure', '<f8'),
+    ('marginal_var', '<f8'),
+    ('component_var', '<f8'),
+])
+
+# the encoder writes the latest schemas, the older ones are still decoded
+SCHEMAS = {
+    SCHEMA_POSITION_ROWS_V1: POSITION_ROW_V1_DTYPE,
+    SCHEMA_POSITION_SNAPSHOT_V1: POSITION_SNAPSHOT_V1_DTYPE,
+    SCHEMA_OPTION_ROWS_V1: OPTION_ROW_DTYPE,
+    SCHEMA_POSITION_ROWS_V2: POSITION_ROW_DTYPE,
+    SCHEMA_POSITION_SNAPSHOT_V2: POSITION_SNAPSHOT_DTYPE,
+    SCHEMA_AGGREGATES_V1: AGGREGATE_DTYPE,
+    SCHEMA_TABLE_ROWS_V1: TABLE_ROW_DTYPE,
+    SCHEMA_LIMIT_EVENTS_V1: LIMIT_EVENT_DTYPE,
+    SCHEMA_VAR_V1: VAR_DTYPE,
+    SCHEMA_VAR_CONTRIBUTIONS_V1: VAR_CONTRIBUTION_DTYPE,
+}
+
+
+def topic(msg_type: int) -> bytes:
+    """
+    Leading header bytes of every message of `msg_type`: a SUB socket subscribed to them only
+    receives that message type (its sequence numbers then have gaps by design).
+    """
+    return MAGIC.to_bytes(2, 'little') + bytes([PROTOCOL_VERSION, msg_type])
+
+
+def pack_rows(source, rows, dtype: np.dtype) -> np.ndarray:
+    """
+    Gathers `rows` of every field in `dtype` from `source` into a structured array.
+
+    `source` is anything exposing one array per field name as an attribute or a key
+    (e.g. the RTD PositionBook, a dict of arrays or a DataFrame).
+    """
+    n = len(rows)
+    out = np.empty(n, dtype=dtype)
+    for name in dtype.names:
+        column = source[name] if isinstance(source, dict) else getattr(source, name)
+        out[name] = np.asarray(column)[rows]
+    return out
+
+
+class WireEncoder:
+    """
+    Encodes RTD messages and stamps them with a per-publisher sequence number.
+    """
+    def __init__(self, start_seq: int = 0):
+        self.seq = start_seq
+
+    def encode(self, msg_type: int, timestamp_ns: int, schema_id: int = SCHEMA_NONE, body: np.ndarray = None, 
+               seq: int = None) -> bytes:
+        """
+        Encodes one message. A new sequence number is assigned unless `seq` is given
+        (snapshots are stamped with the last published sequence number instead).
+        """
+        if seq is None:
+            self.seq += 1
+            seq = self.seq
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['version'] = PROTOCOL_VERSION
+        header['msg_type'] = msg_type
+        header['schema_id'] = schema_id
+        header['seq'] = seq
+        header['timestamp_ns'] = timestamp_ns
+
+        if body is None:
+            return header.tobytes()
+
+        header['row_count'] = body.shape[0]
+        header['row_size'] = body.dtype.itemsize
+        return header.tobytes() + body.tobytes()
+
+    def encode_position_rows(self, source, rows, timestamp_ns: int) -> bytes:
+        body = pack_rows(source, rows, POSITION_ROW_DTYPE)
+        return self.encode(MSG_POSITION_ROWS, timestamp_ns, SCHEMA_POSITION_ROWS_V2, body)
+
+    def encode_option_rows(self, source, rows, timestamp_ns: int) -> bytes:
+        body = pack_rows(source, rows, OPTION_ROW_DTYPE)
+        return self.encode(MSG_OPTION_ROWS, timestamp_ns, SCHEMA_OPTION_ROWS_V1, body)
+
+    def encode_aggregates(self, source, groups, timestamp_ns: int) -> bytes:
+        body = pack_rows(source, groups, AGGREGATE_DTYPE)
+        return self.encode(MSG_AGGREGATES, timestamp_ns, SCHEMA_AGGREGATES_V1, body)
+
+    def encode_table_rows(self, rows, timestamp_ns: int) -> bytes:
+        body = np.asarray(rows, dtype=TABLE_ROW_DTYPE['row']).view(TABLE_ROW_DTYPE)
+        return self.encode(MSG_TABLE_ROWS, timestamp_ns, SCHEMA_TABLE_ROWS_V1, body)
+
+    def encode_limit_events(self, events: np.ndarray, timestamp_ns: int) -> bytes:
+        return self.encode(MSG_LIMIT_EVENTS, timestamp_ns, SCHEMA_LIMIT_EVENTS_V1, events.astype(LIMIT_EVENT_DTYPE, copy=False))
+
+    def encode_var(self, var: np.ndarray, timestamp_ns: int) -> bytes:
+        return self.encode(MSG_VAR, timestamp_ns, SCHEMA_VAR_V1, var.astype(VAR_DTYPE, copy=False))
+
+    def encode_var_contributions(self, contributions: np.ndarray, timestamp_ns: int) -> bytes:
+        return self.encode(MSG_VAR_CONTRIBUTIONS, timestamp_ns, SCHEMA_VAR_CONTRIBUTIONS_V1,
+                           contributions.astype(VAR_CONTRIBUTION_DTYPE, copy=False))
+
+    def encode_reload(self, timestamp_ns: int) -> bytes:
+        return self.encode(MSG_RELOAD, timestamp_ns)
+
+    def encode_snapshot(self, source, rows, timestamp_ns: int) -> bytes:
+        # a snapshot does not consume a sequence number: it is the state as of the last one sent
+        body = pack_rows(source, rows, POSITION_SNAPSHOT_DTYPE)
+        return self.encode(MSG_SNAPSHOT, timestamp_ns, SCHEMA_POSITION_SNAPSHOT_V2, body, seq=self.seq)
+
+
+def decode(buffer):
+    """
+    Decodes one message without copying.
+
+    Args:
+        buffer: bytes, memoryview or zmq.Frame (its `.buffer` is used).
+
+    Returns:
+        (header, body) where header is a HEADER_DTYPE record and body is a read-only
+        structured array view over `buffer` (None for messages without a body).
+    """
+    if hasattr(buffer, 'buffer'):
+        buffer = buffer.buffer
+
+    if len(buffer) < HEADER_SIZE:
+        raise ValueError(f"RTD message too short: {len(buffer)} bytes")
+
+    header = np.frombuffer(buffer, dtype=HEADER_DTYPE, count=1)[0]
+
+    if header['magic'] != MAGIC:
+        raise ValueError(f"Not an RTD message (magic {int(header['magic']):#06x})")
+
+    if header['version'] != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported RTD protocol version {int(header['version'])}")
+
+    schema_id = int(header['schema_id'])
+    if schema_id == SCHEMA_NONE:
+        return header, None
+
+    dtype = SCHEMAS.get(schema_id)
+    if dtype is None:
+        raise ValueError(f"Unknown RTD schema id {schema_id}")
+
+    if header['row_size'] != dtype.itemsize:
+        raise ValueError(f"RTD schema {schema_id} row size mismatch: {int(header['row_size'])} != {dtype.itemsize}")
+
+    body = np.frombuffer(buffer, dtype=dtype, count=int(header['row_count']), offset=HEADER_SIZE)
+    return header, body
+
+
+class SequenceTracker:
+    """
+    Tracks the sequence numbers of one publisher and counts missed messages.
+    """
+    def __init__(self):
+        self.last_seq = None
+        self.sync_seq = None
+        self.num_messages = 0
+        self.num_gaps = 0
+        self.num_missed = 0
+
+    def update(self, seq: int) -> int:
+        """
+        Returns the number of messages missed before `seq` (0 when in order).
+
+        A sequence number lower than or equal to the last one means the publisher
+        restarted; tracking resumes from it without counting a gap.
+        """
+        seq = int(seq)
+        missed = 0
+
+        if self.last_seq is not None and seq > self.last_seq + 1:
+            missed = seq - self.last_seq - 1
+            self.num_gaps += 1
+            self.num_missed += missed
+
+        self.last_seq = seq
+        self.num_messages += 1
+        return missed
+
+    def sync(self, seq: int) -> None:
+        """
+        Aligns the tracker with a snapshot taken as of `seq`.
+        """
+        self.last_seq = int(seq)
+        self.sync_seq = int(seq)
+
+    def is_stale(self, seq: int) -> bool:
+        """
+        True for messages already contained in the last snapshot (seq <= snapshot seq).
+        """
+        if self.sync_seq is None:
+            return False
+        if int(seq) <= self.sync_seq:
+            return True
+        self.sync_seq = None
+        return False
+
+    def reset(self) -> None:
+        self.last_seq = None
+        self.sync_seq = None
@@ -124,6 +124,14 @@ class Settings:
     def get_ntp_server(self) -> str:
         return str(self.settings['ntp']['server'])
     
+    def get_ntp_config(self) -> dict:
+        # shared clock service: NTP offset re-synced every refresh_interval_s (see rtd/clock.py)
+        ntp = self.settings.get('ntp', {})
+        return {
+            'server': str(ntp['server']) if 'server' in ntp else None,
+            'refresh_interval_s': float(ntp.get('refresh_interval_s', 900.0)),
+        }
+    
     def get_timezone(self) -> ZoneInfo:        
         # with self.get_db_connection() as conn:
         #     qry = f"""
@@ -154,6 +162,159 @@ class Settings:
     def get_realtime_calculation_tcp_socket(self) -> str:
         return str(self.settings['microservices']['realtime_calculation_tcp_socket'])
     
+    def get_realtime_snapshot_tcp_socket(self) -> str:
+        # REQ/REP endpoint serving full position book snapshots (see rtd/snapshot.py)
+        return str(self.settings['microservices'].get('realtime_snapshot_tcp_socket', "tcp://127.0.0.1:7001"))
+    
+    def get_realtime_stats_tcp_socket(self) -> str:
+        # REQ/REP endpoint serving the RTD server's latency histograms (see rtd/latency.py)
+        return str(self.settings['microservices'].get('realtime_stats_tcp_socket', "tcp://127.0.0.1:7002"))
+    
+    def get_rtd_pub_hwm(self) -> int:
+        # deltas are no longer conflated, so the PUB socket needs room to queue them
+        return int(self.settings.get('rtd', {}).get('pub_hwm', 10000))
+    
+    def get_rtd_batch_config(self) -> dict:
+        # micro-batching of real-time ticks in the RTD server (see rtd/tick_batcher.py)
+        rtd = self.settings.get('rtd', {})
+        return {
+            'enabled': bool(rtd.get('batching', True)),
+            'window_ms': float(rtd.get('batch_window_ms', 5.0)),
+            'max_ticks': int(rtd.get('batch_max_ticks', 1000)),
+        }
+    
+    def get_rtd_runtime_config(self) -> dict:
+        # queue sizes and task rates of the asyncio RTD server (see rtd/runtime.py)
+        rtd = self.settings.get('rtd', {})
+        return {
+            'quotes_queue_size': int(rtd.get('quotes_queue_size', 64)),
+            'publish_queue_size': int(rtd.get('publish_queue_size', 1024)),
+            'pnl_interval_s': float(rtd.get('pnl_interval_s', 1.0)),
+            'email_interval_s': float(rtd.get('email_interval_s', 1800.0)),
+            'metrics_interval_s': float(rtd.get('metrics_interval_s', 1.0)),
+            'log_sample_interval_s': float(rtd.get('log_sample_interval_s', 5.0)),
+        }
+    
+    def get_rtd_sharding_config(self) -> dict:
+        # horizontal sharding of the RTD server (see rtd/partition.py and rtd/aggregator.py)
+        rtd = self.settings.get('rtd', {})
+        return {
+            'shards': int(rtd.get('shards', 1)),
+            'shard_by': str(rtd.get('shard_by', 'cid')),
+            'host': str(rtd.get('shard_host', '127.0.0.1')),
+            'base_port': int(rtd.get('shard_base_port', 7100)),
+        }
+    
+    def get_tick_capture_config(self) -> dict:
+        # raw tick capture of the RTD server (see rtd/tick_capture.py)
+        capture = self.settings.get('tick_capture', {})
+        return {
+            'enabled': bool(capture.get('enabled', False)),
+            'flush_rows': int(capture.get('flush_rows', 50000)),
+            'flush_interval_s': float(capture.get('flush_interval_s', 5.0)),
+        }
+    
+    def get_tick_capture_dir(self) -> Path:
+        dir = Path(self.settings.get('tick_capture', {}).get('directory', self.dxdy_dir / "ticks"))
+        # make sure the directory exists
+        dir.mkdir(parents=True, exist_ok=True)
+        return dir
+    
+    def get_tick_replay_config(self) -> dict:
+        # replay of captured ticks in place of the live feed
+        replay = self.settings.get('tick_replay', {})
+        return {
+            'enabled': bool(replay.get('enabled', False)),
+            'date': str(replay.get('date', '')),
+            'speed': float(replay.get('speed', 0.0)),
+        }
+    
+    def get_option_pricing_config(self) -> dict:
+        # real-time Black-Scholes repricing of option rows from underlying ticks (see rtd/option_pricer.py)
+        options = self.settings.get('option_pricing', {})
+        return {
+            'enabled': bool(options.get('enabled', True)),
+            'rate': float(options.get('rate', 0.04)),
+            'dividend_yield': float(options.get('dividend_yield', 0.0)),
+            'mark_to_model': bool(options.get('mark_to_model', True)),
+            'expiry_time': str(options.get('expiry_time', '16:00')),
+        }
+    
+    def get_rtd_fx_streaming(self) -> bool:
+        # stream FX rates into the RTD position book (see rtd/fx_rates.py)
+        return bool(self.settings.get('rtd', {}).get('fx_streaming', True))
+    
+    def get_synthetic_feed_config(self) -> dict:
+        # correlated GBM load-test feed in place of the live feed (see quant/synthetic_feed.py)
+        feed = self.settings.get('synthetic_feed', {})
+        return {
+            'enabled': bool(feed.get('enabled', False)),
+            'rate': float(feed.get('rate', 20000.0)),
+            'seed': int(feed['seed']) if 'seed' in feed else None,
+            'sigma': float(feed.get('sigma', 0.2)),
+            'correlation': float(feed.get('correlation', 0.3)),
+            'spread_bps': float(feed.get('spread_bps', 5.0)),
+            'burst_rate_per_s': float(feed.get('burst_rate_per_s', 0.05)),
+            'burst_factor': float(feed.get('burst_factor', 5.0)),
+            'burst_duration_s': float(feed.get('burst_duration_s', 1.0)),
+            'block_rounds': int(feed.get('block_rounds', 64)),
+        }
+    
+    def get_bbg_subscription_config(self) -> dict:
+        # long-lived Bloomberg real-time session (see bbg/subscriptions.py)
+        bbg = self.settings.get('bbg_subscriptions', {})
+        return {
+            'host': str(bbg.get('host', 'localhost')),
+            'port': int(bbg.get('port', 8194)),
+            'interval_s': float(bbg.get('interval_s', 0.0)),
+            'poll_timeout_s': float(bbg.get('poll_timeout_s', 1.0)),
+            'backoff_initial_s': float(bbg.get('backoff_initial_s', 1.0)),
+            'backoff_max_s': float(bbg.get('backoff_max_s', 60.0)),
+            'batch_size': int(bbg.get('batch_size', 500)),
+        }
+    
+    def get_shared_book_config(self) -> dict:
+        # position book mirrored in shared memory for same-host readers (see rtd/shm_book.py)
+        shared = self.settings.get('shared_book', {})
+        return {
+            'enabled': bool(shared.get('enabled', False)),
+            'name': str(shared.get('name', 'dxdy-rtd-book')),
+            'notify_endpoint': str(shared.get('notify_endpoint', 'ipc:///tmp/dxdy-rtd-book.ipc')),
+            'headroom': int(shared.get('headroom', 1024)),
+        }
+    
+    def get_risk_limits_config(self) -> dict:
+        # real-time risk limit checks of the RTD server (see rtd/limits.py)
+        limits = self.settings.get('risk_limits', {})
+        return {
+            'enabled': bool(limits.get('enabled', True)),
+            'clear_hysteresis': float(limits.get('clear_hysteresis', 0.02)),
+            'flush_interval_s': float(limits.get('flush_interval_s', 30.0)),
+        }
+    
+    def get_intraday_var_config(self) -> dict:
+        # intraday delta-normal VaR of the RTD server (see rtd/var.py)
+        var = self.settings.get('intraday_var', {})
+        return {
+            'enabled': bool(var.get('enabled', True)),
+            'confidence': float(var.get('confidence', 0.99)),
+            'horizon_days': float(var.get('horizon_days', 1.0)),
+            'lookback_days': int(var.get('lookback_days', 250)),
+            'min_observations': int(var.get('min_observations', 20)),
+            'recompute_every': int(var.get('recompute_every', 1000)),
+            'contributions_interval_s': float(var.get('contributions_interval_s', 1.0)),
+        }
+    
+    def get_var_cache_dir(self) -> Path:
+        # daily covariance matrices, one file per market COB date
+        dir = Path(self.settings.get('intraday_var', {}).get('cache_directory', self.dxdy_dir / "var_cache"))
+        dir.mkdir(parents=True, exist_ok=True)
+        return dir
+    
+    def get_rtd_fills_poll_interval(self) -> float:
+        # seconds between intraday blotter polls in the RTD server (see rtd/intraday_fills.py)
+        return float(self.settings.get('rtd', {}).get('fills_poll_interval_s', 30.0))
+    
     def get_config_file(self):
         return self.settings
     
@@ -0,0 +1,107 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Time series for the terminal charts: appended in place, drawn at the terminal's resolution.
+#
+#   tail() records ──> SeriesBuffer.append (amortized O(1), no re-read, no Python loop)
+#                          │
+#                          ▼
+#   minmax_downsample(x, y, width): per time bucket (one per character column) the first
+#   point, the min and the max, in time order ── at most ~3 x width points for plotext,
+#   spikes and the overall shape are kept
+#
+
+import numpy as np
+
+
+class SeriesBuffer:
+    """
+    Growable (x, y) float64 series, doubling its capacity when full.
+    """
+    def __init__(self, capacity: int = 4096):
+        self._x = np.empty(capacity)
+        self._y = np.empty(capacity)
+        self.size = 0
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[:self.size]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:self.size]
+
+    def append(self, x, y) -> None:
+        n = len(x)
+        if self.size + n > self._x.shape[0]:
+            capacity = max(2 * self._x.shape[0], self.size + n)
+            self._x = np.concatenate([self.x, np.empty(capacity - self.size)])
+            self._y = np.concatenate([self.y, np.empty(capacity - self.size)])
+        self._x[self.size:self.size + n] = x
+        self._y[self.size:self.size + n] = y
+        self.size += n
+
+    def clear(self) -> None:
+        self.size = 0
+
+
+def _first_in_bucket(mask: np.ndarray, bucket: np.ndarray) -> np.ndarray:
+    # index of the first True of every bucket that has one
+    indices = np.flatnonzero(mask)
+    _, first = np.unique(bucket[indices], return_index=True)
+    return indices[first]
+
+
+def minmax_downsample(x: np.ndarray, y: np.ndarray, num_buckets: int) -> tuple:
+    """
+    Reduces a series sorted by x to the first, min and max points of `num_buckets` equal-width
+    x buckets (plus the last point). Non-finite y values are dropped.
+
+    Returns (x, y), unchanged when the series is already small enough.
+    """
+    finite = np.isfinite(y)
+    if not finite.all():
+        x = x[finite]
+        y = y[finite]
+
+    n = x.shape[0]
+    if n <= 3 * num_buckets or num_buckets < 1:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], num_buckets + 1)[:-1]
+    # first index of every non-empty bucket
+    starts = np.unique(np.searchsorted(x, edges, side='left'))
+    starts = starts[starts < n]
+    bucket = np.searchsorted(starts, np.arange(n), side='right') - 1
+
+    bucket_min = np.minimum.reduceat(y, starts)
+    bucket_max = np.maximum.reduceat(y, starts)
+
+    keep = np.concatenate([
+        starts,
+        _first_in_bucket(y == bucket_min[bucket], bucket),
+        _first_in_bucket(y == bucket_max[bucket], bucket),
+        [n - 1],
+    ])
+    keep = np.unique(keep)
+    return x[keep], y[keep]
+
+
+def time_ticks(x0: float, x1: float, max_ticks: int) -> tuple:
+    """
+    Round clock-time ticks (x in hours since midnight) in [x0, x1], at most `max_ticks`.
+
+    Returns (positions, labels) with labels like "9:30AM", computed for the shown ticks only.
+    """
+    span = max(x1 - x0, 1.0 / 60)
+    # minutes between ticks: the smallest round step giving at most max_ticks
+    steps = [1, 2, 5, 10, 15, 30, 60, 120, 180, 240]
+    step = next((s for s in steps if span * 60 / s <= max(max_ticks, 1)), steps[-1])
+
+    first = np.ceil(x0 * 60 / step) * step
+    minutes = np.arange(first, x1 * 60 + 1e-9, step)
+
+    labels = []
+    for minute in minutes.astype(np.int64).tolist():
+        hour, minute = divmod(minute, 60)
+        labels.append(f"{(hour % 12) or 12}:{minute:02d}{'AM' if hour % 24 < 12 else 'PM'}")
+    return (minutes / 60).tolist(), labels
@@ -4,15 +4,13 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 import random
 
-import ntplib
-
 from textual.widget import Widget
 from textual.widgets import Label
 from textual.reactive import reactive
 from textual.message import Message
 
 from ..settings import Settings
-from ..rtd.rtd_calcs import get_ntp_time
+from ..rtd.clock import ClockService, get_clock
 
 
 def get_time_icon(local_dt: datetime) -> str:
@@ -35,11 +33,12 @@ def get_time_icon(local_dt: datetime) -> str:
 class TimeSync(Message):
     local_tz : ZoneInfo = None
     
-    def __init__(self, ntp_stats: ntplib.NTPStats) -> None:
+    def __init__(self, clock: ClockService) -> None:
         super().__init__()
         
-        self.local_tz = Settings().get_timezone()
-        self.local_time_ns, self.local_dt = get_ntp_time(self.local_tz, ntp_stats)
+        self.local_tz = clock.local_tz
+        self.local_time_ns = clock.now_ns()
+        self.local_dt = clock.to_datetime(self.local_time_ns)
         self.local_dt_str = self.local_dt.isoformat()        
         self.time_icon = get_time_icon(self.local_dt)
 
@@ -49,27 +48,27 @@ class ClockWidget(Widget):
     
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
-        self.ntp_stats = None
+        self.clock = None
         self.ntp = None
         self.leap_warn = ""
-        self.ntp = None
         
-        self.ntp_client = ntplib.NTPClient()
         self.local_tz = Settings().get_timezone()
         
 
     def _time_sync(self) -> None:
-        self.post_message(TimeSync(self.ntp_stats))
+        self.post_message(TimeSync(self.clock))
 
     def on_time_sync(self, message: TimeSync) -> None:
         self.ntp = message
 
     def on_mount(self) -> None:
-        self.ntp_stats = self.ntp_client.request(Settings().get_ntp_server(), version=4)
+        # shared with the dashboard (and the RTD server when it runs in-process)
+        self.clock = get_clock()
+        leap = self.clock.ntp_stats.leap if self.clock.ntp_stats is not None else 0
         self.leap_warn = ""
-        if self.ntp_stats.leap == 1:
+        if leap == 1:
             self.leap_warn = "▕ θ leap second +1s▕ "
-        elif self.ntp_stats.leap == 2:
+        elif leap == 2:
             self.leap_warn = "▕ θ leap second -1s▕ "
         self._time_sync()
         self.auto_refresh = 1.0
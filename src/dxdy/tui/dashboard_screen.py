@@ -1,19 +1,19 @@
 # Copyright (C) 2024 Spaghetti Software Inc. (SPGI)
 
+import asyncio
+import time
 from datetime import datetime
 from collections import deque
-import struct
-
 import zmq
-
-import ntplib
+import zmq.asyncio
 
 from rich.text import Text
 from textual.app import ComposeResult
 from textual.containers import Vertical
 from textual.screen import Screen
+from textual.message import Message
 from textual.widget import Widget
-from textual.widgets import ContentSwitcher, DataTable, Digits, Footer, Tree
+from textual.widgets import ContentSwitcher, DataTable, Digits, Footer, Static, Tree
 from textual.events import Key
 
 import plotext
@@ -23,15 +23,31 @@ from textual import events
 
 from ..settings import Settings
 from ..db.utils import get_current_cob_date, get_next_cob_date, get_t_plus_one_cob_date
-from ..rtd.rtd_calcs import get_rtd_positions, get_ntp_time
+from ..rtd.rtd_calcs import get_rtd_positions
+from ..rtd.clock import get_clock
+from ..rtd import wire_format
+from ..rtd.snapshot import request_snapshot
+from ..rtd.pnl_store import PnlSeriesReader, intraday_pnl_file_path
+from ..rtd.latency import LatencyStats, SampledLog, request_stats
+from ..rtd.aggregates import AGG_PORTFOLIO
+from ..rtd.client_book import ClientPositionBook
 
 from .custom_header import CustomHeaderWidget
-from .tui_utils import format_data_table_cell
+from .chart_series import SeriesBuffer, minmax_downsample, time_ticks
+from .virtual_grid import VirtualGrid
 
 
 from loguru import logger
 
 
+def format_latency(value, unit: str) -> Text:
+    # latencies in ms, queue depths as counts
+    if value is None or value != value:
+        return Text("-", justify="right")
+    scale = 1e-6 if unit == 'ns' else 1.0
+    return Text(f"{value * scale:,.3f}", justify="right")
+
+
 class TotalIntradayPnLWidget(Widget):
     def compose(self) -> ComposeResult:
         yield Digits("", id="total_pnl_digits")
@@ -43,9 +59,30 @@ class TotalIntradayPnLWidget(Widget):
 class RealTimeViewerWidget(Widget):
     filter = {'portfolio_name': None, 'security_type_2': None}
 
+    # most RTD messages coalesced into one update of the widget
+    MAX_COALESCE = 1000
+
+    class RtdUpdate(Message):
+        """
+        Deltas received by the subscriber worker in one wakeup, applied in order.
+        """
+        def __init__(self, position_rows: list, portfolio_pnl: dict, num_messages: int, seq: int, timestamp_ns: int) -> None:
+            self.position_rows = position_rows
+            self.portfolio_pnl = portfolio_pnl
+            self.num_messages = num_messages
+            self.seq = seq
+            self.timestamp_ns = timestamp_ns
+            super().__init__()
+
+    class RtdSnapshot(Message):
+        """
+        The book re-synced by the subscriber worker (sequence gap or server reload).
+        """
+        def __init__(self, positions_df) -> None:
+            self.positions_df = positions_df
+            super().__init__()
+
     rtd_positions_df = None
-    row_key_map = {}
-    row_key_ticker_map = {}
     
     cur_cob_date = None
     next_cob_date = None # t0
@@ -61,44 +98,99 @@ class RealTimeViewerWidget(Widget):
         self.config = Settings().get_ui_config_file()['dashboard']
         
         self.rtd_positions_df = None
+        # numeric fields of the rows as arrays, updated by row_num -> position scatter
+        self.positions : ClientPositionBook = None
         self.sub_socket = None
-        self.poller = None
         self.portfolio_id = None
+        self.pnl_reader = None
+        # net P&L of the charted portfolio: x in hours since midnight, tailed from the file
+        self.pnl_series = SeriesBuffer()
+        self.pnl_chart_state = None
+        self.portfolio_pnl = {}
+        self.portfolio_ids_by_name = {}
         self.total_pnl_widget = None
         self.table = None
         self.row_filter = None
+        self.row_mask = None
         
-        self.deque_maxlen = 10
-        self.recent_updates = deque(maxlen=self.deque_maxlen)
+        # render scheduler: rows updated since the last frame, flushed at frame_rate
+        self.frame_interval_s = 1.0 / float(self.config.get('frame_rate', 15.0))
+        self.highlight_s = float(self.config.get('highlight_s', 1.0))
+        self.dirty_rows = set()
+        # highlighted tickers: position -> fade time, and (fade time, position) in highlight order
+        self.highlighted = {}
+        self.recent_updates = deque()
         
         #self.cur_cob_date = get_current_cob_date()
         self.cur_cob_date = cur_cob_date
         self.next_cob_date = next_cob_date
 
-        self.rtd_positions_df = get_rtd_positions(self.next_cob_date, self.cur_cob_date)
         self.log(f"{self.next_cob_date}, {self.cur_cob_date}")
 
-        # get the security_id from the ticker
-        self.update_row_filter()
-        
-        self.ntp_client = ntplib.NTPClient()
         self.local_tz = Settings().get_timezone()
-    
-        try:
-            self.ntp_stats = self.ntp_client.request(Settings().get_ntp_server(), version=4)
-        except:
-            self.ntp_stats = None
+        self.clock = get_clock()
         
+        # REQ sockets (snapshot, stats) are synchronous, the delta subscription runs on the event loop
         self.zmq_context = zmq.Context()
+        self.async_context = zmq.asyncio.Context()
+        self.seq_tracker = wire_format.SequenceTracker()
+
+        # backlog: RTD messages received by the worker but not applied yet, and the age of the
+        # last one applied
+        self.num_received = 0
+        self.num_applied = 0
+        self.last_seq = None
+        self.last_timestamp_ns = None
+        self.backlog_label = None
+
+        # client-side stages (rtd_to_client, feed_to_client, decode, apply, render), shown with the server's
+        self.stats = LatencyStats()
+        self.latency_warning = SampledLog(5.0)
+        self.stats_table = None
+        self.stats_refresh_ns = 0
         
 
     async def on_key(self, event: events.Key) -> None:
         self.log(f"Key pressed: {event.key}")
         
-        if event.key == "x":
-            self.rtd_positions_df[self.row_filter].to_clipboard(index=False, header=True)
+        if event.key == "x" and self.positions is not None:
+            self.positions.to_dataframe()[self.row_filter].to_clipboard(index=False, header=True)
             logger.info("Dashboard data copied to clipboard")
         
+    def fetch_positions(self):
+        """
+        Late-join: full book from the RTD server's snapshot endpoint, then deltas with seq > snapshot seq.
+        Blocking (run off the event loop after startup).
+
+        Returns (snapshot seq or None, positions_df).
+        """
+        snapshot = request_snapshot(self.zmq_context, Settings().get_realtime_snapshot_tcp_socket(), 
+                                    timeout_ms=2000, local_tz=self.local_tz)
+        
+        if snapshot is not None:
+            header, positions_df = snapshot
+            self.log(f"Loaded RTD snapshot at seq {header['seq']} ({positions_df.shape[0]} rows)")
+            return int(header['seq']), positions_df
+
+        # RTD server not running: fall back to the database
+        return None, get_rtd_positions(self.next_cob_date, self.cur_cob_date)
+
+    def sync_positions(self, seq) -> None:
+        if seq is not None:
+            self.seq_tracker.sync(seq)
+        else:
+            self.seq_tracker.reset()
+
+    def load_positions(self, positions_df) -> None:
+        self.positions = ClientPositionBook(positions_df)
+        self.rtd_positions_df = self.positions.positions_df
+
+        self.update_row_filter()
+
+        # seeds the portfolio totals, kept current by the MSG_AGGREGATES deltas
+        self.portfolio_pnl = self.rtd_positions_df.groupby('portfolio_id')['pnl'].sum().to_dict()
+        self.portfolio_ids_by_name = dict(zip(self.rtd_positions_df['portfolio_name'], self.rtd_positions_df['portfolio_id']))
+
     def update_row_filter(self):
         # Filter the dataframe
         if self.filter['portfolio_name'] is not None and self.filter['security_type_2'] is None:
@@ -109,226 +201,260 @@ class RealTimeViewerWidget(Widget):
                     
         else:
             self.row_filter = self.rtd_positions_df['portfolio_name'] == self.rtd_positions_df['portfolio_name']   
+
+        self.row_mask = self.row_filter.to_numpy(dtype=bool)
                     
 
     def _init_table(self):
-        self.log(f"Initializing table with {self.rtd_positions_df[self.row_filter].shape[0]} rows")
-        
-        self.table.clear(True)
-        self.row_key_map = {}
-        
+        self.log(f"Initializing table with {int(self.row_mask.sum())} rows")
+
+        self.dirty_rows.clear()
+        self.highlighted.clear()
+        self.recent_updates.clear()
+
+        # the numeric fields are the book's arrays (updated in place), the others the snapshot's;
+        # cells are formatted when their row is drawn
+        data = {}
         for col_name in self.config['columns']:
-            col_display_name = self.config['columns'][col_name]['name']
-            self.table.add_column(col_display_name, key=col_name)
-            
-        for idx, row in self.rtd_positions_df[self.row_filter].iterrows():
-            styled_row = []
-            for col_name in self.config['columns']:
-                col_type = self.config['columns'][col_name]['type']
-                if 'style' in self.config['columns'][col_name]:
-                    col_style = self.config['columns'][col_name]['style']
-                else:
-                    col_style = None                
-                
-                value = row[col_name]
-                cell = format_data_table_cell(col_type, value, col_style)
-                styled_row.append(cell)
-                
-            row_key = self.table.add_row(*styled_row)
-            self.row_key_map[row['row_num']] = row_key
-            self.row_key_ticker_map[row['row_num']] = row['ticker']
-        
-        
-        
-    def format_cell(self, col_name: str, value) -> Text:
-        col_type = self.config['columns'][col_name]['type']
-        if 'style' in self.config['columns'][col_name]:
-            col_style = self.config['columns'][col_name]['style']
-        else:
-            col_style = None
-                
-        cell = format_data_table_cell(col_type, value, col_style)
-        return cell
+            if col_name in self.positions.columns:
+                data[col_name] = self.positions.columns[col_name]
+            elif col_name in self.rtd_positions_df.columns:
+                data[col_name] = self.rtd_positions_df[col_name].to_numpy()
+        self.table.set_data(data, self.row_mask)
 
- 
-    def refresh_dashboard(self) -> None:
-        events = self.poller.poll(timeout=1.0)
-        
-        if not events:
-            return
-            #self.log("Poller timeout")
-        
-        for sock, _ in events:
-            if sock == self.sub_socket:
-                data = sock.recv()
-            else:
-                return
-            
-            local_time_ns, local_dt = get_ntp_time(self.local_tz, self.ntp_stats)
-            
-            wire_format_str = 'qiddddddddd'
-            sentinel_format_str = 'i'
-            sentinel_size = struct.calcsize(sentinel_format_str)
-            bytes_per_row = struct.calcsize(wire_format_str)
-
-            # Check for the sentinel flag at the start
-            sentinel_bytes = data[:sentinel_size]
-            sentinel_flag = struct.unpack(sentinel_format_str, sentinel_bytes)[0]
-
-            if sentinel_flag != 0:
-                # refresh the table
-                self._init_table()
-                return
+    async def subscribe_worker(self) -> None:
+        """
+        Loads the book, then receives and decodes the RTD deltas on the event loop without
+        blocking it, and posts every wakeup's messages to the widget as one RtdUpdate.
+        """
+        # subscribed in on_mount, then snapshot (off the loop): deltas queued meanwhile are filtered by seq
+        seq, positions_df = await asyncio.to_thread(self.fetch_positions)
+        self.sync_positions(seq)
+        self.post_message(self.RtdSnapshot(positions_df))
+
+        while True:
+            frames = [await self.sub_socket.recv(copy=False)]
+            # whatever queued up meanwhile is coalesced into the same update
+            while len(frames) < self.MAX_COALESCE:
+                try:
+                    frames.append(await self.sub_socket.recv(zmq.NOBLOCK, copy=False))
+                except zmq.Again:
+                    break
+
+            local_time_ns = self.clock.now_ns()
+            decode_start_ns = time.perf_counter_ns()
+            position_rows = []
+            portfolio_pnl = {}
+            header = None
+
+            for frame in frames:
+                try:
+                    header, rows = wire_format.decode(frame)
+                except ValueError as e:
+                    logger.warning(f"Dropping RTD message: {e}")
+                    continue
 
-            # Process the rest of the data
-            for i in range(sentinel_size, len(data), bytes_per_row):
-                chunk = data[i : i + bytes_per_row]
-                msg_local_time_ns, row_num, quantity, price, bid, ask, mkt_value, pct_aum, gain_loss, pct_chg, pnl = struct.unpack(wire_format_str, chunk)
-                
-                # self.log(f"{row_num}, {quantity}, {price}, {bid}, {ask}")
+                if self.seq_tracker.is_stale(header['seq']):
+                    # already contained in the snapshot
+                    continue
 
-                # TODO: add latency warning if latency > 100 ms               
-                latency_ns = local_time_ns - msg_local_time_ns
-                #self.log(f"Latency: {latency_ns / 1e6:.2f} ms")
-                
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'quantity'] = quantity
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'price'] = price
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'bid'] = bid
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'ask'] = ask
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'mkt_value'] = mkt_value
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'pct_aum'] = pct_aum
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'gain_loss'] = gain_loss
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'pct_chg'] = pct_chg
-                self.rtd_positions_df.loc[self.rtd_positions_df['row_num'] == row_num, 'pnl'] = pnl
-                
-                row_key = self.row_key_map.get(row_num)
-                if row_key is None:
+                missed = self.seq_tracker.update(header['seq'])
+                if missed > 0 or header['msg_type'] == wire_format.MSG_RELOAD:
+                    if missed > 0:
+                        self.log(f"RTD sequence gap: missed {missed} message(s) before seq {header['seq']}")
+                    # re-sync from the snapshot endpoint (off the loop), the deltas so far are in it
+                    seq, positions_df = await asyncio.to_thread(self.fetch_positions)
+                    self.sync_positions(seq)
+                    self.post_message(self.RtdSnapshot(positions_df))
+                    position_rows = []
+                    portfolio_pnl = {}
                     continue
-                
-                if len(self.recent_updates) == self.deque_maxlen:            
-                    least_recent_row_num = self.recent_updates[0]
-                    lr_row_key = self.row_key_map.get(least_recent_row_num)
-                    if lr_row_key is not None:
-                        lr_ticker = self.format_cell('ticker', self.row_key_ticker_map.get(least_recent_row_num))
-                        self.table.update_cell(lr_row_key, 'ticker', lr_ticker, update_width=False)
-                    
-                self.recent_updates.append(row_num)
-                
-                ticker = self.format_cell('ticker', self.row_key_ticker_map.get(row_num))
-                text_len = len(ticker)
-                ticker.stylize("bold magenta", 0, text_len)
-                self.table.update_cell(row_key, 'ticker', ticker, update_width=False)
-                
-                quantity_text = self.format_cell('quantity', quantity)
-                self.table.update_cell(row_key, 'quantity', quantity_text, update_width=True)
 
-                price_text = self.format_cell('price', price)
-                self.table.update_cell(row_key, 'price', price_text, update_width=True)
-                
-                bid_text = self.format_cell('bid', bid)
-                self.table.update_cell(row_key, 'bid', bid_text, update_width=True)
-                
-                ask_text = self.format_cell('ask', ask)
-                self.table.update_cell(row_key, 'ask', ask_text, update_width=True)
+                if header['msg_type'] == wire_format.MSG_AGGREGATES:
+                    # running totals published by the server: no scan of the rows
+                    portfolio_totals = rows[rows['dimension'] == AGG_PORTFOLIO]
+                    portfolio_pnl.update(zip(portfolio_totals['portfolio_id'].tolist(), portfolio_totals['pnl'].tolist()))
+
+                elif header['msg_type'] == wire_format.MSG_POSITION_ROWS:
+                    latency_ns = local_time_ns - int(header['timestamp_ns'])
+                    self.stats.record('rtd_to_client', latency_ns)
+                    self.stats.record_many('feed_to_client', local_time_ns - rows['quote_timestamp_ns'])
+                    if latency_ns > 100e6 and self.latency_warning.ready():
+                        self.log(f"RTD latency: {latency_ns / 1e6:.2f} ms")
+                    position_rows.append(rows)
+
+            if len(position_rows) > 0:
+                self.stats.record('decode', time.perf_counter_ns() - decode_start_ns)
+
+            self.num_received += len(frames)
+            if header is not None:
+                self.post_message(self.RtdUpdate(position_rows, portfolio_pnl, len(frames),
+                                                 int(header['seq']), int(header['timestamp_ns'])))
+            else:
+                self.num_applied += len(frames)
+
+    def on_real_time_viewer_widget_rtd_update(self, message: RtdUpdate) -> None:
+        apply_start_ns = time.perf_counter_ns()
+
+        # whole messages in one pass: row_num -> position gather, one scatter per field;
+        # the cells are rendered by the next frame
+        for rows in message.position_rows:
+            positions, row_nums = self.positions.apply_rows(rows)
+            self.dirty_rows.update(row_nums.tolist())
+        self.portfolio_pnl.update(message.portfolio_pnl)
+
+        self.num_applied += message.num_messages
+        self.last_seq = message.seq
+        self.last_timestamp_ns = message.timestamp_ns
+        if len(message.position_rows) > 0:
+            self.stats.record('apply', time.perf_counter_ns() - apply_start_ns)
+
+    def on_real_time_viewer_widget_rtd_snapshot(self, message: RtdSnapshot) -> None:
+        self.load_positions(message.positions_df)
+        self._init_table()
 
-                mkt_value_text = self.format_cell('mkt_value', mkt_value)
-                self.table.update_cell(row_key, 'mkt_value', mkt_value_text, update_width=True)
-                
-                pct_aum_text = self.format_cell('pct_aum', pct_aum)
-                self.table.update_cell(row_key, 'pct_aum', pct_aum_text, update_width=True)
-                
-                gain_loss_text = self.format_cell('gain_loss', gain_loss)
-                self.table.update_cell(row_key, 'gain_loss', gain_loss_text, update_width=True)
-                
-                pct_chg_text = self.format_cell('pct_chg', pct_chg)
-                self.table.update_cell(row_key, 'pct_chg', pct_chg_text, update_width=True)
-                
-                pnl_text = self.format_cell('pnl', pnl)
-                self.table.update_cell(row_key, 'pnl', pnl_text, update_width=True)
-                
-        total_intraday_pnl = self.rtd_positions_df[self.row_filter]['pnl'].sum()
+    def update_total_pnl(self) -> None:
+        if self.filter['security_type_2'] is not None:
+            # no running total by security type
+            total_intraday_pnl = self.positions.total('pnl', self.row_mask)
+        elif self.filter['portfolio_name'] is not None:
+            total_intraday_pnl = self.portfolio_pnl.get(self.portfolio_ids_by_name.get(self.filter['portfolio_name']), 0.0)
+        else:
+            total_intraday_pnl = sum(self.portfolio_pnl.values())
         #self.total_pnl_widget.update(f"{fmt_ccy_amt(total_intraday_pnl)}")
         
         total_intraday_pnl_str = f"{total_intraday_pnl:32,.2f}" 
         
         
         self.total_pnl_widget.update(f"{total_intraday_pnl_str}")
-        
-        
-        
+
+    def update_backlog(self) -> None:
+        backlog = self.num_received - self.num_applied
+        if self.last_timestamp_ns is None:
+            self.backlog_label.update(Text(f"RTD: waiting for updates │ backlog {backlog:,} msgs", style="dim"))
+            return
+
+        lag_ms = (self.clock.now_ns() - self.last_timestamp_ns) * 1e-6
+        style = "bold red" if backlog > self.MAX_COALESCE or lag_ms > 1000 else "yellow" if backlog > 0 or lag_ms > 100 else "green"
+        self.backlog_label.update(Text(f"RTD seq {self.last_seq:,} │ backlog {backlog:,} msgs │ last update {lag_ms:,.0f} ms ago", style=style))
+
+    def render_frame(self) -> None:
+        """
+        Redraws the rows updated since the last frame that are in the viewport, highlights
+        their tickers and fades the highlights that expired.
+        """
+        if self.positions is None:
+            # book not loaded yet
+            self.update_backlog()
+            return
+
+        start_ns = time.perf_counter_ns()
+        now = time.monotonic()
+
+        positions = self.positions.positions(list(self.dirty_rows))
+        positions = positions[positions >= 0].tolist()
+        self.dirty_rows.clear()
+
+        if len(positions) > 0:
+            # re-formatted when drawn, only the rows in the viewport are redrawn
+            self.table.refresh_rows(positions)
+
+            fade_time = now + self.highlight_s
+            self.table.set_cell_style([position for position in positions if position not in self.highlighted],
+                                      'ticker', "bold magenta")
+            for position in positions:
+                self.highlighted[position] = fade_time
+                self.recent_updates.append((fade_time, position))
+
+        # fade: a row updated again meanwhile has a later fade time and stays highlighted
+        faded = []
+        while len(self.recent_updates) > 0 and self.recent_updates[0][0] <= now:
+            fade_time, position = self.recent_updates.popleft()
+            if self.highlighted.get(position) != fade_time:
+                continue
+            del self.highlighted[position]
+            faded.append(position)
+        self.table.set_cell_style(faded, 'ticker', None)
+
+        if len(positions) > 0:
+            self.stats.record('render', time.perf_counter_ns() - start_ns)
+
+        self.update_total_pnl()
+        self.update_backlog()
+
     def refresh_intraday_pnl_chart(self) -> None:
-        file_path = Settings().get_intraday_pnl_files_dir() / f'intraday_pnl_{self.cur_cob_date}_{self.portfolio_id}.bin'
-            
-        # ensure file is created
-        #assert file_path.exists()
-        if not file_path.exists():
+        file_path = intraday_pnl_file_path(Settings().get_intraday_pnl_files_dir(), self.cur_cob_date, self.portfolio_id)
+
+        # tail the mmap'ed series file from the last offset read for this portfolio
+        if self.pnl_reader is None or self.pnl_reader.path != file_path:
+            self.pnl_reader = PnlSeriesReader(file_path)
+            self.pnl_series.clear()
+            self.pnl_chart_state = None
+
+        records = self.pnl_reader.tail()
+        if records is None:
             return
-            
-        timestamps = []
-        timestamp_ticks = []
-        total_pnls = []           
-        with open(file_path, 'rb') as f:
-            data = f.read()
-            
-            # wire format means the binary data format that is written to the file
-            # iqd = int, long, double
-            # means 4 bytes, 8 bytes, 8 bytes
-            for i in range(0, len(data), struct.calcsize('iqd')):
-                chunk = data[i : i + struct.calcsize('iqd')]
-                portfolio_id, timestamp, total_pnl = struct.unpack('iqd', chunk)
-                if portfolio_id != self.portfolio_id:
-                    continue
-                
-                plt_timestamp_ns = timestamp - self.t_zero_ns
-                plt_timestamp_hrs = plt_timestamp_ns / 1e9 / 3600
-                
-                
-                if plt_timestamp_hrs > 12:
-                    am_pm = 'PM'
-                else:
-                    am_pm = 'AM'
-                
-                # # get the fractional part of plt_timestamp_hrs
-                plt_timestamps_frac = plt_timestamp_hrs % 1
-                
-                plt_timestamps_mins = round(plt_timestamps_frac * 60)                
-                
-                # truncate the fractional part of plt_timestamp_hrs in 12-hour format
-                plt_timestamp_hrs_int = int(plt_timestamp_hrs) % 12
-                            
-                #plt_timestamp_tick = 'HH:MM:SS'
-                plt_timestamp_tick = str(plt_timestamp_hrs_int) + ':' + str(plt_timestamps_mins).zfill(2) + am_pm
-             
-                timestamps.append(plt_timestamp_hrs)
-                timestamp_ticks.append(plt_timestamp_tick)
-                total_pnls.append(total_pnl)
-        
-        
+        if records.shape[0] > 0:
+            self.pnl_series.append((records['timestamp_ns'] - self.t_zero_ns) / 3600e9, records['net'])
+
         plt_wrapper = self.query_one(PlotextPlot)
+        width = max(plt_wrapper.size.width, 40)
+
+        # redrawn only when points arrived or the widget was resized
+        chart_state = (self.pnl_series.size, width)
+        if chart_state == self.pnl_chart_state or self.pnl_series.size == 0:
+            return
+        self.pnl_chart_state = chart_state
+
+        # braille: 2 dots per character column
+        timestamps, total_pnls = minmax_downsample(self.pnl_series.x, self.pnl_series.y, 2 * width)
+        tick_positions, tick_labels = time_ticks(float(timestamps[0]), float(timestamps[-1]), width // 10)
+
         plt = plt_wrapper.plt
         plt.clear_data()
         plt.clear_figure()
-        #dates = plotext.datetimes_to_string(timestamps)
-        plt.xticks(timestamps, timestamp_ticks)
-        plt.plot(timestamps, total_pnls, marker='braille')
+        plt.xticks(tick_positions, tick_labels)
+        plt.plot(timestamps.tolist(), total_pnls.tolist(), marker='braille')
         plt.title("Intraday P&L")
         plt_wrapper.refresh()       
             
+    def refresh_latency_stats(self) -> None:
+        # the server is asked at most once per second
+        now_ns = time.monotonic_ns()
+        if now_ns < self.stats_refresh_ns:
+            return
+        self.stats_refresh_ns = now_ns + 1_000_000_000
+
+        server_stats = request_stats(self.zmq_context, Settings().get_realtime_stats_tcp_socket(), timeout_ms=200)
+        histograms = [('server', h) for h in server_stats['latency'].values()] if server_stats is not None else []
+        histograms += [('client', h) for h in self.stats.as_dict().values()]
+
+        self.stats_table.clear(columns=True)
+        for col_name in ['Stage', 'Source', 'Count', 'Mean', 'p50', 'p90', 'p99', 'p99.9', 'Max']:
+            self.stats_table.add_column(col_name)
+
+        for source, histogram in histograms:
+            values = [format_latency(histogram[key], histogram['unit']) for key in ['mean', 'p50', 'p90', 'p99', 'p99.9', 'max']]
+            self.stats_table.add_row(histogram['name'], source, Text(f"{histogram['count']:,}", justify="right"), *values)
+
+        if server_stats is None:
+            self.stats_table.add_row("RTD stats endpoint not answering", "server")
+
     def automatic_refresh(self):
-        if self.query_one(ContentSwitcher).current == "dashboard":
-            self.refresh_dashboard()
-            #self.run_worker(self.refresh_dashboard(), exclusive=True)
-                   
-        elif self.query_one(ContentSwitcher).current == "intraday_pnl_chart":
+        # the deltas are consumed by the subscriber worker whatever is shown
+        if self.query_one(ContentSwitcher).current == "intraday_pnl_chart":
             self.refresh_intraday_pnl_chart()
+
+        elif self.query_one(ContentSwitcher).current == "latency_stats":
+            self.refresh_latency_stats()
         
         super().automatic_refresh()
 
 
 
     def compose(self) -> ComposeResult:
-        self.table = DataTable(id="dashboard", cursor_type="row")
-        self.table.fixed_columns = 2
+        self.table = VirtualGrid(self.config['columns'], fixed_columns=2, id="dashboard")
+        self.stats_table = DataTable(id="latency_stats", cursor_type="row")
         
         tree: Tree[dict] = Tree("Dashboard", id="reports_selector", classes="box1", data={"type": "root"})
         tree.root.expand()
@@ -357,39 +483,44 @@ class RealTimeViewerWidget(Widget):
             portfolio.add_leaf("P&L Chart", 
                                data={"type": "chart_node", "portfolio_id": row.portfolio_id, "portfolio_name": row.portfolio_name})
 
+        tree.root.add_leaf("Latency", data={"type": "latency_node"})
                 
         db_conn.close()
         
         
         self.total_pnl_widget = TotalIntradayPnLWidget()
+        self.backlog_label = Static("", id="rtd_backlog")
         
         yield tree
         with Vertical():
             yield self.total_pnl_widget
+            yield self.backlog_label
             with ContentSwitcher(initial="dashboard", id="content_switcher", classes="right_dock"):
                 yield self.table
                 yield PlotextPlot(id="intraday_pnl_chart")
+                yield self.stats_table
 
     def on_mount(self) -> None:
-        self.sub_socket = self.zmq_context.socket(zmq.SUB)
+        self.sub_socket = self.async_context.socket(zmq.SUB)
         self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, "")
-        self.sub_socket.setsockopt(zmq.CONFLATE, 1)
         self.sub_socket.connect(Settings().get_realtime_calculation_tcp_socket())
         
-        self.poller = zmq.Poller()
-        self.poller.register(self.sub_socket, zmq.POLLIN)
-        
-        self._init_table()
+        # the book is loaded by the worker (RtdSnapshot)
+        self.run_worker(self.subscribe_worker(), name="rtd_subscriber", group="rtd", exclusive=True)
         
         next_cob_date = get_next_cob_date() # 0:00:00
         next_cob_date_str = next_cob_date.strftime('%Y-%m-%d %H:%M:%S')
         next_cob_datetime = datetime.strptime(next_cob_date_str, '%Y-%m-%d %H:%M:%S')
-        self.t_zero_ns = next_cob_datetime.timestamp() * 1e9
+        self.t_zero_ns = int(next_cob_datetime.timestamp()) * 1_000_000_000
         
         self.auto_refresh = 0.1
+        self.set_interval(self.frame_interval_s, self.render_frame)
 
     def on_unmount(self) -> None:
-        pass
+        self.workers.cancel_group(self, "rtd")
+        if self.sub_socket is not None:
+            self.sub_socket.close(linger=0)
+        self.async_context.term()
 
 
     def on_tree_node_selected(self, message: Tree.NodeSelected) -> None:
@@ -400,6 +531,12 @@ class RealTimeViewerWidget(Widget):
             self.refresh_intraday_pnl_chart()            
             self.query_one(ContentSwitcher).current = "intraday_pnl_chart"
             return
+
+        elif message.node.data["type"] == "latency_node":
+            self.stats_refresh_ns = 0
+            self.refresh_latency_stats()
+            self.query_one(ContentSwitcher).current = "latency_stats"
+            return
         
         else:
             self.query_one(ContentSwitcher).current = "dashboard"
@@ -426,8 +563,9 @@ class RealTimeViewerWidget(Widget):
                 self.warn(f"Unknown node type: {message.node.data['type']}")
                 return
             
-            self.update_row_filter()            
-            self._init_table()
+            if self.positions is not None:
+                self.update_row_filter()
+                self.table.set_filter(self.row_mask)
 
 class DashboardScreen(Screen):
     
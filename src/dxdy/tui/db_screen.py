@@ -6,24 +6,22 @@ from textual.containers import Horizontal, Vertical
 from textual.screen import Screen
 from textual.widget import Widget
 from textual.widgets import (
-    DataTable,
     Tree,
     Header,
     Footer,
-    Button,
     Input,
 )
 from textual.events import Key
 from textual.message import Message
 
-from .tui_utils import format_data_table_cell, DxDyLogMsg
+from .tui_utils import DxDyLogMsg
+from .virtual_grid import VirtualGrid
 
 from ..settings import Settings
 from ..db import schema
 
 
 from loguru import logger
-import re
 
 class DuckDbTable(Widget):
     
@@ -40,45 +38,28 @@ class DuckDbTable(Widget):
     sql_query = None
     
     """
-    A widget that displays data from a DuckDB query in a Textual DataTable.
-    Includes basic pagination and a keyboard shortcut to copy the entire DataFrame.
+    A widget that displays data from a DuckDB query in a virtualized grid.
+    Includes sorting by column header and a keyboard shortcut to copy the entire DataFrame.
     """
 
-    def __init__(self, table_format=None, rows_per_page: int = 3300, **kwargs):
+    def __init__(self, table_format=None, **kwargs):
         """
         :param table_format: An optional list of columns to display and format.
-        :param rows_per_page: How many rows to display per page by default.
         """
         super().__init__(**kwargs)
         self.table_format = table_format
-        self.rows_per_page = rows_per_page
 
         self.df = None
         self.table = None
-        self.current_page = 0
-        self.total_pages = 0
-        self.cur_sort_col = None
         
         self.cur_row = None
-        
-        self.sort_order = -1
 
     def compose(self) -> ComposeResult:
-        self.table = DataTable( id="duckdb_data_table", cursor_type="row")
-        self.table.fixed_columns = 2
-
-        self.prev_button = Button("Prev", id="btn-prev", variant="primary")
-        self.next_button = Button("Next", id="btn-next", variant="primary")
-        
-            
         with Vertical():
             with Horizontal(id="table-container"):
-                self.table = DataTable(id="duckdb_data_table", cursor_type="row")
-                self.table.fixed_columns = 2
+                self.table = VirtualGrid(fixed_columns=2, id="duckdb_data_table")
                 yield self.table
             # with Horizontal(id="db_widget_controls"):
-            #     yield Button("Prev", id="btn-prev", variant="primary")
-            #     yield Button("Next", id="btn-next", variant="primary")
             #     yield Input(id="db_widget_input")
 
         
@@ -103,124 +84,18 @@ class DuckDbTable(Widget):
         input_widget.clear()
 
 
-    def on_button_pressed(self, event: Button.Pressed) -> None:
-        """
-        Handles button presses for pagination.
-        """
-        if not self.df is None:
-            if event.button.id == "btn-prev":
-                self.current_page = max(self.current_page - 1, 0)
-                self.refresh_table()
-                
-                #self.next_button.disabled = False
-                
-            elif event.button.id == "btn-next":
-                if self.current_page < self.total_pages - 1:
-                    self.current_page = min(self.current_page + 1, self.total_pages - 1)
-                    self.refresh_table()
-                    
-                    # if self.current_page > 0: 
-                    #     self.prev_button.disabled = False
-                else:
-                    #self.next_button.disabled = True
-                    pass
-
-    def on_data_table_cell_highlighted(self, event : DataTable.CellHighlighted) -> None:
-        self.log(f"Cell selected: {event.coordinate}")
-
-    # RowSelected(data_table, cursor_row, row_key)
-    def on_data_table_row_selected(self, event : DataTable.RowSelected) -> None:
-        self.log(f"Row selected: {event.cursor_row}")
-        self.cur_row = event.cursor_row
-        
-        
-    # HeaderSelected(data_table, column_key, column_index, label)
-    def on_data_table_header_selected(self, event: DataTable.HeaderSelected) -> None:
-        """
-        Sorts the DataFrame by the selected column.
-        """
-        if self.df is not None:
-            if self.table_format is None:
-                col = self.df.columns[event.column_index]
-            else:
-                self.log(f"{event.column_index} of {self.table_format.keys()}")
-                self.log(f"{self.df.columns}")
-                
-                view_idx = event.column_index
-                
-                columns = []
-                for col_name in self.table_format.keys():
-                    if col_name in self.df.columns:
-                        columns.append(col_name)
-
-                col = columns[view_idx]
-                self.log(f"{columns}")
-                # # ToMl
-                # col = list(self.table_format.keys())[event.column_index]
-            
-            self.sort_order *= -1
-            
-            
-            if self.sort_order == 1:
-                self.set_sql_query_sort_order(col, "ASC")
-            else:        
-                self.set_sql_query_sort_order(col, "DESC")
-                
-            
-    def set_sql_query_sort_order(self, col, order):
-        sql_without_order_by = re.sub(r'\bORDER BY\b.*', '', self.original_sql_query, 
-                                      flags=re.IGNORECASE | re.DOTALL)
-        
-        self.sql_query = sql_without_order_by  + f"ORDER BY {col} {order}"
-
-        self.cur_sort_col = col
-
-        # self.log(f"{sql_without_order_by}")
-        # self.log(f"{self.sql_query}")
-        
-        db_conn = Settings().get_db_connection()
-        self.df = db_conn.execute(self.sql_query).fetchdf()
-        
-        # self.log(f"{self.df}")
-        
-        
-        self.df.fillna(0.00, inplace=True)
-        db_conn.close()
-        
-        # Filter columns if display_cols is provided
-        # if self.display_cols is not None:
-        #     cols_to_drop = [col for col in self.df.columns if col not in self.display_cols]
-        #     self.df.drop(columns=cols_to_drop, inplace=True)
-
-        # Calculate total pages
-        num_rows = len(self.df)
-        self.total_pages = max((num_rows + self.rows_per_page - 1) // self.rows_per_page, 1)
-        self.current_page = 0
-
-        self.table.clear(columns=True)
-        
-        if self.table_format is None:
-            for col in self.df.columns:
-                self.table.add_column(col)
-        else:
-            for col_name in self.table_format:
-                if col_name in self.df.columns:
-                    col_display_name = self.table_format[col_name]['name']
-                    self.table.add_column(col_display_name, key=col_name)
-            
-                
-        # Populate first page
-        self.refresh_table()
+    # RowSelected(grid, row, position)
+    def on_virtual_grid_row_selected(self, event : VirtualGrid.RowSelected) -> None:
+        self.log(f"Row selected: {event.row}")
+        self.cur_row = event.row
         
         
     def set_sql_query(self, sql_query: str) -> None:
         """
-        Runs the provided SQL query in DuckDB, stores the result DataFrame, calculates pages,
-        and populates the table (first page).
+        Runs the provided SQL query in DuckDB, stores the result DataFrame and shows it in the grid.
+        Sorting (header click) re-orders the grid's arrays, the query is not re-run.
         """
         self.sql_query = sql_query
-        self.original_sql_query = sql_query
-
 
         db_conn = Settings().get_db_connection()
         self.df = db_conn.execute(self.sql_query).fetchdf()
@@ -229,83 +104,25 @@ class DuckDbTable(Widget):
         
         self.df.fillna(0.00, inplace=True)
         db_conn.close()
-        
-        # Filter columns if display_cols is provided
-        # if self.display_cols is not None:
-        #     cols_to_drop = [col for col in self.df.columns if col not in self.display_cols]
-        #     self.df.drop(columns=cols_to_drop, inplace=True)
-
-        # Calculate total pages
-        num_rows = len(self.df)
-        self.total_pages = max((num_rows + self.rows_per_page - 1) // self.rows_per_page, 1)
-        self.current_page = 0
 
-        self.table.clear(columns=True)
-        
-        if self.table_format is None:
-            for col in self.df.columns:
-                self.table.add_column(col)
-        else:
-            for col_name in self.table_format:
-                if col_name in self.df.columns:
-                    col_display_name = self.table_format[col_name]['name']
-                    self.table.add_column(col_display_name, key=col_name)
-            
-                
-        # Populate first page
         self.refresh_table()
         
-        # if self.current_page == 0: 
-        #     self.prev_button.disabled = True
-        
-        # if self.total_pages == 1:
-        #     self.next_button.disabled = True
-            
-        
 
     def refresh_table(self) -> None:
         """
-        Populates the DataTable with the current page’s subset of the data.
+        Shows the DataFrame's columns in the grid, rows are formatted when scrolled into view.
         """
         if self.df is None:
             return
 
-        # Calculate page boundaries
-        start_idx = self.current_page * self.rows_per_page
-        end_idx = start_idx + self.rows_per_page
-
-        # Use a slice of the DataFrame for the current page
-        df_subset = self.df.iloc[start_idx:end_idx]
-
-        # Convert the subset to rows (list of tuples)
-        df_lst = list(df_subset.itertuples(index=False, name=None))
-
-        # Clear the table and re-populate
-        self.table.clear(columns=False)  
-        
         if self.table_format is None:
-            self.table.add_rows(df_lst)
+            columns = {col_name: {'name': col_name} for col_name in self.df.columns}
         else:
-            for idx, row in df_subset.iterrows():
-                styled_row = []
-                for col_name in self.table_format:
-                    if col_name in df_subset.columns:
-                        col_type = self.table_format[col_name]['type']
-                        if 'style' in self.table_format[col_name]:
-                            col_style = self.table_format[col_name]['style']
-                        else:
-                            col_style = None                
-                        
-                        value = row[col_name]
-                        cell = format_data_table_cell(col_type, value, col_style)
-                        styled_row.append(cell)
-                self.table.add_row(*styled_row)
-                
+            columns = {col_name: self.table_format[col_name] for col_name in self.table_format 
+                       if col_name in self.df.columns}
 
-        # self.log(
-        #     f"Showing page {self.current_page+1}/{self.total_pages}, "
-        #     f"rows {start_idx+1} to {min(end_idx, len(self.df))} of {len(self.df)}."
-        # )
+        self.table.set_columns(columns)
+        self.table.set_data({col_name: self.df[col_name].to_numpy() for col_name in columns})
 
     def on_key(self, event: Key) -> None:
         #self.log(f"Key pressed: {event.key}")
@@ -326,7 +143,8 @@ class DuckDbTable(Widget):
                         if col_name in self.df.columns:
                             cols.append(col_name)
                     
-                self.df[cols].to_clipboard(index=False, header=True)
+                # in the order shown
+                self.df[cols].iloc[self.table.order].to_clipboard(index=False, header=True)
             
                 query = self.sql_query.strip()
                 query = query.replace('\t', ' ').replace('\n', ' ')
@@ -57,7 +57,7 @@ from .query_screen import QueryScreen
 
 from ..settings import Settings
 from ..db import schema
-from ..rtd.rtd_calcs import get_rtd_positions, get_ntp_time
+from ..rtd.rtd_calcs import get_rtd_positions
 from ..db.utils import get_current_cob_date
 from ..tui.tui_utils import DxDyLogMsg
 
@@ -2,7 +2,11 @@
 
 
 
+import asyncio
+
 import pandas as pd
+import zmq
+import zmq.asyncio
 
 from textual.app import ComposeResult
 from textual.containers import Vertical
@@ -15,9 +19,14 @@ from textual_plotext import PlotextPlot
 import plotext
 
 from ..settings import Settings
-from ..db.utils import get_current_cob_date
+from ..db.utils import get_current_cob_date, get_next_cob_date
+from ..rtd import wire_format
+from ..rtd.aggregates import AGG_SECTOR, UNKNOWN_SECTOR
+from ..rtd.snapshot import request_snapshot
 from .tui_utils import format_currency
 
+from loguru import logger
+
 from datetime import timedelta
 
 
@@ -52,6 +61,17 @@ class RiskScreen(Screen):
         self.cob_date = self.dates[self.cob_date_idx]
         
         db_conn.close()
+
+        # live sectors (one step past the last close): sector market values of the RTD book,
+        # seeded from its snapshot and kept current by the MSG_AGGREGATES deltas
+        self.live = False
+        self.trading_date = get_next_cob_date()
+        self.live_sectors = {}
+        self.live_sectors_changed = False
+        self.zmq_context = zmq.Context()
+        self.async_context = zmq.asyncio.Context()
+        self.sub_socket = None
+        self.seq_tracker = wire_format.SequenceTracker()
     
     def compose(self) -> ComposeResult:
         tree: Tree[dict] = Tree("Portfolios", id="reports_selector", classes="box1", data={"type": "root"})
@@ -101,9 +121,99 @@ class RiskScreen(Screen):
         self.update_chart()
         
         
+    def fetch_live_sectors(self):
+        """
+        Sector market values of the RTD book from its snapshot endpoint (blocking).
+
+        Returns (snapshot seq, { portfolio_id: { sector: mkt_value } }), (None, {}) when the
+        RTD server is not running.
+        """
+        snapshot = request_snapshot(self.zmq_context, Settings().get_realtime_snapshot_tcp_socket(), timeout_ms=2000)
+        if snapshot is None:
+            return None, {}
+
+        header, positions_df = snapshot
+        sectors = positions_df['sector_name'].fillna(UNKNOWN_SECTOR) if 'sector_name' in positions_df.columns else UNKNOWN_SECTOR
+        totals = positions_df.assign(sector_name=sectors).groupby(['portfolio_id', 'sector_name'])['mkt_value'].sum()
+
+        live_sectors = {}
+        for (portfolio_id, sector), mkt_value in totals.items():
+            live_sectors.setdefault(int(portfolio_id), {})[sector] = float(mkt_value)
+        return int(header['seq']), live_sectors
+
+    async def resync_live_sectors(self) -> None:
+        seq, self.live_sectors = await asyncio.to_thread(self.fetch_live_sectors)
+        if seq is not None:
+            self.seq_tracker.sync(seq)
+        else:
+            self.seq_tracker.reset()
+        self.live_sectors_changed = True
+
+    async def aggregates_worker(self) -> None:
+        """
+        Keeps the live sectors current from the RTD server's MSG_AGGREGATES deltas.
+        """
+        await self.resync_live_sectors()
+
+        while True:
+            frame = await self.sub_socket.recv(copy=False)
+            try:
+                header, rows = wire_format.decode(frame)
+            except ValueError as e:
+                logger.warning(f"Dropping RTD message: {e}")
+                continue
+
+            if self.seq_tracker.is_stale(header['seq']):
+                continue
+
+            missed = self.seq_tracker.update(header['seq'])
+            if missed > 0 or header['msg_type'] == wire_format.MSG_RELOAD:
+                await self.resync_live_sectors()
+                continue
+
+            if header['msg_type'] == wire_format.MSG_AGGREGATES:
+                sector_rows = rows[rows['dimension'] == AGG_SECTOR]
+                for portfolio_id, key, mkt_value in zip(sector_rows['portfolio_id'].tolist(), sector_rows['key'].tolist(),
+                                                        sector_rows['mkt_value'].tolist()):
+                    self.live_sectors.setdefault(portfolio_id, {})[key.decode()] = mkt_value
+                self.live_sectors_changed = self.live_sectors_changed or sector_rows.shape[0] > 0
+
+    def refresh_live_chart(self) -> None:
+        if self.live and self.live_sectors_changed and self.active_tab_id == "sector_allocations":
+            self.update_chart()
+
+    def plot_live_sectors(self) -> None:
+        self.live_sectors_changed = False
+        if self.portfolio_id is None:
+            return
+
+        sectors = sorted(self.live_sectors.get(int(self.portfolio_id), {}).items())
+        if len(sectors) < 2: # not enough data to plot
+            self.log(f"Not enough live data to plot: {len(sectors)}")
+            return
+
+        x_data = [sector for sector, _ in sectors]
+        y_data = [mkt_value for _, mkt_value in sectors]
+
+        plt_wrapper = self.query_one("#sector_chart")
+        plt = plt_wrapper.plt
+        plt.clear_data()
+        plt.clear_figure()
+        try:
+            plt.bar(x_data, y_data, orientation="horizontal", width=1/128)
+            plt.xlim(min(y_data), max(y_data))
+            plt.title(f"{self.trading_date.strftime('%Y-%m-%d')} (live) - {self.portfolio_name} - {self.portfolio_ccy}")
+            plt_wrapper.refresh()
+        except Exception as e:
+            self.log(f"Error plotting chart: {e}")
+
     def update_chart(self) -> None:
         self.log(f"Updating chart for {self.cob_date} - {self.portfolio_id} - {self.active_tab_id}")
         
+        if self.live and self.active_tab_id == "sector_allocations":
+            # strategies are not aggregated by the RTD server: that tab stays on the close
+            self.plot_live_sectors()
+            return
         
         db_conn = Settings().get_db_connection()
         
@@ -392,7 +502,19 @@ class RiskScreen(Screen):
         
         
     def on_mount(self) -> None:
+        self.sub_socket = self.async_context.socket(zmq.SUB)
+        self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, "")
+        self.sub_socket.connect(Settings().get_realtime_calculation_tcp_socket())
+        self.run_worker(self.aggregates_worker(), name="rtd_aggregates", group="rtd", exclusive=True)
+        self.set_interval(1.0, self.refresh_live_chart)
+
         self.update_chart()
+
+    def on_unmount(self) -> None:
+        self.workers.cancel_group(self, "rtd")
+        if self.sub_socket is not None:
+            self.sub_socket.close(linger=0)
+        self.async_context.term()
         
         
         
@@ -417,7 +539,12 @@ class RiskScreen(Screen):
             
             
     def on_key(self, event: Key) -> None:
-        if event.key == "comma":
+        if event.key == "comma" and self.live:
+            # back to the last close
+            self.live = False
+            self.update_chart()
+
+        elif event.key == "comma":
             self.cob_date_idx -= 1
             if self.cob_date_idx < 0:
                 self.cob_date_idx = 0
@@ -425,6 +552,12 @@ class RiskScreen(Screen):
             self.cob_date = self.dates[self.cob_date_idx]
             self.update_chart()
             
+        elif event.key == "full_stop" and self.cob_date_idx == len(self.dates) - 1:
+            # past the last close: the live book's sectors
+            self.live = True
+            self.live_sectors_changed = True
+            self.update_chart()
+
         elif event.key == "full_stop":
             self.cob_date_idx += 1
             if self.cob_date_idx >= len(self.dates):
@@ -437,6 +570,7 @@ class RiskScreen(Screen):
             self.log(f"Key pressed: {event.key}")
 
     def on_screen_resume(self) -> None:
+        self.live = False
         self.cob_date_idx = len(self.dates) - 1
         self.cob_date = self.dates[self.cob_date_idx]
         # self.update_chart()
@@ -0,0 +1,380 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+#
+# Virtualized grid over a columnar store: only the rows in the viewport are formatted and drawn.
+#
+#   data { key -> array[size] }  (shared, e.g. ClientPositionBook.columns: updated in place)
+#        │
+#        ▼
+#   order = flatnonzero(filter mask), argsort'ed by the sort column ── view row -> position
+#        │
+#        ▼
+#   render_line(y) ──> position = order[scroll_y + y - 1] ──> row cache (formatted on first draw)
+#                                                             dropped by refresh_rows(positions)
+#
+# Column widths start at the header labels and grow with the widest cell drawn so far. The
+# first `fixed_columns` columns do not scroll horizontally.
+#
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from rich.text import Text
+from textual import events
+from textual.binding import Binding
+from textual.geometry import Region, Size
+from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from .tui_utils import format_data_table_cell
+
+
+def format_grid_cell(value) -> Text:
+    # untyped columns (no 'type' in the column spec): as str, numbers right justified
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return Text('')
+    if isinstance(value, (int, float, np.number)):
+        return Text(str(value), justify='right')
+    return Text(str(value))
+
+
+class VirtualGrid(ScrollView, can_focus=True):
+    """
+    Read-only table drawn line by line from column arrays, with sort and filter on the arrays.
+
+    Args:
+        columns: key -> {'name', optional 'type' and 'style'} as in the ui settings (see
+            format_data_table_cell); keys missing from the data are skipped.
+        fixed_columns: leading columns kept in place when scrolling horizontally.
+    """
+
+    COMPONENT_CLASSES = {
+        "virtual-grid--header",
+        "virtual-grid--cursor",
+    }
+
+    DEFAULT_CSS = """
+    VirtualGrid {
+        background: $surface;
+        color: $text;
+    }
+    VirtualGrid > .virtual-grid--header {
+        background: $panel;
+        text-style: bold;
+    }
+    VirtualGrid > .virtual-grid--cursor {
+        background: $secondary;
+        color: $text;
+    }
+    """
+
+    BINDINGS = [
+        Binding("up", "cursor_up", "Up", show=False),
+        Binding("down", "cursor_down", "Down", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+        Binding("home", "first_row", "First row", show=False),
+        Binding("end", "last_row", "Last row", show=False),
+        Binding("enter", "select_row", "Select", show=False),
+    ]
+
+    # formatted rows kept for redraws; cleared past this (scrolling through a large book)
+    MAX_CACHED_ROWS = 4096
+
+    class RowSelected(Message):
+        """
+        Enter or click on a row: its index in the view and its position in the data.
+        """
+        def __init__(self, grid, row: int, position: int) -> None:
+            self.grid = grid
+            self.row = row
+            self.position = position
+            super().__init__()
+
+        @property
+        def control(self):
+            return self.grid
+
+    def __init__(self, columns: dict = None, fixed_columns: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.fixed_columns = fixed_columns
+        self.column_spec = {}
+        self.keys = []
+        self.widths = []
+
+        self.data = {}
+        self.size_rows = 0
+        self.mask = None
+        # view row -> position, and position -> view row (-1: filtered out)
+        self.order = np.empty(0, dtype=np.intp)
+        self.view_row = np.empty(0, dtype=np.intp)
+        self.sort_key = None
+        self.sort_reverse = False
+
+        self.cursor_row = 0
+        self.row_cache = {}
+        # (position, key) -> style applied over the formatted cell (e.g. highlighted tickers)
+        self.cell_styles = {}
+
+        if columns is not None:
+            self.set_columns(columns)
+
+    def set_columns(self, columns: dict) -> None:
+        self.column_spec = dict(columns)
+        if self.sort_key not in self.column_spec:
+            self.sort_key = None
+            self.sort_reverse = False
+        self.keys = [key for key in self.column_spec if not self.data or key in self.data]
+        self.widths = [Text(self.label(key)).cell_len for key in self.keys]
+        self.row_cache.clear()
+        self.update_virtual_size()
+
+    def set_data(self, data: dict, mask: np.ndarray = None) -> None:
+        """
+        Shows new column arrays (all of the same length). The arrays are read, never copied:
+        values written to them in place are drawn after refresh_rows.
+        """
+        self.data = data
+        self.size_rows = len(next(iter(data.values()))) if data else 0
+        self.keys = [key for key in self.column_spec if key in self.data]
+        self.widths = [Text(self.label(key)).cell_len for key in self.keys]
+        self.row_cache.clear()
+        self.cell_styles.clear()
+        self.cursor_row = 0
+        self.set_filter(mask)
+
+    def set_filter(self, mask: np.ndarray = None) -> None:
+        """
+        Shows the rows where `mask` is True (all rows if None), in the current sort order.
+        """
+        self.mask = mask
+        self.order = np.arange(self.size_rows, dtype=np.intp) if mask is None else np.flatnonzero(mask)
+        self.apply_sort()
+
+    def sort(self, key: str, reverse: bool = None) -> None:
+        """
+        Sorts the view by `key`, toggling the direction when it is already the sort column.
+        Rows updated later keep their place until the next sort or filter.
+        """
+        if reverse is None:
+            reverse = not self.sort_reverse if key == self.sort_key else False
+        self.sort_key = key
+        self.sort_reverse = reverse
+        self.widths = [max(width, Text(self.label(column)).cell_len) for column, width in zip(self.keys, self.widths)]
+        self.apply_sort()
+
+    def apply_sort(self) -> None:
+        if self.sort_key in self.data and self.order.shape[0] > 0:
+            values = self.data[self.sort_key][self.order]
+            if values.dtype.kind not in 'biufmM':
+                # strings, dates and None as text
+                values = values.astype(str)
+            if values.dtype.kind == 'f' and self.sort_reverse:
+                # NaN last in both directions
+                ranks = np.argsort(-values, kind='stable')
+            else:
+                ranks = np.argsort(values, kind='stable')
+                if self.sort_reverse:
+                    ranks = ranks[::-1]
+            self.order = self.order[ranks]
+
+        self.view_row = np.full(self.size_rows, -1, dtype=np.intp)
+        self.view_row[self.order] = np.arange(self.order.shape[0])
+        self.cursor_row = min(self.cursor_row, max(self.order.shape[0] - 1, 0))
+        self.update_virtual_size()
+        self.refresh()
+
+    def refresh_rows(self, positions) -> None:
+        """
+        Re-formats the rows at `positions` (values changed in the arrays), redrawing the ones on screen.
+        """
+        for position in positions:
+            self.row_cache.pop(position, None)
+        self.redraw_rows(positions)
+
+    def redraw_rows(self, positions) -> None:
+        if len(positions) == 0:
+            return
+        top = int(self.scroll_offset.y)
+        for row in np.unique(self.view_row[np.asarray(positions, dtype=np.intp)]).tolist():
+            y = row - top + 1
+            if row >= 0 and 1 <= y < self.size.height:
+                self.refresh(Region(0, y, self.size.width, 1))
+
+    def set_cell_style(self, positions, key: str, style) -> None:
+        """
+        Applies `style` over the cell `key` of the rows at `positions` (None removes it).
+        """
+        for position in positions:
+            if style is None:
+                self.cell_styles.pop((position, key), None)
+            else:
+                self.cell_styles[(position, key)] = style
+        self.redraw_rows(positions)
+
+    def label(self, key: str) -> str:
+        name = self.column_spec[key].get('name', key)
+        if key == self.sort_key:
+            name += " ▼" if self.sort_reverse else " ▲"
+        return name
+
+    def header_justify(self, key: str) -> str:
+        # labels aligned as the cells of their column
+        data_type = self.column_spec[key].get('type', 'string')
+        return {'string': 'left', 'date': 'center'}.get(data_type, 'right')
+
+    def format_cell(self, key: str, value) -> Text:
+        spec = self.column_spec[key]
+        if isinstance(value, np.datetime64):
+            value = pd.Timestamp(value)
+        if 'type' not in spec:
+            return format_grid_cell(value)
+        return format_data_table_cell(spec['type'], value, spec.get('style'))
+
+    def row_cells(self, position: int) -> list:
+        cells = self.row_cache.get(position)
+        if cells is None:
+            if len(self.row_cache) >= self.MAX_CACHED_ROWS:
+                self.row_cache.clear()
+            cells = [self.format_cell(key, self.data[key][position]) for key in self.keys]
+            self.row_cache[position] = cells
+        return cells
+
+    def update_virtual_size(self) -> None:
+        # header line + one line per row shown, columns separated by one space
+        self.virtual_size = Size(sum(self.widths) + len(self.widths), self.order.shape[0] + 1)
+
+    def render_lines(self, crop: Region) -> list:
+        # formats the rows in view first, so that every line is drawn with the same widths
+        top = int(self.scroll_offset.y)
+        rows = self.order[top:top + max(self.size.height - 1, 0)].tolist()
+        widths = list(self.widths)
+        for position in rows:
+            for i, cell in enumerate(self.row_cells(position)):
+                if cell.cell_len > widths[i]:
+                    widths[i] = cell.cell_len
+        if widths != self.widths:
+            self.widths = widths
+            self.update_virtual_size()
+        return super().render_lines(crop)
+
+    def render_cells(self, cells: list, style) -> Strip:
+        fixed = self.fixed_columns
+        scroll_x = int(self.scroll_offset.x)
+        width = self.size.width
+
+        strips = []
+        for start, end in ((0, fixed), (fixed, len(cells))):
+            line = Text(no_wrap=True, end="")
+            for cell, column_width in zip(cells[start:end], self.widths[start:end]):
+                padding = column_width - cell.cell_len
+                if padding > 0:
+                    cell = cell.copy()
+                    if cell.justify == 'right':
+                        cell.pad_left(padding)
+                    elif cell.justify == 'center':
+                        cell.pad_left(padding // 2)
+                        cell.pad_right(padding - padding // 2)
+                    else:
+                        cell.pad_right(padding)
+                elif padding < 0:
+                    cell = cell.copy()
+                    cell.truncate(column_width, overflow='ellipsis')
+                line.append_text(cell)
+                line.append(" ")
+            strips.append(Strip(line.render(self.app.console), line.cell_len))
+
+        fixed_width = strips[0].cell_length
+        strip = Strip.join([strips[0], strips[1].crop(scroll_x, scroll_x + max(width - fixed_width, 0))])
+        return strip.extend_cell_length(width).crop(0, width).apply_style(style)
+
+    def render_line(self, y: int) -> Strip:
+        base_style = self.rich_style
+        if y == 0:
+            header = [Text(self.label(key), justify=self.header_justify(key)) for key in self.keys]
+            return self.render_cells(header, base_style + self.get_component_rich_style("virtual-grid--header"))
+
+        row = int(self.scroll_offset.y) + y - 1
+        if row >= self.order.shape[0]:
+            return Strip.blank(self.size.width, base_style)
+
+        position = int(self.order[row])
+        cells = self.row_cells(position)
+        if self.cell_styles:
+            cells = list(cells)
+            for i, key in enumerate(self.keys):
+                style = self.cell_styles.get((position, key))
+                if style is not None:
+                    cells[i] = cells[i].copy()
+                    cells[i].stylize(style)
+
+        style = base_style
+        if row == self.cursor_row:
+            style += self.get_component_rich_style("virtual-grid--cursor")
+        return self.render_cells(cells, style)
+
+    def move_cursor(self, row: int) -> None:
+        if self.order.shape[0] == 0:
+            return
+        previous = self.cursor_row
+        self.cursor_row = min(max(row, 0), self.order.shape[0] - 1)
+
+        top = int(self.scroll_offset.y)
+        visible = max(self.size.height - 1, 1)
+        if self.cursor_row < top:
+            self.scroll_to(y=self.cursor_row, animate=False)
+        elif self.cursor_row >= top + visible:
+            self.scroll_to(y=self.cursor_row - visible + 1, animate=False)
+        else:
+            for line in (previous, self.cursor_row):
+                self.refresh(Region(0, line - top + 1, self.size.width, 1))
+
+    def action_cursor_up(self) -> None:
+        self.move_cursor(self.cursor_row - 1)
+
+    def action_cursor_down(self) -> None:
+        self.move_cursor(self.cursor_row + 1)
+
+    def action_page_up(self) -> None:
+        self.move_cursor(self.cursor_row - max(self.size.height - 1, 1))
+
+    def action_page_down(self) -> None:
+        self.move_cursor(self.cursor_row + max(self.size.height - 1, 1))
+
+    def action_first_row(self) -> None:
+        self.move_cursor(0)
+
+    def action_last_row(self) -> None:
+        self.move_cursor(self.order.shape[0] - 1)
+
+    def action_select_row(self) -> None:
+        if self.cursor_row < self.order.shape[0]:
+            self.post_message(self.RowSelected(self, self.cursor_row, int(self.order[self.cursor_row])))
+
+    def column_at(self, x: int):
+        # key of the column under screen column x (None between columns or past the last)
+        fixed_width = sum(self.widths[:self.fixed_columns]) + self.fixed_columns
+        offset = x if x < fixed_width else x - fixed_width + int(self.scroll_offset.x)
+        start = 0 if x < fixed_width else self.fixed_columns
+        end = self.fixed_columns if x < fixed_width else len(self.keys)
+        for i in range(start, end):
+            if offset < self.widths[i]:
+                return self.keys[i]
+            offset -= self.widths[i] + 1
+            if offset < 0:
+                return None
+        return None
+
+    def on_click(self, event: events.Click) -> None:
+        if event.y == 0:
+            key = self.column_at(event.x)
+            if key is not None:
+                self.sort(key)
+            return
+
+        row = int(self.scroll_offset.y) + event.y - 1
+        if row < self.order.shape[0]:
+            self.move_cursor(row)
+            self.action_select_row()
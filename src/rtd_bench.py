@@ -0,0 +1,33 @@
+# Copyright (C) 2025 Spaghetti Software Inc. (SPGI)
+
+import argparse
+import sys
+
+from dxdy.rtd import bench
+
+from loguru import logger
+logger.remove()
+logger.add(sys.stderr, format="<blue>{time}</blue> <level>{level}</level> <white>{message}</white>", colorize=True, level="INFO")
+
+
+def int_list(value: str) -> list:
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RTD server end-to-end throughput / latency benchmark")
+    parser.add_argument('--feed', choices=['synthetic', 'replay'], default='synthetic')
+    parser.add_argument('--rows', type=int_list, default=[1000, 10000, 50000], help="book sizes (comma separated)")
+    parser.add_argument('--instruments', type=int_list, default=[500, 5000], help="instrument counts")
+    parser.add_argument('--rates', type=int_list, default=[5000, 20000, 100000], help="ticks per second")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=float, default=5.0, help="seconds before measuring")
+    parser.add_argument('--duration', type=float, default=30.0, help="measured seconds per case")
+    parser.add_argument('--port', type=int, default=7300, help="base port of the bench endpoints")
+    parser.add_argument('--output', default='rtd_bench.json')
+    args = parser.parse_args()
+
+    results = bench.sweep(args.rows, args.instruments, args.rates, feed=args.feed, seed=args.seed,
+                          warmup_s=args.warmup, duration_s=args.duration,
+                          endpoints=bench.bench_endpoints(base_port=args.port))
+    logger.info(f"RTD bench results written to {bench.write_results(results, args.output)}")
@@ -19,6 +19,11 @@ logger.level("DEBUG")
 
 if __name__ == "__main__":
     logger.info("This is dxdy v0.1 - 🍝 Spaghetti Software Inc")
-    rtd_server = rtd_calcs.RtdCalcServer()
-    rtd_server.run()
+    if Settings().get_rtd_sharding_config()['shards'] > 1:
+        # N shard processes + aggregator on the regular RTD endpoints
+        from dxdy.rtd.aggregator import run_sharded
+        run_sharded()
+    else:
+        rtd_server = rtd_calcs.RtdCalcServer()
+        rtd_server.run()
     
\ No newline at end of file